@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import User, Duel
+from .models import User, KYCProfile, Duel
 
 admin.site.register(User)
+admin.site.register(KYCProfile)
 admin.site.register(Duel)
\ No newline at end of file
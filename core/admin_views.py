@@ -3,15 +3,21 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
+from . import duel_states
 from .models import Duel, User
+from .db_routers import ReplicaRoutingMixin
 from .serializers import DuelSerializer
+from .exports import parse_period, streaming_export
 
-class AdminDuelViewSet(viewsets.ReadOnlyModelViewSet):
+class AdminDuelViewSet(ReplicaRoutingMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet pour la gestion admin des duels"""
-    queryset = Duel.objects.all().order_by('-created_at')
+    # Profils imbriqués : les données KYC des joueurs sont lues dans la même requête
+    queryset = Duel.objects.select_related('creator__kyc', 'opponent__kyc', 'winner__kyc').order_by('-created_at')
     serializer_class = DuelSerializer
     permission_classes = [IsAdminUser]
+    EXPORT_FIELDS = ('id', 'created_at', 'status', 'game_type', 'category', 'amount',
+                     'creator_id', 'creator__username', 'opponent_id', 'opponent__username',
+                     'winner_id', 'started_at', 'completed_at', 'admin_resolution', 'resolved_by_id')
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -29,7 +35,7 @@ class AdminDuelViewSet(viewsets.ReadOnlyModelViewSet):
         winner_id = request.data.get('winner_id')
         admin_reason = request.data.get('admin_reason', '')
         
-        if duel.status != 'disputed':
+        if duel.status not in duel_states.TRANSITIONS['resolve_dispute'].sources:
             return Response(
                 {"error": "Ce duel n'est pas en litige"}, 
                 status=status.HTTP_400_BAD_REQUEST
@@ -46,16 +52,14 @@ class AdminDuelViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Résoudre le duel
-        duel.winner = winner
-        duel.status = 'completed'
-        duel.admin_resolution = True
-        duel.admin_reason = admin_reason or f"Résolu par admin en faveur de {winner.username}"
-        duel.resolved_by = request.user
-        duel.resolved_at = timezone.now()
-        duel.completed_at = timezone.now()
-        duel._distribute_rewards()
-        duel.save()
+        # Résoudre le duel et verser les gains en une transaction
+        try:
+            duel_states.resolve_dispute(
+                duel, request.user, winner,
+                admin_reason or f"Résolu par admin en faveur de {winner.username}"
+            )
+        except duel_states.TransitionError as exc:
+            return duel_states.error_response(exc)
         
         return Response({
             "message": f"Litige résolu en faveur de {winner.username}",
@@ -68,28 +72,17 @@ class AdminDuelViewSet(viewsets.ReadOnlyModelViewSet):
         duel = self.get_object()
         reason = request.data.get('reason', 'Annulé par un administrateur')
         
-        if duel.status in ['completed', 'expired']:
+        # Marquer comme annulé et rembourser les participants
+        try:
+            duel_states.cancel(duel, request.user, reason)
+        except duel_states.ConcurrentTransition as exc:
+            return duel_states.error_response(exc)
+        except duel_states.TransitionError:
             return Response(
                 {"error": "Ce duel ne peut pas être annulé"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Rembourser les participants
-        duel.creator.tickets += duel.amount
-        duel.creator.save()
-        
-        if duel.opponent:
-            duel.opponent.tickets += duel.amount
-            duel.opponent.save()
-        
-        # Marquer comme annulé
-        duel.status = 'cancelled'
-        duel.admin_resolution = True
-        duel.admin_reason = reason
-        duel.resolved_by = request.user
-        duel.resolved_at = timezone.now()
-        duel.save()
-        
         return Response({
             "message": "Duel annulé et participants remboursés",
             "data": self.get_serializer(duel).data
@@ -105,6 +98,19 @@ class AdminDuelViewSet(viewsets.ReadOnlyModelViewSet):
             "results": serializer.data
         })
     
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Export CSV/NDJSON en flux (filtres status, since, until sur created_at)"""
+        queryset = Duel.objects.order_by('id')
+        if request.query_params.get('status'):
+            queryset = queryset.filter(status=request.query_params['status'])
+        
+        try:
+            queryset = queryset.filter(**parse_period(request.query_params, 'created_at'))
+            return streaming_export(queryset, self.EXPORT_FIELDS, request.query_params.get('fmt', 'csv'), 'duels')
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Statistiques pour le dashboard admin"""
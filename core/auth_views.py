@@ -0,0 +1,27 @@
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .jwt_auth import StatelessJWTAuthentication, revocations
+
+
+class JWTLogoutView(APIView):
+    """Révoque le token d'accès courant et, s'il est fourni, le refresh token"""
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        raw_refresh = request.data.get('refresh')
+        if raw_refresh:
+            try:
+                refresh = RefreshToken(raw_refresh)
+            except TokenError:
+                return Response({"error": "Refresh token invalide"}, status=status.HTTP_400_BAD_REQUEST)
+            if refresh.get(api_settings.USER_ID_CLAIM) != request.user.pk:
+                return Response({"error": "Ce refresh token n'appartient pas à l'utilisateur"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            revocations.revoke(refresh)
+        revocations.revoke(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,145 @@
+"""
+Authentification par token avec cache des utilisateurs.
+
+`TokenAuthentication` lit à chaque requête la jointure `authtoken_token` +
+`core_user` complète. `CachedTokenAuthentication` garde, par token, un
+enregistrement réduit (`AUTH_USER_FIELDS`) dans un cache LRU borné avec
+expiration (`TOKEN_AUTH_CACHE`), et reconstruit à partir de lui une instance
+`User` partielle : les autres champs sont différés. Une vue qui lit les
+tickets ou modifie l'utilisateur déclenche le chargement de tous les champs
+différés en une seule requête (voir `User.refresh_from_db`).
+
+Les tickets ne sont jamais mis en cache. Les entrées d'un utilisateur sont
+invalidées (nouvelle version, comme `profile_cache`) à la déconnexion
+(suppression du token), au changement de mot de passe, de rôle ou de statut
+KYC (voir `core/signals.py`) ; les JWT du mode `AUTH_TOKEN_MODE = 'jwt'` sont
+révoqués en même temps (voir `core/jwt_auth.py`).
+
+Par défaut le cache est l'alias 'default' de `settings.CACHES` : les
+invalidations ne valent pour tous les workers que si cet alias est partagé
+(Redis, Memcached...). Avec un cache propre au processus (LocMemCache, le
+défaut de Django sans `CACHES`, ou `LocMemLRUBackend`), les autres workers
+acceptent encore un token supprimé ou un ancien rôle pendant au plus `TTL`
+secondes.
+
+    TOKEN_AUTH_CACHE = {
+        'BACKEND': 'core.profile_cache.DjangoCacheBackend',
+        'OPTIONS': {'alias': 'default', 'timeout': 300},
+        'TTL': 300,
+    }
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .models import User
+
+DEFAULT_TOKEN_AUTH_CACHE = {
+    'BACKEND': 'core.profile_cache.DjangoCacheBackend',
+    'OPTIONS': {'alias': 'default', 'timeout': 300},
+    'TTL': 300,
+}
+
+# Champs lus pour authentifier et vérifier les permissions, dans l'ordre du modèle
+AUTH_USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {
+        'id', 'username', 'is_active', 'is_staff', 'is_superuser',
+        'role', 'is_verified', 'verification_status',
+    }
+)
+
+# Modifier un de ces champs (ou le mot de passe) invalide les tokens en cache
+INVALIDATING_FIELDS = frozenset(AUTH_USER_FIELDS) | {'password'}
+
+
+class TokenUserCache:
+    """Enregistrements réduits par token, invalidables par utilisateur"""
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+
+    def _version_key(self, user_id):
+        return f"auth:version:{user_id}"
+
+    def _entry_key(self, token_key):
+        return f"auth:token:{token_key}"
+
+    def _new_version(self, user_id):
+        version = uuid.uuid4().hex
+        self.backend.set(self._version_key(user_id), version)
+        return version
+
+    def _current_version(self, user_id):
+        """Jeton aléatoire : une clé de version évincée ne peut pas revalider une ancienne entrée"""
+        return self.backend.get(self._version_key(user_id)) or self._new_version(user_id)
+
+    def get(self, token_key):
+        """Valeurs de `AUTH_USER_FIELDS`, ou None si absentes, expirées ou invalidées"""
+        entry = self.backend.get(self._entry_key(token_key))
+        if entry is None:
+            return None
+        values, version, expires_at = entry
+        if expires_at <= time.time() or version != self._current_version(values[0]):
+            self.backend.delete(self._entry_key(token_key))
+            return None
+        return values
+
+    def set(self, token_key, values):
+        version = self._current_version(values[0])
+        self.backend.set(self._entry_key(token_key), (values, version, time.time() + self.ttl))
+
+    def invalidate_token(self, token_key):
+        self.backend.delete(self._entry_key(token_key))
+
+    def invalidate_user(self, user_id):
+        self._new_version(user_id)
+
+    def clear(self):
+        self.backend.clear()
+
+
+def _build_token_cache():
+    config = {**DEFAULT_TOKEN_AUTH_CACHE, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+    backend_class = import_string(config['BACKEND'])
+    return TokenUserCache(backend_class(**config.get('OPTIONS', {})), config['TTL'])
+
+
+token_cache = _build_token_cache()
+
+
+def invalidate_user_tokens(user_id, password_changed=False):
+    """Invalide les tokens en cache et révoque les JWT déjà émis pour l'utilisateur"""
+    from .jwt_auth import revocations
+    token_cache.invalidate_user(user_id)
+    revocations.revoke_user(user_id, refresh=password_changed)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """`TokenAuthentication` servie depuis `token_cache`, sans lecture de la ligne User complète"""
+
+    def _lookup(self, key):
+        return self.get_model().objects.filter(key=key).values_list(
+            *(f'user__{field}' for field in AUTH_USER_FIELDS)
+        ).first()
+
+    def authenticate_credentials(self, key):
+        values = token_cache.get(key)
+        if values is None:
+            values = self._lookup(key)
+            if values is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            token_cache.set(key, values)
+
+        user = User.from_db(DEFAULT_DB_ALIAS, AUTH_USER_FIELDS, values)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, self.get_model()(key=key, user=user))
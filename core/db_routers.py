@@ -0,0 +1,72 @@
+"""
+Routage des lectures vers un réplica PostgreSQL.
+
+Seules les actions de viewset en lecture seule (`list`, `retrieve`,
+`leaderboard`, `stats`, `duels`) sont envoyées sur le réplica, et uniquement hors de
+toute transaction : tout ce qui touche aux tickets ou aux duels s'exécute dans
+un `transaction.atomic()` et reste donc sur la base principale.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_ONLY_ACTIONS = frozenset({'list', 'retrieve', 'leaderboard', 'stats', 'duels'})
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def viewset_action(action):
+    """Autorise les lectures sur le réplica si l'action est en lecture seule"""
+    token = _replica_reads.set(action in READ_ONLY_ACTIONS)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Force les lectures sur la base principale (chemins d'écriture)"""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRoutingMixin:
+    """Mixin de viewset qui déclare l'action courante au routeur"""
+
+    def dispatch(self, request, *args, **kwargs):
+        action = getattr(self, 'action_map', {}).get(request.method.lower())
+        with viewset_action(action):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ReadReplicaRouter:
+    """Envoie les lectures autorisées sur `settings.DATABASE_REPLICA_ALIAS`"""
+
+    def _replica_alias(self):
+        return getattr(settings, 'DATABASE_REPLICA_ALIAS', None)
+
+    def db_for_read(self, model, **hints):
+        replica = self._replica_alias()
+        if not replica or not _replica_reads.get():
+            return DEFAULT_DB_ALIAS
+        # Une lecture dans une transaction d'écriture doit voir ses propres écritures
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Le réplica contient les mêmes données que la base principale
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != self._replica_alias()
@@ -0,0 +1,271 @@
+"""
+Machine à états des duels.
+
+Cycle de vie :
+
+    open --join--> waiting --ready (x2)--> active --claim_victory (x2)--> disputed / ai_validation
+                                              |                                  |
+                       forfeit / admit_defeat / confirm_result          resolve_dispute (admin)
+                                              v                                  v
+                                          completed <----------------------------+
+                                              |
+                                  rematch + accept_rematch --> nouveau duel, directement 'active'
+
+`TRANSITIONS` donne, pour chaque action, les statuts de départ autorisés et
+les statuts d'arrivée possibles. Chaque transition est appliquée en un seul
+`UPDATE ... WHERE id = <duel> AND status = <statut lu>` (plus une garde
+éventuelle) : si un autre joueur a modifié le duel entre-temps, aucune ligne
+n'est touchée et `ConcurrentTransition` est levée. Les effets de bord
+(mises, gains, remboursements) sont exécutés dans la même transaction.
+"""
+from datetime import timedelta
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Value, When
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .games import category_for
+from .ledger import refund_escrow, stake, stake_many
+from .models import Duel
+
+
+class Transition(NamedTuple):
+    sources: frozenset
+    targets: frozenset
+
+
+def _transition(sources, targets):
+    return Transition(frozenset(sources), frozenset(targets))
+
+
+PLAYING_STATUSES = ('waiting', 'active')
+TERMINAL_STATUSES = frozenset({'completed', 'expired', 'cancelled'})
+CANCELLABLE_STATUSES = frozenset(dict(Duel.STATUS_CHOICES)) - TERMINAL_STATUSES
+
+TRANSITIONS = {
+    'join': _transition(['open'], ['waiting']),
+    'modify': _transition(['open'], ['open']),
+    'withdraw': _transition(['open'], []),  # suppression du duel par son créateur
+    'ready': _transition(['waiting'], ['waiting', 'active']),
+    'claim_victory': _transition(['active'], ['active']),
+    'dispute': _transition(['active'], ['disputed', 'ai_validation']),
+    'forfeit': _transition(PLAYING_STATUSES, ['completed']),
+    'admit_defeat': _transition(PLAYING_STATUSES, ['completed']),
+    'confirm_result': _transition(['active'], ['completed']),
+    'expire': _transition(PLAYING_STATUSES, ['expired']),
+    'resolve_dispute': _transition(['disputed', 'ai_validation'], ['completed']),
+    'cancel': _transition(CANCELLABLE_STATUSES, ['cancelled']),
+    # Revanche : le duel terminé le reste, la revanche est un nouveau duel
+    'rematch': _transition(['completed'], ['completed']),
+    'accept_rematch': _transition(['completed'], ['completed']),
+}
+
+# Action enregistrée pour le joueur qui termine le duel
+CONCEDE_ACTIONS = {'forfeit': 'forfeit', 'admit_defeat': 'defeat', 'confirm_result': 'defeat'}
+
+
+class TransitionError(Exception):
+    """Action impossible dans le statut actuel du duel"""
+
+
+class ConcurrentTransition(TransitionError):
+    """Le duel a changé entre sa lecture et la transition"""
+
+
+def error_response(exc):
+    code = status.HTTP_409_CONFLICT if isinstance(exc, ConcurrentTransition) else status.HTTP_400_BAD_REQUEST
+    return Response({"error": str(exc)}, status=code)
+
+
+def check(duel, action):
+    """Lève TransitionError si `action` n'est pas permise depuis le statut du duel"""
+    if duel.status not in TRANSITIONS[action].sources:
+        raise TransitionError(f"Action impossible : le duel est « {duel.get_status_display()} »")
+
+
+def _apply(duel, action, guard=None, strict=True, **changes):
+    """
+    Applique la transition en une requête conditionnelle et met l'instance à
+    jour. Retourne False (ou lève ConcurrentTransition si `strict`) quand la
+    ligne ne correspond plus.
+    """
+    check(duel, action)
+    transition = TRANSITIONS[action]
+    if 'status' not in changes and len(transition.targets) == 1:
+        changes['status'] = next(iter(transition.targets))
+
+    queryset = Duel.objects.filter(pk=duel.pk, status=duel.status)
+    if guard is not None:
+        queryset = queryset.filter(guard)
+    if not queryset.update(**changes):
+        if strict:
+            raise ConcurrentTransition("Le duel a été modifié entre-temps, veuillez réessayer")
+        return False
+
+    computed = [field for field, value in changes.items() if hasattr(value, 'resolve_expression')]
+    for field, value in changes.items():
+        if field not in computed:
+            setattr(duel, field, value)
+    duel.mark_clean(*changes)
+    if computed:
+        duel.refresh_from_db(fields=computed)
+    return True
+
+
+def _player_fields(duel, user):
+    """Préfixes de champs ('creator' / 'opponent') du joueur et de son adversaire"""
+    if user.pk == duel.creator_id:
+        return 'creator', 'opponent'
+    if user.pk == duel.opponent_id:
+        return 'opponent', 'creator'
+    raise TransitionError("Vous ne participez pas à ce duel")
+
+
+@transaction.atomic
+def join(duel, user):
+    """open -> waiting ; engage la mise de l'adversaire (InsufficientTickets annule tout)"""
+    if duel.opponent_id:
+        raise TransitionError("Ce duel a déjà un adversaire")
+    if duel.creator_id == user.pk:
+        raise TransitionError("Vous ne pouvez pas rejoindre votre propre duel")
+    _apply(duel, 'join', guard=Q(opponent__isnull=True), opponent=user)
+    stake(user, duel.amount, 'duel_stake', duel=duel)
+
+
+@transaction.atomic
+def withdraw(duel):
+    """Le créateur retire un duel encore ouvert : remboursement puis suppression"""
+    check(duel, 'withdraw')
+    refund_escrow('duel_refund', duel=duel)
+    deleted, _ = Duel.objects.filter(pk=duel.pk, status='open', opponent__isnull=True).delete()
+    if not deleted:
+        raise ConcurrentTransition("Le duel a été modifié entre-temps, veuillez réessayer")
+
+
+def modify(duel, amount, game_type):
+    """Modifie un duel encore ouvert, sans écraser un adversaire qui viendrait de le rejoindre"""
+    _apply(
+        duel, 'modify', guard=Q(opponent__isnull=True),
+        amount=amount, game_type=game_type, category=category_for(game_type),
+    )
+
+
+def ready(duel, user):
+    """Marque le joueur prêt ; le duel démarre si son adversaire l'était déjà. Retourne True au démarrage"""
+    player, other = _player_fields(duel, user)
+    now = timezone.now()
+    starts = Q(**{f'{other}_ready': True})
+    _apply(
+        duel, 'ready',
+        **{f'{player}_ready': True},
+        status=Case(When(starts, then=Value('active')), default=Value('waiting')),
+        started_at=Case(When(starts, then=Value(now)), default=F('started_at')),
+        expires_at=Case(
+            When(starts, then=Value(now + timedelta(minutes=duel.duration_minutes))),
+            default=F('expires_at'),
+        ),
+    )
+    return duel.status == 'active'
+
+
+@transaction.atomic
+def claim_victory(duel, user):
+    """Enregistre la victoire déclarée ; deux déclarations contradictoires ouvrent un litige"""
+    player, _ = _player_fields(duel, user)
+    _apply(duel, 'claim_victory', guard=Q(**{f'{player}_action__isnull': True}), **{f'{player}_action': 'victory'})
+
+    # Relu par la requête : le dernier des deux joueurs à déclarer voit les deux actions
+    has_proof = Q(creator_screenshot__gt='') | Q(opponent_screenshot__gt='')
+    _apply(
+        duel, 'dispute', strict=False,
+        guard=Q(creator_action='victory', opponent_action='victory'),
+        status=Case(When(has_proof, then=Value('ai_validation')), default=Value('disputed')),
+    )
+
+
+@transaction.atomic
+def concede(duel, user, action):
+    """forfeit / admit_defeat / confirm_result : l'adversaire de `user` gagne. Retourne le vainqueur"""
+    player, other = _player_fields(duel, user)
+    guard = None
+    if action == 'confirm_result':
+        if getattr(duel, f'{other}_action') != 'victory':
+            raise TransitionError("Rien à confirmer")
+        guard = Q(**{f'{other}_action': 'victory'})
+
+    winner = getattr(duel, other)
+    _apply(
+        duel, action, guard=guard,
+        winner=winner, completed_at=timezone.now(),
+        **{f'{player}_action': CONCEDE_ACTIONS[action]},
+    )
+    duel._distribute_rewards()
+    return winner
+
+
+@transaction.atomic
+def expire(duel):
+    """Temps écoulé : les mises sont remboursées"""
+    _apply(duel, 'expire')
+    refund_escrow('duel_refund', duel=duel)
+
+
+@transaction.atomic
+def resolve_dispute(duel, admin, winner, reason):
+    now = timezone.now()
+    _apply(
+        duel, 'resolve_dispute',
+        winner=winner, admin_resolution=True, admin_reason=reason,
+        resolved_by=admin, resolved_at=now, completed_at=now,
+    )
+    duel._distribute_rewards()
+
+
+@transaction.atomic
+def cancel(duel, admin, reason):
+    """Annulation par un admin : les mises sont remboursées"""
+    _apply(
+        duel, 'cancel',
+        admin_resolution=True, admin_reason=reason, resolved_by=admin, resolved_at=timezone.now(),
+    )
+    refund_escrow('duel_refund', duel=duel)
+
+
+def request_rematch(duel, user):
+    """Un joueur d'un duel terminé propose une revanche à son adversaire"""
+    _player_fields(duel, user)
+    if duel.rematch_requested_by_id:
+        raise TransitionError("Une revanche a déjà été proposée")
+    _apply(
+        duel, 'rematch',
+        guard=Q(rematch_requested_by__isnull=True) & ~Exists(Duel.objects.filter(original_duel=OuterRef('pk'))),
+        rematch_requested_by=user,
+    )
+
+
+@transaction.atomic
+def accept_rematch(duel, user):
+    """
+    L'adversaire accepte : la revanche est créée déjà démarrée (mêmes jeu,
+    mise et durée, les deux joueurs prêts) et les deux mises sont engagées en
+    une requête. InsufficientTickets annule tout. Retourne la revanche.
+    """
+    _, other = _player_fields(duel, user)
+    requester = getattr(duel, other)
+    if requester is None or duel.rematch_requested_by_id != requester.pk:
+        raise TransitionError("Votre adversaire n'a pas proposé de revanche")
+    # Consomme la proposition : une seule acceptation possible
+    _apply(duel, 'accept_rematch', guard=Q(rematch_requested_by=requester), rematch_requested_by=None)
+
+    now = timezone.now()
+    rematch = Duel.objects.create(
+        creator=requester, opponent=user, original_duel=duel,
+        game_type=duel.game_type, amount=duel.amount, duration_minutes=duel.duration_minutes,
+        status='active', creator_ready=True, opponent_ready=True,
+        started_at=now, expires_at=now + timedelta(minutes=duel.duration_minutes),
+    )
+    stake_many([requester, user], duel.amount, 'duel_stake', duel=rematch)
+    return rematch
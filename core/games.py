@@ -0,0 +1,89 @@
+"""
+Catalogue des jeux et catégories, défini une seule fois.
+
+Utilisé pour les choix de `Duel.game_type` et `Tournament.game`, et pour
+remplir la colonne `Duel.category` (filtrable et indexée en SQL).
+"""
+from types import MappingProxyType
+from typing import NamedTuple
+
+
+class Category(NamedTuple):
+    label: str
+    icon: str
+
+    @property
+    def display(self):
+        return f"{self.icon} {self.label}"
+
+
+class Game(NamedTuple):
+    label: str
+    category: str
+
+
+DEFAULT_CATEGORY = 'other'
+
+CATEGORIES = MappingProxyType({
+    'sport': Category('Sport', '🏆'),
+    'competition': Category('Compétition', '🎮'),
+    'racing': Category('Course', '🚗'),
+    'challenge': Category('Défis', '🎯'),
+    DEFAULT_CATEGORY: Category('Autre', '🎮'),
+})
+
+GAMES = MappingProxyType({
+    # 🏆 Sport
+    'match_foot': Game('Match de Foot', 'sport'),
+    'penalty_shootout': Game('Tirs au But', 'sport'),
+    'ultimate_team': Game('Ultimate Team', 'sport'),
+    'freestyle': Game('Freestyle', 'sport'),
+
+    # 🎮 Compétition
+    'build_fight': Game('Build Fight', 'competition'),
+    'box_fight': Game('Box Fight', 'competition'),
+    'zone_wars': Game('Zone Wars', 'competition'),
+    '1v1_sniper': Game('Sniper 1v1', 'competition'),
+    'tir_precis': Game('Tir de Précision', 'competition'),
+    'combat_rapide': Game('Combat Rapide', 'competition'),
+    'gunfight': Game('Gunfight', 'competition'),
+
+    # 🚗 Course
+    'course_aerienne': Game('Course Aérienne', 'racing'),
+    'dribble_challenge': Game('Dribble Challenge', 'racing'),
+
+    # 🎯 Défis
+    'defi_aim': Game('Défi Aim', 'challenge'),
+    'clutch_1v1': Game('Clutch 1v1', 'challenge'),
+    'headshot_only': Game('Headshot Only', 'challenge'),
+    'knife_fight': Game('Knife Fight', 'challenge'),
+    'quick_scope': Game('Quick Scope', 'challenge'),
+    'trick_shot': Game('Trick Shot', 'challenge'),
+    'speedrun': Game('Speedrun', 'challenge'),
+    'survival': Game('Survival', 'challenge'),
+    'deathrun': Game('Deathrun', 'challenge'),
+    'parkour': Game('Parkour', 'challenge'),
+})
+
+GAME_CHOICES = [(key, game.label) for key, game in GAMES.items()]
+CATEGORY_CHOICES = [(key, category.display) for key, category in CATEGORIES.items()]
+
+GAMES_BY_CATEGORY = MappingProxyType({
+    category: tuple(key for key, game in GAMES.items() if game.category == category)
+    for category in CATEGORIES
+})
+
+
+def category_for(game_type):
+    """Clé de catégorie d'un type de jeu ('other' si inconnu)"""
+    game = GAMES.get(game_type)
+    return game.category if game else DEFAULT_CATEGORY
+
+
+def category_display(category):
+    return CATEGORIES.get(category, CATEGORIES[DEFAULT_CATEGORY]).display
+
+
+def game_display(game_type):
+    game = GAMES.get(game_type)
+    return game.label if game else game_type
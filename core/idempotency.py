@@ -0,0 +1,119 @@
+"""
+Requêtes POST rejouables avec l'en-tête `Idempotency-Key`.
+
+Un client qui renvoie une requête après un timeout avec la même clé reçoit la
+réponse d'origine (en-tête `Idempotent-Replayed: true`) sans que la vue soit
+exécutée une seconde fois : pas de double débit de tickets.
+
+Pendant son traitement, la clé n'est réservée que `IDEMPOTENCY_LEASE`
+secondes : si le processus meurt avant de répondre, une nouvelle tentative
+avec la même clé est acceptée une fois ce délai écoulé (409 avant).
+
+Règle de mémorisation : toute réponse 2xx-4xx est conservée, qu'elle soit
+renvoyée par la vue ou levée (`ValidationError`, `Http404`...). Une réponse
+5xx ou une exception inattendue libère la clé : le client peut réessayer.
+Les réponses sont conservées `IDEMPOTENCY_KEY_TTL` secondes, puis purgées par
+la commande `purge_idempotency_keys`.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http.request import RawPostDataException
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    try:
+        digest.update(request.body)
+    except RawPostDataException:
+        # Corps multipart déjà consommé : seuls la méthode et le chemin comptent
+        pass
+    return digest.hexdigest()
+
+
+def _reserve(user, key, fingerprint):
+    """Réserve la clé pour la durée du bail ; retourne None si elle existe déjà"""
+    now = timezone.now()
+    # Clés expirées, y compris les réservations d'un processus mort en cours de requête
+    IdempotencyKey.objects.filter(user=user, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user=user, key=key, fingerprint=fingerprint,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_LEASE),
+            )
+    except IntegrityError:
+        return None
+
+
+def _replay(user, key, fingerprint):
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is None or record.fingerprint != fingerprint:
+        return Response(
+            {"error": "Cette clé d'idempotence a déjà été utilisée pour une autre requête"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if record.status_code is None:
+        return Response(
+            {"error": "Une requête avec cette clé d'idempotence est déjà en cours"},
+            status=status.HTTP_409_CONFLICT
+        )
+    response = Response(record.response, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view_method):
+    """
+    Décorateur de méthode de viewset : rejoue la réponse d'une requête déjà
+    traitée avec le même `Idempotency-Key` pour le même utilisateur.
+
+    Sans en-tête, la vue s'exécute normalement.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"error": f"Clé d'idempotence trop longue ({MAX_KEY_LENGTH} caractères maximum)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = _fingerprint(request)
+        record = _reserve(request.user, key, fingerprint)
+        if record is None:
+            return _replay(request.user, key, fingerprint)
+
+        try:
+            try:
+                response = view_method(self, request, *args, **kwargs)
+            except Exception as exc:
+                # Erreurs levées par la vue : même réponse (et même mémorisation) que dans dispatch()
+                response = self.handle_exception(exc)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500:
+            record.delete()
+        else:
+            record.status_code = response.status_code
+            record.response = response.data
+            record.expires_at = timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+            record.save(update_fields=['status_code', 'response', 'expires_at'])
+        return response
+
+    return wrapper
@@ -0,0 +1,196 @@
+"""
+Authentification JWT sans état (optionnelle).
+
+Activée par `AUTH_TOKEN_MODE = 'jwt'` (variable d'environnement
+`PLAYINBET_AUTH_TOKEN_MODE`) : djoser expose alors
+`auth/jwt/create/`, `auth/jwt/refresh/` et `auth/jwt/verify/`, plus
+`auth/jwt/logout/` (voir `core/auth_views.py`). Le token d'accès porte l'identité, le rôle et l'état KYC
+de l'utilisateur (`AUTH_USER_FIELDS`) : `StatelessJWTAuthentication` en
+reconstruit une instance `User` partielle sans aucune requête, comme
+`CachedTokenAuthentication`.
+
+Les révocations (déconnexion, rotation du refresh, changement de mot de
+passe, de rôle ou de statut KYC) sont gardées en mémoire dans `revocations` :
+identifiants `jti` révoqués et, par utilisateur, date avant laquelle ses
+tokens d'accès (et ses refresh tokens après un changement de mot de passe)
+sont refusés. Le refresh relit les claims en base : après un changement de
+rôle ou de KYC, le client obtient un token d'accès à jour sans se reconnecter.
+
+Les dates de révocation sont à la milliseconde et comparées au claim
+`ISSUED_AT_CLAIM` posé par `tokens_for` (`iat` est à la seconde : un token
+émis dans la même seconde qu'une déconnexion serait indiscernable). Un token
+émis au plus tard à l'instant de la révocation est refusé.
+
+Chaque entrée disparaît à l'expiration des tokens qu'elle concerne. La liste
+est propre au processus : avec plusieurs workers, garder
+`ACCESS_TOKEN_LIFETIME` court borne la durée de validité d'un token révoqué
+sur un autre worker.
+"""
+import threading
+import time
+
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer, TokenRefreshSerializer, TokenVerifySerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, UntypedToken
+
+from .authentication import AUTH_USER_FIELDS
+from .models import User
+
+# Claims recopiés de l'utilisateur ; `id` est porté par USER_ID_CLAIM et `is_active` est implicite
+USER_CLAIMS = tuple(field for field in AUTH_USER_FIELDS if field not in ('id', 'is_active'))
+
+# Date d'émission en millisecondes, recopiée du refresh sur le token d'accès
+ISSUED_AT_CLAIM = 'iat_ms'
+
+# Intervalle minimal (secondes) entre deux purges des révocations expirées
+PRUNE_INTERVAL = 60
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _issued_at_ms(payload):
+    """Date d'émission en millisecondes ; sans ISSUED_AT_CLAIM, la fin de la seconde de `iat`"""
+    if ISSUED_AT_CLAIM in payload:
+        return payload[ISSUED_AT_CLAIM]
+    return payload.get('iat', 0) * 1000 + 999
+
+
+class RevocationList:
+    """jti révoqués et dates de révocation par utilisateur, purgés à expiration"""
+
+    def __init__(self):
+        self._tokens = {}  # jti -> exp
+        self._users = {}   # user_id -> (accès révoqués jusqu'à, refresh révoqués jusqu'à (ms), conservé jusqu'à (s))
+        self._lock = threading.Lock()
+        self._pruned_at = 0
+
+    def _prune(self, now):
+        if now - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._tokens = {jti: exp for jti, exp in self._tokens.items() if exp > now}
+        self._users = {user_id: entry for user_id, entry in self._users.items() if entry[2] > now}
+        self._pruned_at = now
+
+    def revoke(self, token):
+        """Révoque un token jusqu'à son expiration"""
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            self._tokens[token[api_settings.JTI_CLAIM]] = token['exp']
+
+    def revoke_user(self, user_id, refresh=False):
+        """
+        Révoque les tokens d'accès déjà émis pour l'utilisateur et, avec
+        `refresh=True` (mot de passe changé), aussi ses refresh tokens.
+        """
+        now = time.time()
+        cutoff = int(now * 1000)
+        keep_until = now + api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+        with self._lock:
+            self._prune(now)
+            _, refresh_cutoff, _ = self._users.get(user_id, (0, 0, 0))
+            self._users[user_id] = (cutoff, cutoff if refresh else refresh_cutoff, keep_until)
+
+    def is_revoked(self, payload):
+        with self._lock:
+            if payload.get(api_settings.JTI_CLAIM) in self._tokens:
+                return True
+            entry = self._users.get(payload.get(api_settings.USER_ID_CLAIM))
+        if entry is None:
+            return False
+        cutoff = entry[1] if payload.get(api_settings.TOKEN_TYPE_CLAIM) == 'refresh' else entry[0]
+        return _issued_at_ms(payload) <= cutoff
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+            self._users.clear()
+
+
+revocations = RevocationList()
+
+
+def tokens_for(user, issued_at_ms=None):
+    """
+    Refresh token (et son token d'accès) portant les claims de l'utilisateur.
+
+    `issued_at_ms` doit précéder la lecture de `user` en base, pour qu'une
+    révocation survenue entre-temps s'applique au token.
+    """
+    issued_at_ms = _now_ms() if issued_at_ms is None else issued_at_ms
+    refresh = RefreshToken.for_user(user)
+    refresh[ISSUED_AT_CLAIM] = issued_at_ms
+    for claim in USER_CLAIMS:
+        refresh[claim] = getattr(user, claim)
+    return refresh
+
+
+def _check_not_revoked(token):
+    if revocations.is_revoked(token.payload):
+        raise InvalidToken("Ce token a été révoqué")
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """Utilisateur reconstruit depuis les claims du token d'accès, sans requête"""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        _check_not_revoked(token)
+        return token
+
+    def get_user(self, validated_token):
+        claims = {**validated_token.payload, 'id': validated_token.get(api_settings.USER_ID_CLAIM), 'is_active': True}
+        try:
+            values = [claims[field] for field in AUTH_USER_FIELDS]
+        except KeyError:
+            raise InvalidToken("Le token ne contient pas l'identité de l'utilisateur")
+        return User.from_db(DEFAULT_DB_ALIAS, AUTH_USER_FIELDS, values)
+
+
+class PlayinbetTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return tokens_for(user)
+
+
+class PlayinbetTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Rotation systématique : l'ancien refresh est révoqué et les claims sont
+    relus en base, pour qu'un changement de rôle ou de KYC soit pris en compte.
+    """
+
+    def validate(self, attrs):
+        try:
+            refresh = self.token_class(attrs['refresh'])
+        except TokenError as error:
+            raise InvalidToken(error.args[0])
+        _check_not_revoked(refresh)
+
+        issued_at_ms = _now_ms()
+        user = User.objects.only(*AUTH_USER_FIELDS).filter(
+            pk=refresh.get(api_settings.USER_ID_CLAIM), is_active=True
+        ).first()
+        if user is None:
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        revocations.revoke(refresh)
+        new_refresh = tokens_for(user, issued_at_ms)
+        return {'access': str(new_refresh.access_token), 'refresh': str(new_refresh)}
+
+
+class PlayinbetTokenVerifySerializer(TokenVerifySerializer):
+    def validate(self, attrs):
+        try:
+            token = UntypedToken(attrs['token'])
+        except TokenError as error:
+            raise InvalidToken(error.args[0])
+        _check_not_revoked(token)
+        return {}
@@ -0,0 +1,82 @@
+"""
+File de revue KYC partagée entre admins.
+
+Les soumissions en attente sont servies dans l'ordre d'arrivée depuis l'index
+partiel `kyc_review_queue_idx`. Un admin réserve les N suivantes avec
+`select_for_update(skip_locked=True)` : deux admins ne reçoivent jamais la
+même soumission. Une réservation non traitée expire après `KYC_CLAIM_TTL`
+secondes et la soumission redevient disponible.
+
+    KYC_AUTO_APPROVE = False  # les soumissions attendent la revue d'un admin
+    KYC_CLAIM_TTL = 30 * 60
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .authentication import invalidate_user_tokens
+from .models import KYCProfile, User
+from .profile_cache import invalidate_profile
+
+
+def claim_expiry():
+    """Les réservations antérieures à cette date sont expirées"""
+    return timezone.now() - timedelta(seconds=settings.KYC_CLAIM_TTL)
+
+
+def pending_queue():
+    return User.objects.filter(
+        verification_status='pending', verification_submitted_at__isnull=False
+    ).order_by('verification_submitted_at', 'id')
+
+
+def unclaimed(queryset):
+    return queryset.filter(Q(kyc_claimed_by__isnull=True) | Q(kyc_claimed_at__lt=claim_expiry()))
+
+
+def claimable_by(queryset, admin):
+    """Soumissions que `admin` peut traiter : libres, expirées ou réservées par lui"""
+    return queryset.filter(
+        Q(kyc_claimed_by__isnull=True) | Q(kyc_claimed_by=admin) | Q(kyc_claimed_at__lt=claim_expiry())
+    )
+
+
+def claim_next(admin, count):
+    """Réserve les `count` prochaines soumissions libres pour `admin`"""
+    with transaction.atomic():
+        ids = list(
+            unclaimed(pending_queue()).select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:count]
+        )
+        if ids:
+            User.objects.filter(id__in=ids).update(kyc_claimed_by=admin, kyc_claimed_at=timezone.now())
+    return list(pending_queue().select_related('kyc').filter(id__in=ids))
+
+
+def release(admin, ids=None):
+    """Rend à la file les soumissions réservées par `admin` ; retourne leur nombre"""
+    queryset = User.objects.filter(kyc_claimed_by=admin)
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    return queryset.update(kyc_claimed_by=None, kyc_claimed_at=None)
+
+
+def review(user_id, admin, notes, **changes):
+    """
+    Clôt une soumission en attente en une requête UPDATE conditionnelle, puis
+    enregistre les notes de l'admin sur le profil KYC.
+
+    Retourne False si elle n'est plus en attente ou si un autre admin l'a
+    réservée entre-temps.
+    """
+    queryset = claimable_by(User.objects.filter(pk=user_id, verification_status='pending'), admin)
+    with transaction.atomic():
+        if not queryset.update(kyc_claimed_by=None, kyc_claimed_at=None, **changes):
+            return False
+        KYCProfile.objects.update_or_create(user_id=user_id, defaults={'verification_notes': notes})
+    invalidate_profile(user_id)
+    invalidate_user_tokens(user_id)
+    return True
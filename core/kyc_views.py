@@ -1,14 +1,20 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.conf import settings
 from django.utils import timezone
 from django.db import models
 from .models import User
-from .serializers import KYCVerificationSerializer, UserProfileSerializer
+from .db_routers import ReplicaRoutingMixin
+from .exports import parse_period, streaming_export
+from .kyc_queue import claim_next, pending_queue, release as release_claims, review, unclaimed
+from .pagination import parse_limit
+from .serializers import KYCQueueSerializer, KYCReleaseSerializer, KYCVerificationSerializer, UserProfileSerializer
 
 class KYCViewSet(viewsets.ViewSet):
     """ViewSet pour gérer la vérification KYC"""
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scopes = {'submit': 'kyc_submit'}
     
     @action(detail=False, methods=['get'])
     def status(self, request):
@@ -38,18 +44,21 @@ class KYCViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        serializer = KYCVerificationSerializer(user, data=request.data, partial=False)
+        serializer = KYCVerificationSerializer(user.get_or_build_kyc_profile(), data=request.data, partial=False)
         if serializer.is_valid():
             # Sauvegarder les données KYC
-            serializer.save()
+            kyc = serializer.save()
             
             # Marquer comme soumis et en attente
             user.verification_status = 'pending'
             user.verification_submitted_at = timezone.now()
+            user.kyc_claimed_by = None
+            user.kyc_claimed_at = None
             
-            # Pour la simulation, auto-approuver après 3 secondes
-            # En production, cela serait fait par un admin
-            self._simulate_kyc_approval(user)
+            # Pour la simulation, auto-approuver ; sinon la soumission
+            # rejoint la file de revue des admins
+            if settings.KYC_AUTO_APPROVE:
+                self._simulate_kyc_approval(user, kyc)
             
             user.save()
             
@@ -61,13 +70,14 @@ class KYCViewSet(viewsets.ViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    def _simulate_kyc_approval(self, user):
+    def _simulate_kyc_approval(self, user, kyc):
         """Simule l'approbation automatique du KYC"""
         # En production, cela serait fait par un processus séparé ou un admin
         user.verification_status = 'verified'
         user.is_verified = True
         user.verification_completed_at = timezone.now()
-        user.verification_notes = "Vérification automatique réussie (simulation)"
+        kyc.verification_notes = "Vérification automatique réussie (simulation)"
+        kyc.save(update_fields=['verification_notes'])
     
     @action(detail=False, methods=['get'])
     def requirements(self, request):
@@ -90,11 +100,15 @@ class KYCViewSet(viewsets.ViewSet):
             "age_requirement": 18
         })
 
-class AdminKYCViewSet(viewsets.ModelViewSet):
+class AdminKYCViewSet(ReplicaRoutingMixin, viewsets.ModelViewSet):
     """ViewSet admin pour gérer les vérifications KYC"""
-    queryset = User.objects.filter(verification_status__in=['pending', 'verified', 'rejected']).order_by('-verification_submitted_at')
+    queryset = User.objects.filter(verification_status__in=['pending', 'verified', 'rejected']).select_related('kyc').order_by('-verification_submitted_at')
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAdminUser]
+    EXPORT_KYC_FIELDS = ('first_name_kyc', 'last_name_kyc', 'date_of_birth', 'nationality',
+                         'country', 'verification_notes')
+    EXPORT_FIELDS = ('id', 'username', 'email', 'verification_status', 'is_verified',
+                     'verification_submitted_at', 'verification_completed_at') + EXPORT_KYC_FIELDS
     
     @action(detail=True, methods=['patch'])
     def approve(self, request, pk=None):
@@ -108,11 +122,15 @@ class AdminKYCViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        user.verification_status = 'verified'
-        user.is_verified = True
-        user.verification_completed_at = timezone.now()
-        user.verification_notes = f"Approuvé par {request.user.username}: {notes}"
-        user.save()
+        if not review(user.pk, request.user, f"Approuvé par {request.user.username}: {notes}",
+                      verification_status='verified',
+                      is_verified=True,
+                      verification_completed_at=timezone.now()):
+            return Response(
+                {"error": "Cette vérification est réservée ou déjà traitée par un autre administrateur"}, 
+                status=status.HTTP_409_CONFLICT
+            )
+        user.refresh_from_db()
         
         return Response({
             "message": f"Vérification KYC approuvée pour {user.username}",
@@ -131,11 +149,15 @@ class AdminKYCViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        user.verification_status = 'rejected'
-        user.is_verified = False
-        user.verification_completed_at = timezone.now()
-        user.verification_notes = f"Rejeté par {request.user.username}: {reason}"
-        user.save()
+        if not review(user.pk, request.user, f"Rejeté par {request.user.username}: {reason}",
+                      verification_status='rejected',
+                      is_verified=False,
+                      verification_completed_at=timezone.now()):
+            return Response(
+                {"error": "Cette vérification est réservée ou déjà traitée par un autre administrateur"}, 
+                status=status.HTTP_409_CONFLICT
+            )
+        user.refresh_from_db()
         
         return Response({
             "message": f"Vérification KYC rejetée pour {user.username}",
@@ -143,6 +165,60 @@ class AdminKYCViewSet(viewsets.ModelViewSet):
             "user": UserProfileSerializer(user).data
         })
     
+    @action(detail=False, methods=['get'])
+    def queue(self, request):
+        """Soumissions en attente, les plus anciennes d'abord (?available=1 : non réservées, ?mine=1 : les miennes)"""
+        queryset = pending_queue().select_related('kyc', 'kyc_claimed_by')
+        if request.query_params.get('available'):
+            queryset = unclaimed(queryset)
+        if request.query_params.get('mine'):
+            queryset = queryset.filter(kyc_claimed_by=request.user)
+        
+        try:
+            limit = parse_limit(request.query_params.get('limit'))
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(KYCQueueSerializer(queryset[:limit], many=True).data)
+    
+    @action(detail=False, methods=['post'])
+    def claim(self, request):
+        """Réserver les prochaines soumissions libres (count, 10 par défaut, 50 maximum)"""
+        try:
+            count = parse_limit(request.data.get('count'), default=10, maximum=50)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        claimed = claim_next(request.user, count)
+        return Response({
+            "claimed": len(claimed),
+            "results": KYCQueueSerializer(claimed, many=True).data
+        })
+    
+    @action(detail=False, methods=['post'])
+    def release(self, request):
+        """Rendre à la file ses soumissions réservées (toutes, ou la liste `ids`)"""
+        serializer = KYCReleaseSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({"released": release_claims(request.user, serializer.validated_data.get('ids'))})
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Export CSV/NDJSON en flux (filtres status, since, until sur la date de soumission)"""
+        queryset = User.objects.filter(verification_submitted_at__isnull=False).annotate(
+            **{field: models.F(f'kyc__{field}') for field in self.EXPORT_KYC_FIELDS}
+        ).order_by('id')
+        if request.query_params.get('status'):
+            queryset = queryset.filter(verification_status=request.query_params['status'])
+        
+        try:
+            queryset = queryset.filter(**parse_period(request.query_params, 'verification_submitted_at'))
+            return streaming_export(queryset, self.EXPORT_FIELDS, request.query_params.get('fmt', 'csv'), 'kyc')
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Statistiques des vérifications KYC"""
@@ -0,0 +1,208 @@
+"""
+Mouvements de tickets.
+
+Toute modification de `User.tickets` passe par `credit`, `debit` ou
+`credit_many` : le solde est modifié par une requête UPDATE atomique
+(`F('tickets') ± montant`) et chaque mouvement est inscrit dans
+`WalletTransaction` avec le solde obtenu.
+
+Les mises de duel et les inscriptions aux tournois passent par `stake` : les
+tickets quittent le solde disponible pour un `Escrow` (et `User.locked_tickets`),
+puis `settle_escrow` ou `refund_escrow` les libèrent en une requête UPDATE.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import Escrow, User, WalletTransaction
+from .profile_cache import invalidate_profile
+
+
+class InsufficientTickets(Exception):
+    """Le solde de l'utilisateur ne couvre pas le débit demandé"""
+
+
+def _apply(user, amount, kind, **refs):
+    balance, user.locked_tickets = User.objects.values_list('tickets', 'locked_tickets').get(pk=user.pk)
+    user.tickets = balance
+    user.mark_clean('tickets', 'locked_tickets')
+    WalletTransaction.objects.create(user_id=user.pk, kind=kind, amount=amount, balance_after=balance, **refs)
+    invalidate_profile(user.pk)
+    return balance
+
+
+@transaction.atomic
+def credit(user, amount, kind, **refs):
+    """Crédite `amount` tickets ; retourne le nouveau solde (aussi reporté sur `user`)"""
+    User.objects.filter(pk=user.pk).update(tickets=F('tickets') + amount)
+    return _apply(user, amount, kind, **refs)
+
+
+@transaction.atomic
+def debit(user, amount, kind, **refs):
+    """Débite `amount` tickets ; lève InsufficientTickets si le solde est insuffisant"""
+    if not User.objects.filter(pk=user.pk, tickets__gte=amount).update(tickets=F('tickets') - amount):
+        raise InsufficientTickets(f"Tickets insuffisants : {amount} nécessaires")
+    return _apply(user, -amount, kind, **refs)
+
+
+def _per_user(entries):
+    totals = {}
+    for user_id, amount, _ in entries:
+        totals[user_id] = totals.get(user_id, 0) + amount
+    return totals
+
+
+def _by_user(field, amounts, sign=1):
+    """`F(field) ± montant propre à chaque utilisateur`, pour une seule requête UPDATE"""
+    delta = Case(
+        *[When(pk=user_id, then=Value(amount)) for user_id, amount in amounts.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return F(field) + delta if sign > 0 else F(field) - delta
+
+
+def _move(entries, kind, unlocked=None):
+    """
+    Crédite les mouvements `(user_id, montant, refs)` et débloque `unlocked`
+    ({user_id: montant}) en une requête UPDATE.
+
+    Un WalletTransaction est écrit par mouvement, avec le solde courant
+    reconstitué dans l'ordre.
+    """
+    totals = _per_user(entries)
+    unlocked = unlocked or {}
+    changes = {}
+    if totals:
+        changes['tickets'] = _by_user('tickets', totals)
+    if unlocked:
+        changes['locked_tickets'] = _by_user('locked_tickets', unlocked, sign=-1)
+    if not changes:
+        return
+
+    user_ids = set(totals) | set(unlocked)
+    User.objects.filter(pk__in=user_ids).update(**changes)
+    balances = dict(User.objects.filter(pk__in=totals).values_list('id', 'tickets'))
+
+    # Solde avant le lot, puis solde après chaque mouvement
+    running = {user_id: balances[user_id] - total for user_id, total in totals.items()}
+    transactions = []
+    for user_id, amount, refs in entries:
+        running[user_id] += amount
+        transactions.append(WalletTransaction(
+            user_id=user_id, kind=kind, amount=amount, balance_after=running[user_id], **refs
+        ))
+    WalletTransaction.objects.bulk_create(transactions)
+
+    for user_id in user_ids:
+        invalidate_profile(user_id)
+
+
+@transaction.atomic
+def credit_many(entries, kind):
+    """Crédite plusieurs mouvements `(user_id, montant, refs)` en une requête UPDATE"""
+    _move(entries, kind)
+
+
+@transaction.atomic
+def stake(user, amount, kind, **target):
+    """
+    Met `amount` tickets en séquestre sur `target` (duel=... ou tournament=...).
+
+    Lève InsufficientTickets si le solde disponible est insuffisant.
+    """
+    if not User.objects.filter(pk=user.pk, tickets__gte=amount).update(
+        tickets=F('tickets') - amount,
+        locked_tickets=F('locked_tickets') + amount,
+    ):
+        raise InsufficientTickets(f"Tickets insuffisants : {amount} nécessaires")
+    if not Escrow.objects.filter(user_id=user.pk, status='held', **target).update(amount=F('amount') + amount):
+        Escrow.objects.create(user_id=user.pk, amount=amount, **target)
+    return _apply(user, -amount, kind, **target)
+
+
+@transaction.atomic
+def stake_many(users, amount, kind, **target):
+    """
+    Met `amount` tickets de chaque utilisateur en séquestre sur `target`, en
+    une requête UPDATE. Lève InsufficientTickets (rien n'est débité) si l'un
+    d'eux ne couvre pas la mise.
+    """
+    user_ids = [user.pk for user in users]
+    if User.objects.filter(pk__in=user_ids, tickets__gte=amount).update(
+        tickets=F('tickets') - amount,
+        locked_tickets=F('locked_tickets') + amount,
+    ) != len(set(user_ids)):
+        raise InsufficientTickets(f"Tickets insuffisants : {amount} nécessaires pour chaque joueur")
+    Escrow.objects.bulk_create([Escrow(user_id=user_id, amount=amount, **target) for user_id in user_ids])
+
+    balances = {
+        user_id: (tickets, locked)
+        for user_id, tickets, locked in User.objects.filter(pk__in=user_ids).values_list('id', 'tickets', 'locked_tickets')
+    }
+    WalletTransaction.objects.bulk_create([
+        WalletTransaction(user_id=user_id, kind=kind, amount=-amount, balance_after=balances[user_id][0], **target)
+        for user_id in user_ids
+    ])
+    for user in users:
+        user.tickets, user.locked_tickets = balances[user.pk]
+        user.mark_clean('tickets', 'locked_tickets')
+        invalidate_profile(user.pk)
+
+
+@transaction.atomic
+def unstake(user, amount, kind, **target):
+    """Rend `amount` tickets du séquestre de `user` sur `target` (baisse de mise)"""
+    if not Escrow.objects.filter(user_id=user.pk, status='held', amount__gte=amount, **target).update(
+        amount=F('amount') - amount
+    ):
+        raise ValueError("Séquestre insuffisant")
+    User.objects.filter(pk=user.pk).update(
+        tickets=F('tickets') + amount,
+        locked_tickets=F('locked_tickets') - amount,
+    )
+    return _apply(user, amount, kind, **target)
+
+
+def _held(target):
+    """Verrouille les séquestres encore bloqués de `target` ; retourne {user_id: montant}"""
+    rows = Escrow.objects.select_for_update().filter(status='held', **target).values_list('user_id', 'amount')
+    held = {}
+    for user_id, amount in rows:
+        held[user_id] = held.get(user_id, 0) + amount
+    return held
+
+
+def _close(target, status):
+    Escrow.objects.filter(status='held', **target).update(status=status, released_at=timezone.now())
+
+
+@transaction.atomic
+def settle_escrow(winner, kind, **target):
+    """
+    Règle le séquestre de `target` : le vainqueur reçoit la totalité des mises.
+
+    Sans vainqueur (tournoi), les mises sont acquises à la plateforme.
+    Retourne le montant réglé.
+    """
+    held = _held(target)
+    total = sum(held.values())
+    entries = [(winner.pk, total, target)] if winner and total else []
+    _move(entries, kind, unlocked=held)
+    _close(target, 'settled')
+    if winner:
+        winner.tickets, winner.locked_tickets = (
+            User.objects.values_list('tickets', 'locked_tickets').get(pk=winner.pk)
+        )
+        winner.mark_clean('tickets', 'locked_tickets')
+    return total
+
+
+@transaction.atomic
+def refund_escrow(kind, **target):
+    """Rend à chaque participant sa mise sur `target` ; retourne le montant remboursé"""
+    held = _held(target)
+    _move([(user_id, amount, target) for user_id, amount in held.items()], kind, unlocked=held)
+    _close(target, 'refunded')
+    return sum(held.values())
@@ -0,0 +1,38 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.banking import IBAN_LENGTHS, account_errors, iban_error, make_iban
+
+
+class Command(BaseCommand):
+    help = 'Mesure le débit de validation des IBAN (clé mod 97 et longueur par pays)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1_000_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        countries = sorted(IBAN_LENGTHS)
+        ibans = []
+        for _ in range(options['count']):
+            country = rng.choice(countries)
+            bban = ''.join(rng.choices('0123456789', k=IBAN_LENGTHS[country] - 4))
+            ibans.append(make_iban(country, bban))
+
+        accounts = [(iban, f"BANK{iban[:2]}PP") for iban in ibans]
+
+        self._measure('iban_error', len(ibans), lambda: [iban for iban in ibans if iban_error(iban)])
+        self._measure('account_errors (IBAN + BIC)', len(accounts),
+                      lambda: [iban for iban, bic in accounts if account_errors(iban, bic)])
+
+    def _measure(self, label, count, run):
+        start = time.perf_counter()
+        invalid = run()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{label:<28} {count / elapsed * 60:>14,.0f} IBAN/min  "
+            f"({count} en {elapsed:.2f}s, {len(invalid)} invalides)"
+        )
@@ -0,0 +1,86 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.sqlite import BUSY_TIMEOUT_MS, apply_pragmas
+
+
+class Command(BaseCommand):
+    help = "Compare le débit d'écritures concurrentes SQLite : profil par défaut vs profil WAL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--transactions', type=int, default=200,
+                            help='Transactions par worker')
+        parser.add_argument('--users', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for label, tuned in [('défaut (DELETE, BEGIN DEFERRED)', False),
+                             ('sqlite-wal (WAL, BEGIN IMMEDIATE)', True)]:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'bench.sqlite3')
+                self._setup(path, options['users'], tuned)
+                committed, locked, elapsed = self._run(path, tuned, options)
+            self.stdout.write(
+                f"{label:<36} {committed / elapsed:>9.0f} tx/s  "
+                f"{committed} validées, {locked} 'database is locked' en {elapsed:.2f}s"
+            )
+
+    def _connect(self, path, tuned):
+        # Même délai d'attente des deux côtés : seule la configuration diffère
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None, check_same_thread=False)
+        if tuned:
+            apply_pragmas(conn.cursor())
+        return conn
+
+    def _setup(self, path, users, tuned):
+        conn = self._connect(path, tuned)
+        conn.execute("CREATE TABLE user (id INTEGER PRIMARY KEY, tickets INTEGER NOT NULL)")
+        conn.execute("CREATE TABLE ledger (id INTEGER PRIMARY KEY, user_id INTEGER, amount INTEGER)")
+        conn.executemany("INSERT INTO user (id, tickets) VALUES (?, 100)",
+                         [(i,) for i in range(1, users + 1)])
+        conn.close()
+
+    def _run(self, path, tuned, options):
+        begin = "BEGIN IMMEDIATE" if tuned else "BEGIN"
+        users = options['users']
+        counters = {'committed': 0, 'locked': 0}
+        lock = threading.Lock()
+
+        def worker(seed):
+            conn = self._connect(path, tuned)
+            committed = locked = 0
+            for i in range(options['transactions']):
+                user_id = (seed * 7919 + i * 104729) % users + 1
+                try:
+                    conn.execute(begin)
+                    # Lecture puis écriture : le motif des mutations de tickets
+                    tickets, = conn.execute("SELECT tickets FROM user WHERE id = ?", (user_id,)).fetchone()
+                    conn.execute("UPDATE user SET tickets = ? WHERE id = ?", (tickets + 1, user_id))
+                    conn.execute("INSERT INTO ledger (user_id, amount) VALUES (?, 1)", (user_id,))
+                    conn.execute("COMMIT")
+                    committed += 1
+                except sqlite3.OperationalError as exc:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    if 'locked' not in str(exc):
+                        raise
+                    locked += 1
+            conn.close()
+            with lock:
+                counters['committed'] += committed
+                counters['locked'] += locked
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(options['workers'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        return counters['committed'], counters['locked'], elapsed
@@ -0,0 +1,42 @@
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.models import User
+from core.throttling import ActionSlidingWindowThrottle, UserSlidingWindowThrottle
+from core.views import DuelViewSet
+
+
+class Command(BaseCommand):
+    help = 'Mesure le coût des vérifications de limitation de débit (store configuré, sans base)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200_000)
+        parser.add_argument('--users', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = [User(pk=index + 1, username=f"bench{index}") for index in range(options['users'])]
+        requests = [
+            SimpleNamespace(user=users[index % len(users)], META={'REMOTE_ADDR': '127.0.0.1'})
+            for index in range(options['count'])
+        ]
+        view = SimpleNamespace(action='list', throttle_scopes=DuelViewSet.throttle_scopes)
+
+        for label, throttle_class in (('user', UserSlidingWindowThrottle),
+                                      ('action (duel_list)', ActionSlidingWindowThrottle)):
+            self._measure(label, requests, view, throttle_class)
+
+    def _measure(self, label, requests, view, throttle_class):
+        allowed = 0
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for request in requests:
+                allowed += throttle_class().allow_request(request, view)
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{label:<20} {elapsed / len(requests) * 1e6:>8.2f} µs/vérification  "
+            f"({allowed} autorisées, {len(requests) - allowed} refusées, {len(queries)} requêtes SQL)"
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import parse_period
+from core.models import Withdrawal
+from core.sepa import validated_debtor, write_pain001
+
+
+class Command(BaseCommand):
+    help = 'Exporte les retraits en fichier SEPA pain.001 (lecture en flux, mémoire constante)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Chemin du fichier XML à écrire')
+        parser.add_argument('--status', default='completed')
+        parser.add_argument('--since', help='Date ou date/heure ISO de début (processed_at)')
+        parser.add_argument('--until', help='Date ou date/heure ISO de fin exclue (processed_at)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        queryset = Withdrawal.objects.filter(status=options['status'])
+        try:
+            # Mêmes règles que l'endpoint sepa_export (dates seules, fuseau par défaut)
+            queryset = queryset.filter(**parse_period(options, 'processed_at'))
+            validated_debtor()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        with open(options['output'], 'w', encoding='utf-8') as fileobj:
+            write_pain001(queryset, fileobj, chunk_size=options['chunk_size'])
+
+        self.stdout.write(self.style.SUCCESS(f"Export SEPA écrit dans {options['output']}"))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.withdrawals import get_transfer_backend, process_batch
+
+
+class Command(BaseCommand):
+    help = 'Traite la file des retraits en attente par lots (plusieurs workers possibles)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true',
+                            help='Continuer à surveiller la file au lieu de s\'arrêter quand elle est vide')
+        parser.add_argument('--sleep', type=float, default=5.0,
+                            help='Pause (secondes) quand la file est vide en mode --loop')
+
+    def handle(self, *args, **options):
+        backend = get_transfer_backend()
+        total = 0
+
+        while True:
+            processed = process_batch(options['batch_size'], backend)
+            total += processed
+            if processed:
+                self.stdout.write(f'{processed} retraits traités')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'File des retraits vidée : {total} retraits traités'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Supprime les clés d\'idempotence expirées, par lots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        total = 0
+
+        while True:
+            ids = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now)
+                .values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            total += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'{total} clés d\'idempotence expirées supprimées'))
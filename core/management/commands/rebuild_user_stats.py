@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.user_stats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les statistiques de duels de tous les joueurs (UserStats) depuis les duels terminés'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{count} lignes de statistiques recalculées"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.ranks import recompute_all
+
+
+class Command(BaseCommand):
+    help = 'Recalcule le rang de tous les joueurs depuis leurs victoires (seuils de core/ranks.py)'
+
+    def handle(self, *args, **options):
+        count = recompute_all()
+        self.stdout.write(self.style.SUCCESS(f"{count} rangs mis à jour"))
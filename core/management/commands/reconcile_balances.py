@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from core.reconciliation import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Réconcilie les soldes de tickets avec l\'historique du wallet et enregistre un relevé'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Réexaminer tous les utilisateurs, pas seulement ceux modifiés depuis le dernier relevé')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Ne pas enregistrer de relevé')
+        parser.add_argument('--show', type=int, default=20,
+                            help='Nombre d\'écarts détaillés à afficher')
+
+    def handle(self, *args, **options):
+        report = reconcile(full=options['full'], chunk_size=options['chunk_size'],
+                           write=not options['dry_run'])
+        totals = report.totals
+
+        self.stdout.write(
+            f"{report.examined} utilisateurs examinés : {report.tickets} tickets, "
+            f"{report.expected_tickets} attendus"
+        )
+        self.stdout.write(
+            f"Plateforme : {totals['circulating']} en circulation, {totals['staked']} misés en duel, "
+            f"{totals['tournaments']} en tournoi, {totals['withdrawals']} en retrait"
+        )
+        if totals['locked'] != totals['staked'] + totals['tournaments']:
+            self.stdout.write(self.style.ERROR(
+                f"Séquestre incohérent : {totals['locked']} tickets bloqués sur les comptes, "
+                f"{totals['staked'] + totals['tournaments']} en séquestre"
+            ))
+
+        for discrepancy in report.discrepancies[:options['show']]:
+            self.stdout.write(self.style.ERROR(
+                f"Écart utilisateur {discrepancy.user_id} ({discrepancy.username}) : "
+                f"{discrepancy.tickets} tickets, {discrepancy.expected_tickets} attendus "
+                f"({discrepancy.tickets - discrepancy.expected_tickets:+d})"
+            ))
+
+        if report.discrepancies:
+            self.stdout.write(self.style.ERROR(f"{len(report.discrepancies)} écarts détectés"))
+        else:
+            self.stdout.write(self.style.SUCCESS('Aucun écart'))
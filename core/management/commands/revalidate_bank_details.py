@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.banking import account_errors
+from core.models import KYCProfile, Withdrawal
+
+
+class Command(BaseCommand):
+    help = 'Revalide tous les IBAN/BIC enregistrés (profils KYC, retraits) par blocs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--show', type=int, default=20,
+                            help='Nombre d\'erreurs détaillées à afficher')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        sources = [
+            ('KYC', KYCProfile.objects.exclude(Q(iban__isnull=True) | Q(iban='')), 'iban', 'bic'),
+            ('retrait', Withdrawal.objects.all(), 'bank_iban', 'bank_bic'),
+        ]
+        shown = 0
+
+        for label, queryset, iban_field, bic_field in sources:
+            checked = invalid = 0
+            rows = queryset.order_by('pk').values_list('pk', iban_field, bic_field).iterator(chunk_size=chunk_size)
+            for pk, iban, bic in rows:
+                checked += 1
+                errors = account_errors(iban, bic)
+                if not errors:
+                    continue
+                invalid += 1
+                if shown < options['show']:
+                    shown += 1
+                    details = ', '.join(errors.values())
+                    self.stdout.write(self.style.ERROR(f"{label} {pk} : {details}"))
+
+            style = self.style.ERROR if invalid else self.style.SUCCESS
+            self.stdout.write(style(f"{label} : {checked} vérifiés, {invalid} invalides"))
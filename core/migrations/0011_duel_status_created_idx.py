@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_user_bank_name_user_bic_user_city_user_country_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='duel',
+            index=models.Index(fields=['status', '-created_at'], name='duel_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:35
+
+from django.db import migrations, models
+
+# Copie figée de core.games.GAMES_BY_CATEGORY à la création de la migration :
+# l'évolution du catalogue ne doit pas changer ce qu'elle écrit
+GAMES_BY_CATEGORY = {
+    'sport': ('match_foot', 'penalty_shootout', 'ultimate_team', 'freestyle'),
+    'competition': ('build_fight', 'box_fight', 'zone_wars', '1v1_sniper', 'tir_precis', 'combat_rapide', 'gunfight'),
+    'racing': ('course_aerienne', 'dribble_challenge'),
+    'challenge': ('defi_aim', 'clutch_1v1', 'headshot_only', 'knife_fight', 'quick_scope', 'trick_shot',
+                  'speedrun', 'survival', 'deathrun', 'parkour'),
+}
+
+
+def populate_category(apps, schema_editor):
+    Duel = apps.get_model('core', 'Duel')
+    # Une requête UPDATE par catégorie, sans charger les duels
+    for category, games in GAMES_BY_CATEGORY.items():
+        Duel.objects.filter(game_type__in=games).update(category=category)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_duel_status_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='duel',
+            name='category',
+            field=models.CharField(choices=[('sport', '🏆 Sport'), ('competition', '🎮 Compétition'), ('racing', '🚗 Course'), ('challenge', '🎯 Défis'), ('other', '🎮 Autre')], default='other', editable=False, max_length=20),
+        ),
+        migrations.RunPython(populate_category, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='duel',
+            index=models.Index(fields=['category', 'status', '-created_at'], name='duel_category_status_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_duel_category'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='withdrawal',
+            name='status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('approved', 'Approuvé'), ('processing', 'En cours de traitement'), ('completed', 'Terminé'), ('failed', 'Échoué'), ('cancelled', 'Annulé')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_withdrawal_approved_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('duel_stake', 'Mise de duel'), ('duel_win', 'Gain de duel'), ('duel_refund', 'Remboursement de duel'), ('tournament_fee', 'Inscription à un tournoi'), ('tournament_prize', 'Prix de tournoi'), ('withdrawal', 'Retrait'), ('withdrawal_refund', 'Remboursement de retrait')], max_length=20)),
+                ('amount', models.IntegerField()),
+                ('balance_after', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('duel', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='wallet_transactions', to='core.duel')),
+                ('tournament', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='wallet_transactions', to='core.tournament')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wallet_transactions', to=settings.AUTH_USER_MODEL)),
+                ('withdrawal', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='wallet_transactions', to='core.withdrawal')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['user', 'created_at', 'id'], name='wallet_tx_user_created_idx')],
+            },
+        ),
+    ]
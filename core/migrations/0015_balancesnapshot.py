@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_wallettransaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tickets', models.PositiveIntegerField()),
+                ('expected_tickets', models.IntegerField()),
+                ('last_transaction_id', models.BigIntegerField(default=0)),
+                ('staked_tickets', models.PositiveIntegerField(default=0)),
+                ('tournament_tickets', models.PositiveIntegerField(default=0)),
+                ('withdrawal_tickets', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['user', 'last_transaction_id'], name='balance_snapshot_user_idx')],
+            },
+        ),
+    ]
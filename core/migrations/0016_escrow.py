@@ -0,0 +1,66 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def escrow_open_stakes(apps, schema_editor):
+    """Met en séquestre les mises déjà prélevées sur les duels et tournois en cours"""
+    User = apps.get_model('core', 'User')
+    Duel = apps.get_model('core', 'Duel')
+    TournamentParticipant = apps.get_model('core', 'TournamentParticipant')
+    Escrow = apps.get_model('core', 'Escrow')
+
+    duels = Duel.objects.exclude(status__in=['completed', 'expired', 'cancelled'])
+    escrows = [
+        Escrow(user_id=user_id, duel_id=duel_id, amount=amount)
+        for duel_id, creator_id, opponent_id, amount in duels.values_list('id', 'creator_id', 'opponent_id', 'amount').iterator()
+        for user_id in (creator_id, opponent_id) if user_id
+    ]
+    participants = TournamentParticipant.objects.filter(tournament__status__in=['upcoming', 'open', 'ongoing'])
+    escrows += [
+        Escrow(user_id=user_id, tournament_id=tournament_id, amount=entry_fee)
+        for user_id, tournament_id, entry_fee in participants.values_list('user_id', 'tournament_id', 'tournament__entry_fee').iterator()
+    ]
+    Escrow.objects.bulk_create(escrows, batch_size=1000)
+
+    User.objects.filter(escrows__status='held').update(locked_tickets=Coalesce(Subquery(
+        Escrow.objects.filter(user=OuterRef('pk'), status='held').order_by()
+        .values('user').annotate(total=Sum('amount')).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_balancesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='locked_tickets',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='Escrow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('held', 'Bloqué'), ('settled', 'Réglé'), ('refunded', 'Remboursé')], default='held', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+                ('duel', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='escrows', to='core.duel')),
+                ('tournament', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='escrows', to='core.tournament')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='escrows', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'user'], name='escrow_status_user_idx')],
+                'constraints': [models.UniqueConstraint(fields=('duel', 'user'), name='escrow_unique_duel_user'), models.UniqueConstraint(fields=('tournament', 'user'), name='escrow_unique_tournament_user')],
+            },
+        ),
+        migrations.RunPython(escrow_open_stakes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0017_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='kyc_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='kyc_claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='kyc_claims', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('verification_status', 'pending'), ('verification_submitted_at__isnull', False)), fields=['verification_submitted_at', 'id'], name='kyc_review_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,153 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+KYC_FIELDS = (
+    'first_name_kyc', 'last_name_kyc', 'date_of_birth', 'nationality', 'address', 'city',
+    'postal_code', 'country', 'phone_number', 'identity_document', 'proof_of_address',
+    'bank_name', 'bank_account_holder', 'iban', 'bank_iban', 'bic', 'bank_bic', 'verification_notes',
+)
+BATCH_SIZE = 1000
+
+
+def copy_to_profiles(apps, schema_editor):
+    """Un KYCProfile pour chaque utilisateur ayant au moins une donnée KYC ou bancaire"""
+    User = apps.get_model('core', 'User')
+    KYCProfile = apps.get_model('core', 'KYCProfile')
+
+    filled = Q(date_of_birth__isnull=False)
+    for field in KYC_FIELDS:
+        if field != 'date_of_birth':
+            filled |= Q(**{f'{field}__gt': ''})
+    rows = User.objects.filter(filled).values_list('id', *KYC_FIELDS).iterator(chunk_size=BATCH_SIZE)
+
+    batch = []
+    for user_id, *values in rows:
+        batch.append(KYCProfile(user_id=user_id, **dict(zip(KYC_FIELDS, values))))
+        if len(batch) >= BATCH_SIZE:
+            KYCProfile.objects.bulk_create(batch)
+            batch = []
+    KYCProfile.objects.bulk_create(batch)
+
+
+def copy_to_users(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    KYCProfile = apps.get_model('core', 'KYCProfile')
+
+    batch = []
+    for user_id, *values in KYCProfile.objects.values_list('user_id', *KYC_FIELDS).iterator(chunk_size=BATCH_SIZE):
+        batch.append(User(id=user_id, **dict(zip(KYC_FIELDS, values))))
+        if len(batch) >= BATCH_SIZE:
+            User.objects.bulk_update(batch, KYC_FIELDS)
+            batch = []
+    User.objects.bulk_update(batch, KYC_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_kyc_review_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KYCProfile',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='kyc', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('first_name_kyc', models.CharField(blank=True, max_length=50, verbose_name='Prénom (KYC)')),
+                ('last_name_kyc', models.CharField(blank=True, max_length=50, verbose_name='Nom (KYC)')),
+                ('date_of_birth', models.DateField(blank=True, null=True, verbose_name='Date de naissance')),
+                ('nationality', models.CharField(blank=True, max_length=50, verbose_name='Nationalité')),
+                ('address', models.TextField(blank=True, verbose_name='Adresse complète')),
+                ('city', models.CharField(blank=True, max_length=100, verbose_name='Ville')),
+                ('postal_code', models.CharField(blank=True, max_length=20, verbose_name='Code postal')),
+                ('country', models.CharField(blank=True, max_length=50, verbose_name='Pays')),
+                ('phone_number', models.CharField(blank=True, max_length=20, verbose_name='Numéro de téléphone')),
+                ('identity_document', models.CharField(blank=True, max_length=255, verbose_name="Pièce d'identité (simulé)")),
+                ('proof_of_address', models.CharField(blank=True, max_length=255, verbose_name='Justificatif de domicile (simulé)')),
+                ('bank_name', models.CharField(blank=True, max_length=100, verbose_name='Nom de la banque')),
+                ('bank_account_holder', models.CharField(blank=True, max_length=100, null=True, verbose_name='Titulaire du compte')),
+                ('iban', models.CharField(blank=True, max_length=34, null=True, verbose_name='IBAN')),
+                ('bank_iban', models.CharField(blank=True, max_length=34, null=True, verbose_name='IBAN')),
+                ('bic', models.CharField(blank=True, max_length=11, null=True, verbose_name='BIC/SWIFT')),
+                ('bank_bic', models.CharField(blank=True, max_length=11, null=True, verbose_name='BIC/SWIFT')),
+                ('verification_notes', models.TextField(blank=True, verbose_name='Notes de vérification (admin)')),
+            ],
+        ),
+        migrations.RunPython(copy_to_profiles, copy_to_users),
+        migrations.RemoveField(
+            model_name='user',
+            name='address',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='bank_account_holder',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='bank_bic',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='bank_iban',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='bank_name',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='bic',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='city',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='country',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='date_of_birth',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='first_name_kyc',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='iban',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='identity_document',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='last_name_kyc',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='nationality',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='phone_number',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='postal_code',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='proof_of_address',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='verification_notes',
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:03
+
+from django.db import migrations, models
+
+
+def in_progress_to_waiting(apps, schema_editor):
+    """`join` écrivait 'in_progress', statut inconnu : ces duels passent au ready-check"""
+    Duel = apps.get_model('core', 'Duel')
+    Duel.objects.filter(status='in_progress').update(status='waiting')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_kycprofile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='duel',
+            name='status',
+            field=models.CharField(choices=[('open', 'Ouvert'), ('waiting', 'En attente des joueurs'), ('active', 'Duel en cours'), ('upload_proof', 'Upload de preuves'), ('ai_validation', 'Validation IA'), ('waiting_confirmation', 'En attente de confirmation'), ('disputed', 'Litige'), ('completed', 'Terminé'), ('expired', 'Expiré'), ('cancelled', 'Annulé')], default='open', max_length=30),
+        ),
+        migrations.RunPython(in_progress_to_waiting, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_duel_cancelled_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='duel',
+            index=models.Index(fields=['creator', 'created_at', 'id'], name='duel_creator_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='duel',
+            index=models.Index(fields=['opponent', 'created_at', 'id'], name='duel_opponent_created_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_duel_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game_type', models.CharField(blank=True, max_length=30)),
+                ('played', models.PositiveIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('tickets_won', models.PositiveIntegerField(default=0)),
+                ('tickets_lost', models.PositiveIntegerField(default=0)),
+                ('total_staked', models.PositiveIntegerField(default=0)),
+                ('current_streak', models.IntegerField(default=0)),
+                ('best_streak', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'game_type'), name='user_stats_unique_game')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_userstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='withdrawal',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:26
+
+from django.db import migrations, models
+
+
+def expected_as_baseline(apps, schema_editor):
+    """Les relevés existants comptaient tous les mouvements jusqu'à last_transaction_id"""
+    BalanceSnapshot = apps.get_model('core', 'BalanceSnapshot')
+    BalanceSnapshot.objects.update(baseline_tickets=models.F('expected_tickets'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_withdrawal_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='baseline_tickets',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(expected_as_baseline, migrations.RunPython.noop),
+    ]
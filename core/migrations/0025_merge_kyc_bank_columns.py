@@ -0,0 +1,40 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:40
+
+from django.db import migrations, models
+from django.db.models import Q
+
+# Colonne conservée -> doublon supprimé
+MERGED_FIELDS = (('iban', 'bank_iban'), ('bic', 'bank_bic'))
+
+
+def merge_bank_columns(apps, schema_editor):
+    """Le doublon ne remplit la colonne conservée que si celle-ci est vide"""
+    KYCProfile = apps.get_model('core', 'KYCProfile')
+    for kept, duplicate in MERGED_FIELDS:
+        KYCProfile.objects.filter(Q(**{f'{kept}__isnull': True}) | Q(**{kept: ''})).exclude(
+            Q(**{f'{duplicate}__isnull': True}) | Q(**{duplicate: ''})
+        ).update(**{kept: models.F(duplicate)})
+
+
+def split_bank_columns(apps, schema_editor):
+    KYCProfile = apps.get_model('core', 'KYCProfile')
+    KYCProfile.objects.update(**{duplicate: models.F(kept) for kept, duplicate in MERGED_FIELDS})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_balancesnapshot_baseline'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_bank_columns, split_bank_columns),
+        migrations.RemoveField(
+            model_name='kycprofile',
+            name='bank_bic',
+        ),
+        migrations.RemoveField(
+            model_name='kycprofile',
+            name='bank_iban',
+        ),
+    ]
@@ -1,8 +1,76 @@
+import copy
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.fields.files import FieldFile
 from django.utils import timezone
+from .games import GAME_CHOICES, CATEGORY_CHOICES, DEFAULT_CATEGORY, category_for
+
+
+def _tracked_value(value):
+    """Valeur comparable plus tard, insensible aux modifications en place (JSON, fichiers)"""
+    if isinstance(value, FieldFile):
+        return value.name
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
+
+
+class DirtyFieldsMixin:
+    """
+    `save()` sans `update_fields` n'écrit que les colonnes modifiées depuis le
+    chargement (ou le dernier save), plus les champs `auto_now`. Un save sans
+    modification n'émet aucune requête.
+
+    Les écritures faites hors du modèle (`QuerySet.update`) doivent appeler
+    `mark_clean()` sur les champs reportés dans l'instance.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.mark_clean()
+        return instance
+
+    def _loaded_fields(self, names=None):
+        deferred = self.get_deferred_fields()
+        return [
+            field for field in self._meta.concrete_fields
+            if field.attname not in deferred
+            and (names is None or field.name in names or field.attname in names)
+        ]
+
+    def mark_clean(self, *names):
+        """Considère les champs (tous les champs chargés par défaut) comme enregistrés"""
+        snapshot = self.__dict__.setdefault('_saved_values', {})
+        for field in self._loaded_fields(names or None):
+            snapshot[field.attname] = _tracked_value(getattr(self, field.attname))
+
+    def get_dirty_fields(self):
+        snapshot = self.__dict__.get('_saved_values', {})
+        return [
+            field.name for field in self._loaded_fields()
+            if field.attname not in snapshot or _tracked_value(getattr(self, field.attname)) != snapshot[field.attname]
+        ]
+
+    def save(self, *args, **kwargs):
+        if not args and not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            dirty = self.get_dirty_fields()
+            if dirty:
+                dirty += [field.name for field in self._meta.concrete_fields
+                          if getattr(field, 'auto_now', False) and field.name not in dirty]
+            kwargs['update_fields'] = dirty
+        super().save(*args, **kwargs)
+        self.mark_clean(*(kwargs.get('update_fields') or ()))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self.mark_clean(*(fields or ()))
+
 
-class User(AbstractUser):
+class User(DirtyFieldsMixin, AbstractUser):
     USER_ROLES = [
         ('user', 'Utilisateur'),
         ('admin', 'Administrateur'),
@@ -16,6 +84,7 @@ class User(AbstractUser):
     ]
     
     tickets = models.PositiveIntegerField(default=100)
+    locked_tickets = models.PositiveIntegerField(default=0)  # Tickets en séquestre (Escrow 'held')
     victories = models.PositiveIntegerField(default=0)
     rank = models.CharField(max_length=50, default="Débutant")
     role = models.CharField(max_length=20, choices=USER_ROLES, default='user')
@@ -26,6 +95,68 @@ class User(AbstractUser):
     verification_submitted_at = models.DateTimeField(null=True, blank=True)
     verification_completed_at = models.DateTimeField(null=True, blank=True)
     
+    # File de revue KYC : admin qui traite la soumission (voir core/kyc_queue.py)
+    kyc_claimed_by = models.ForeignKey('self', null=True, blank=True, related_name="kyc_claims", on_delete=models.SET_NULL)
+    kyc_claimed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # File de revue KYC (FIFO) : seules les soumissions en attente sont indexées
+            models.Index(
+                fields=['verification_submitted_at', 'id'], name='kyc_review_queue_idx',
+                condition=models.Q(verification_status='pending', verification_submitted_at__isnull=False),
+            ),
+        ]
+    
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        """
+        Sur une instance partielle (voir `core/authentication.py`), la lecture
+        d'un champ différé charge tous les champs différés en une seule requête.
+        """
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and deferred.issuperset(fields):
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+
+    def is_admin(self):
+        return self.role in ['admin', 'super_admin']
+    
+    def is_super_admin(self):
+        return self.role == 'super_admin'
+    
+    def can_play(self):
+        """Vérifie si l'utilisateur peut jouer (compte vérifié)"""
+        return self.is_verified
+    
+    @property
+    def kyc_profile(self):
+        """Profil KYC de l'utilisateur, ou None s'il n'a jamais rien soumis"""
+        try:
+            return self.kyc
+        except ObjectDoesNotExist:
+            return None
+    
+    def get_or_build_kyc_profile(self):
+        """Profil KYC existant, ou nouveau profil (non enregistré) rattaché à l'utilisateur"""
+        return self.kyc_profile or KYCProfile(user=self)
+    
+    def can_withdraw(self):
+        """Vérifie si l'utilisateur peut retirer de l'argent"""
+        kyc = self.kyc_profile
+        return bool(self.is_verified and kyc and kyc.iban and kyc.bic)
+    
+    def get_withdrawal_eligible_amount(self):
+        """Montant en euros disponible pour le retrait (1€ = 10 tickets)"""
+        return self.tickets // 10 if self.can_withdraw() else 0
+    
+    def get_tickets_equivalent_euros(self, euros):
+        """Convertit des euros en tickets (1€ = 10 tickets)"""
+        return euros * 10
+
+class KYCProfile(models.Model):
+    """Données KYC et bancaires, hors de la table User (lue à chaque requête authentifiée)"""
+    user = models.OneToOneField(User, primary_key=True, related_name="kyc", on_delete=models.CASCADE)
+    
     # Informations KYC
     first_name_kyc = models.CharField(max_length=50, blank=True, verbose_name="Prénom (KYC)")
     last_name_kyc = models.CharField(max_length=50, blank=True, verbose_name="Nom (KYC)")
@@ -45,72 +176,20 @@ class User(AbstractUser):
     bank_name = models.CharField(max_length=100, blank=True, verbose_name="Nom de la banque")
     bank_account_holder = models.CharField(max_length=100, blank=True, null=True, verbose_name="Titulaire du compte")
     iban = models.CharField(max_length=34, blank=True, null=True, verbose_name="IBAN")
-    bank_iban = models.CharField(max_length=34, blank=True, null=True, verbose_name="IBAN")
     bic = models.CharField(max_length=11, blank=True, null=True, verbose_name="BIC/SWIFT")
-    bank_bic = models.CharField(max_length=11, blank=True, null=True, verbose_name="BIC/SWIFT")
     
     # Notes admin pour la vérification
     verification_notes = models.TextField(blank=True, verbose_name="Notes de vérification (admin)")
     
-    def is_admin(self):
-        return self.role in ['admin', 'super_admin']
-    
-    def is_super_admin(self):
-        return self.role == 'super_admin'
-    
-    def can_play(self):
-        """Vérifie si l'utilisateur peut jouer (compte vérifié)"""
-        return self.is_verified
-    
-    def can_withdraw(self):
-        """Vérifie si l'utilisateur peut retirer de l'argent"""
-        return self.is_verified and self.bank_iban and self.bank_bic
-    
-    def get_withdrawal_eligible_amount(self):
-        """Montant en euros disponible pour le retrait (1€ = 10 tickets)"""
-        return self.tickets // 10 if self.can_withdraw() else 0
-    
-    def get_tickets_equivalent_euros(self, euros):
-        """Convertit des euros en tickets (1€ = 10 tickets)"""
-        return euros * 10
+    def __str__(self):
+        return f"KYC {self.user.username}"
 
-class Duel(models.Model):
-    GAME_CHOICES = [
-        # 🏆 Sport
-        ('match_foot', 'Match de Foot'),
-        ('penalty_shootout', 'Tirs au But'),
-        ('ultimate_team', 'Ultimate Team'),
-        ('freestyle', 'Freestyle'),
-        
-        # 🎮 Compétition
-        ('build_fight', 'Build Fight'),
-        ('box_fight', 'Box Fight'),
-        ('zone_wars', 'Zone Wars'),
-        ('1v1_sniper', 'Sniper 1v1'),
-        ('tir_precis', 'Tir de Précision'),
-        ('combat_rapide', 'Combat Rapide'),
-        ('gunfight', 'Gunfight'),
-        
-        # 🚗 Course
-        ('course_aerienne', 'Course Aérienne'),
-        ('dribble_challenge', 'Dribble Challenge'),
-        
-        # 🎯 Défis
-        ('defi_aim', 'Défi Aim'),
-        ('clutch_1v1', 'Clutch 1v1'),
-        ('headshot_only', 'Headshot Only'),
-        ('knife_fight', 'Knife Fight'),
-        ('quick_scope', 'Quick Scope'),
-        ('trick_shot', 'Trick Shot'),
-        ('speedrun', 'Speedrun'),
-        ('survival', 'Survival'),
-        ('deathrun', 'Deathrun'),
-        ('parkour', 'Parkour'),
-    ]
+class Duel(DirtyFieldsMixin, models.Model):
+    GAME_CHOICES = GAME_CHOICES
     
     STATUS_CHOICES = [
         ('open', 'Ouvert'),
-        ('waiting', 'En attente du second joueur'),
+        ('waiting', 'En attente des joueurs'),
         ('active', 'Duel en cours'),
         ('upload_proof', 'Upload de preuves'),
         ('ai_validation', 'Validation IA'),
@@ -118,6 +197,7 @@ class Duel(models.Model):
         ('disputed', 'Litige'),
         ('completed', 'Terminé'),
         ('expired', 'Expiré'),
+        ('cancelled', 'Annulé'),
     ]
     
     # Joueurs
@@ -126,10 +206,11 @@ class Duel(models.Model):
     
     # Configuration du duel
     game_type = models.CharField(max_length=30, choices=GAME_CHOICES)
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default=DEFAULT_CATEGORY, editable=False)
     amount = models.PositiveIntegerField()  # Tickets misés par joueur
     duration_minutes = models.PositiveIntegerField(default=10)  # Durée du duel
     
-    # État du duel
+    # État du duel (transitions : voir core/duel_states.py)
     status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='open')
     winner = models.ForeignKey(User, null=True, blank=True, related_name="won_duels", on_delete=models.SET_NULL)
     
@@ -166,12 +247,19 @@ class Duel(models.Model):
     rematch_requested_by = models.ForeignKey(User, null=True, blank=True, related_name="rematch_requests", on_delete=models.SET_NULL)
     original_duel = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL)
     
+    class Meta:
+        indexes = [
+            # Lobby : duels ouverts les plus récents
+            models.Index(fields=['status', '-created_at'], name='duel_status_created_idx'),
+            # Filtre ?category= (seul ou combiné au statut)
+            models.Index(fields=['category', 'status', '-created_at'], name='duel_category_status_idx'),
+            # Historique d'un joueur : une branche de l'UNION par rôle, pagination par curseur
+            models.Index(fields=['creator', 'created_at', 'id'], name='duel_creator_created_idx'),
+            models.Index(fields=['opponent', 'created_at', 'id'], name='duel_opponent_created_idx'),
+        ]
+    
     def save(self, *args, **kwargs):
-        # Auto-démarrage quand l'adversaire rejoint
-        if self.opponent and not self.started_at and self.status == 'open':
-            self.started_at = timezone.now()
-            self.expires_at = timezone.now() + timezone.timedelta(minutes=self.duration_minutes)
-            self.status = 'active'
+        self.category = category_for(self.game_type)
         super().save(*args, **kwargs)
     
     def is_expired(self):
@@ -189,28 +277,6 @@ class Duel(models.Model):
                 self.creator != user and
                 user.tickets >= self.amount)
     
-    def check_ready_status(self):
-        """Vérifie si les deux joueurs sont prêts et démarre le duel"""
-        if (self.status == 'waiting' and 
-            self.opponent and 
-            self.creator_ready and 
-            self.opponent_ready):
-            self.status = 'active'
-            self.started_at = timezone.now()
-            self.expires_at = timezone.now() + timezone.timedelta(minutes=self.duration_minutes)
-            self.save()
-            return True
-        return False
-    
-    def set_player_ready(self, user):
-        """Marque un joueur comme prêt"""
-        if user == self.creator:
-            self.creator_ready = True
-        elif user == self.opponent:
-            self.opponent_ready = True
-        self.save()
-        return self.check_ready_status()
-    
     @property
     def both_players_ready(self):
         return self.creator_ready and self.opponent_ready
@@ -223,90 +289,22 @@ class Duel(models.Model):
         elapsed = (timezone.now() - self.started_at).total_seconds()
         return max(0, int(elapsed))
     
-    def resolve_duel(self):
-        """Résolution automatique basée sur les actions des joueurs"""
-        if self.creator_action and self.opponent_action:
-            # Les deux ont déclaré - vérifier cohérence
-            if ((self.creator_action == 'victory' and self.opponent_action == 'defeat') or
-                (self.creator_action == 'defeat' and self.opponent_action == 'victory')):
-                # Cohérent - détermine le gagnant
-                self.winner = self.creator if self.creator_action == 'victory' else self.opponent
-                self.status = 'completed'
-                self.completed_at = timezone.now()
-                self._distribute_rewards()
-                return True
-            else:
-                # Incohérent - aller en validation IA ou litige
-                self.status = 'ai_validation' if (self.creator_screenshot or self.opponent_screenshot) else 'disputed'
-                return False
-        elif self.creator_action == 'forfeit':
-            self.winner = self.opponent
-            self.status = 'completed'
-            self.completed_at = timezone.now()
-            self._distribute_rewards()
-            return True
-        elif self.opponent_action == 'forfeit':
-            self.winner = self.creator
-            self.status = 'completed'
-            self.completed_at = timezone.now()
-            self._distribute_rewards()
-            return True
-        
-        return False
-    
     def _distribute_rewards(self):
         """Distribution des tickets"""
+        from .ledger import settle_escrow
+        from .ranks import record_victory
+        from .user_stats import record_result
+
         if self.winner:
-            total_pot = self.amount * 2
-            self.winner.tickets += total_pot
-            self.winner.victories += 1
-            self.winner.save()
-            
-            # Le perdant perd ses tickets (déjà déduits à la création)
-            loser = self.opponent if self.winner == self.creator else self.creator
-            # Mise à jour du rang si nécessaire
-            self._update_ranks()
-    
-    def _update_ranks(self):
-        """Mise à jour des rangs basée sur les victoires"""
-        ranks = [
-            (0, 'Débutant'),
-            (5, 'Amateur'),
-            (15, 'Confirmé'),
-            (30, 'Expert'),
-            (50, 'Maître'),
-            (100, 'Légende')
-        ]
-        
-        for user in [self.creator, self.opponent]:
-            if user:
-                for min_victories, rank in reversed(ranks):
-                    if user.victories >= min_victories:
-                        user.rank = rank
-                        user.save()
-                        break
-    
-    def get_category_display(self):
-        """Retourne la catégorie avec icône"""
-        sport_games = ['match_foot', 'penalty_shootout', 'ultimate_team', 'freestyle']
-        competition_games = ['build_fight', 'box_fight', 'zone_wars', '1v1_sniper', 'tir_precis', 'combat_rapide', 'gunfight']
-        racing_games = ['course_aerienne', 'dribble_challenge']
-        challenge_games = ['defi_aim', 'clutch_1v1', 'headshot_only', 'knife_fight', 'quick_scope', 'trick_shot', 'speedrun', 'survival', 'deathrun', 'parkour']
-        
-        if self.game_type in sport_games:
-            return '🏆 Sport'
-        elif self.game_type in competition_games:
-            return '🎮 Compétition'
-        elif self.game_type in racing_games:
-            return '🚗 Course'
-        elif self.game_type in challenge_games:
-            return '🎯 Défis'
-        return '🎮 Autre'
+            settle_escrow(self.winner, 'duel_win', duel=self)
+            record_result(self)
+            # Le rang n'est réécrit que s'il change ; celui du perdant ne bouge pas
+            record_victory(self.winner)
     
     def __str__(self):
         return f"{self.get_game_type_display()} - {self.creator.username} vs {self.opponent.username if self.opponent else 'À venir'}"
 
-class Tournament(models.Model):
+class Tournament(DirtyFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('upcoming', 'À venir'),
         ('open', 'Inscriptions ouvertes'),
@@ -323,7 +321,7 @@ class Tournament(models.Model):
     
     name = models.CharField(max_length=200)
     description = models.TextField()
-    game = models.CharField(max_length=20, choices=Duel.GAME_CHOICES)
+    game = models.CharField(max_length=20, choices=GAME_CHOICES)
     entry_fee = models.PositiveIntegerField()
     prize_pool = models.PositiveIntegerField()
     max_participants = models.PositiveIntegerField()
@@ -392,10 +390,11 @@ class TournamentMatch(models.Model):
     def __str__(self):
         return f"Round {self.round_number} - {self.player1.username} vs {self.player2.username}"
 
-class Withdrawal(models.Model):
+class Withdrawal(DirtyFieldsMixin, models.Model):
     """Modèle pour les demandes de retrait"""
     STATUS_CHOICES = [
         ('pending', 'En attente'),
+        ('approved', 'Approuvé'),
         ('processing', 'En cours de traitement'),
         ('completed', 'Terminé'),
         ('failed', 'Échoué'),
@@ -415,6 +414,7 @@ class Withdrawal(models.Model):
     
     # Métadonnées
     created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # Réservé par un worker (statut processing)
     processed_at = models.DateTimeField(null=True, blank=True)
     admin_notes = models.TextField(blank=True, verbose_name="Notes administrateur")
     
@@ -431,4 +431,157 @@ class Withdrawal(models.Model):
         # Calculer automatiquement les tickets si pas défini
         if not self.amount_tickets:
             self.amount_tickets = int(self.amount_euros * 10)
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+class WalletTransaction(models.Model):
+    """Mouvement de tickets sur le portefeuille d'un utilisateur (historique du wallet)"""
+    KIND_CHOICES = [
+        ('duel_stake', 'Mise de duel'),
+        ('duel_win', 'Gain de duel'),
+        ('duel_refund', 'Remboursement de duel'),
+        ('tournament_fee', 'Inscription à un tournoi'),
+        ('tournament_prize', 'Prix de tournoi'),
+        ('withdrawal', 'Retrait'),
+        ('withdrawal_refund', 'Remboursement de retrait'),
+    ]
+    
+    user = models.ForeignKey(User, related_name="wallet_transactions", on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    amount = models.IntegerField()  # Positif : crédit, négatif : débit
+    balance_after = models.PositiveIntegerField()  # Solde après le mouvement
+    
+    # Origine du mouvement
+    duel = models.ForeignKey(Duel, null=True, blank=True, related_name="wallet_transactions", on_delete=models.SET_NULL)
+    tournament = models.ForeignKey(Tournament, null=True, blank=True, related_name="wallet_transactions", on_delete=models.SET_NULL)
+    withdrawal = models.ForeignKey(Withdrawal, null=True, blank=True, related_name="wallet_transactions", on_delete=models.SET_NULL)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Historique d'un utilisateur : un seul parcours d'index, pagination par curseur
+            models.Index(fields=['user', 'created_at', 'id'], name='wallet_tx_user_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.amount:+d} - {self.user.username}"
+
+class BalanceSnapshot(models.Model):
+    """Solde d'un utilisateur relevé par la réconciliation (`reconcile_balances`)"""
+    user = models.ForeignKey(User, related_name="balance_snapshots", on_delete=models.CASCADE)
+    tickets = models.PositiveIntegerField()  # User.tickets au moment du relevé
+    expected_tickets = models.IntegerField()  # Solde attendu d'après l'historique du wallet
+    # Base du relevé suivant : solde attendu en comptant les mouvements jusqu'à last_transaction_id
+    baseline_tickets = models.IntegerField(default=0)
+    last_transaction_id = models.BigIntegerField(default=0)  # Dernier WalletTransaction compté dans la base
+    
+    # Tickets engagés au moment du relevé
+    staked_tickets = models.PositiveIntegerField(default=0)  # Mises des duels non terminés
+    tournament_tickets = models.PositiveIntegerField(default=0)  # Inscriptions aux tournois non terminés
+    withdrawal_tickets = models.PositiveIntegerField(default=0)  # Retraits pas encore traités
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', 'last_transaction_id'], name='balance_snapshot_user_idx'),
+        ]
+    
+    @property
+    def discrepancy(self):
+        return self.tickets - self.expected_tickets
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.tickets} (attendu {self.expected_tickets})"
+
+class UserStats(models.Model):
+    """
+    Statistiques de duels d'un joueur pour un jeu, ou tous jeux confondus
+    (`game_type` vide). Tenues à jour par `core/user_stats.py`.
+    """
+    user = models.ForeignKey(User, related_name="stats", on_delete=models.CASCADE)
+    game_type = models.CharField(max_length=30, blank=True)
+    
+    played = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    tickets_won = models.PositiveIntegerField(default=0)  # Mises adverses remportées
+    tickets_lost = models.PositiveIntegerField(default=0)  # Mises perdues
+    total_staked = models.PositiveIntegerField(default=0)
+    
+    # Série en cours : > 0 victoires consécutives, < 0 défaites consécutives
+    current_streak = models.IntegerField(default=0)
+    best_streak = models.PositiveIntegerField(default=0)  # Plus longue série de victoires
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'game_type'], name='user_stats_unique_game'),
+        ]
+    
+    @property
+    def losses(self):
+        return self.played - self.wins
+    
+    @property
+    def win_rate(self):
+        return round(self.wins / self.played * 100, 1) if self.played else 0
+    
+    @property
+    def average_stake(self):
+        return round(self.total_staked / self.played, 1) if self.played else 0
+    
+    def __str__(self):
+        return f"{self.user.username} ({self.game_type or 'tous jeux'}) : {self.wins}/{self.played}"
+
+class Escrow(models.Model):
+    """Tickets mis en jeu par un utilisateur sur un duel ou un tournoi, bloqués jusqu'au règlement"""
+    STATUS_CHOICES = [
+        ('held', 'Bloqué'),
+        ('settled', 'Réglé'),
+        ('refunded', 'Remboursé'),
+    ]
+    
+    user = models.ForeignKey(User, related_name="escrows", on_delete=models.CASCADE)
+    duel = models.ForeignKey(Duel, null=True, blank=True, related_name="escrows", on_delete=models.CASCADE)
+    tournament = models.ForeignKey(Tournament, null=True, blank=True, related_name="escrows", on_delete=models.CASCADE)
+    amount = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='held')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    released_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['duel', 'user'], name='escrow_unique_duel_user'),
+            models.UniqueConstraint(fields=['tournament', 'user'], name='escrow_unique_tournament_user'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'user'], name='escrow_status_user_idx'),
+        ]
+    
+    def __str__(self):
+        target = f"duel {self.duel_id}" if self.duel_id else f"tournoi {self.tournament_id}"
+        return f"{self.user.username}: {self.amount} ({target}, {self.get_status_display()})"
+
+class IdempotencyKey(models.Model):
+    """Réponse mémorisée d'une requête POST rejouable (en-tête `Idempotency-Key`)"""
+    user = models.ForeignKey(User, related_name="idempotency_keys", on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 de la méthode, du chemin et du corps
+    
+    # Vides tant que la requête d'origine est en cours
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_unique_user_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.key}"
@@ -0,0 +1,84 @@
+"""
+Pagination par curseur (keyset) sur (created_at, id), du plus récent au plus ancien.
+
+Contrairement à OFFSET, chaque page est une simple lecture d'index à partir
+du dernier élément de la page précédente, quelle que soit la profondeur.
+"""
+import base64
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(created_at, pk):
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Retourne (created_at, id) ; lève ValueError si le curseur est invalide"""
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Curseur invalide") from exc
+    created_at = parse_datetime(created_at)
+    if created_at is None:
+        raise ValueError("Curseur invalide")
+    return created_at, int(pk)
+
+
+def _key(row):
+    if isinstance(row, dict):
+        return row['created_at'], row['id']
+    return row.created_at, row.pk
+
+
+def _after(queryset, cursor):
+    created_at, pk = decode_cursor(cursor)
+    return queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+
+def _page(queryset, limit):
+    rows = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*_key(rows[-1]))
+
+
+def keyset_page(queryset, cursor=None, limit=50):
+    """Retourne (lignes, curseur suivant ou None) ; lève ValueError si le curseur est invalide"""
+    if cursor:
+        queryset = _after(queryset, cursor)
+    return _page(queryset, limit)
+
+
+def keyset_union_page(querysets, cursor=None, limit=50):
+    """
+    `keyset_page` sur l'UNION ALL de requêtes disjointes (`.values()` aux
+    mêmes colonnes), plutôt qu'un OR qui empêche d'utiliser un index par
+    condition. Chaque branche est bornée à `limit + 1` lignes quand la base
+    accepte ORDER BY / LIMIT dans une union (PostgreSQL, pas SQLite).
+    """
+    branches = []
+    for queryset in querysets:
+        if cursor:
+            queryset = _after(queryset, cursor)
+        if connections[queryset.db].features.supports_slicing_ordering_in_compound:
+            queryset = queryset.order_by('-created_at', '-id')[:limit + 1]
+        branches.append(queryset)
+    return _page(branches[0].union(*branches[1:], all=True), limit)
+
+
+def parse_limit(value, default=50, maximum=200):
+    """Taille de page demandée ; lève ValueError si ce n'est pas un entier entre 1 et `maximum`"""
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Limite invalide") from exc
+    if not 1 <= value <= maximum:
+        raise ValueError(f"La limite doit être comprise entre 1 et {maximum}")
+    return value
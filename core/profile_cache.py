@@ -0,0 +1,193 @@
+"""
+Cache des profils utilisateurs sérialisés.
+
+Un joueur populaire apparaît dans des centaines de duels : plutôt que de
+recalculer `UserProfileSerializer` à chaque fois, on garde la représentation
+sérialisée, une entrée par utilisateur, étiquetée par la version courante de
+l'utilisateur. Toute modification des tickets, victoires, rang ou statut KYC
+change la version (voir `core/signals.py`), ce qui rend l'entrée en place
+inutilisable. `invalidate_profile` attend le commit de la transaction en cours.
+
+Les versions sont des jetons aléatoires et non des compteurs : si la clé de
+version est évincée ou expire, la nouvelle version ne peut pas coïncider avec
+celle d'une ancienne entrée, qui ne sera donc jamais resservie.
+
+Le backend est configurable via `settings.PROFILE_CACHE` :
+
+    PROFILE_CACHE = {
+        'BACKEND': 'core.profile_cache.LocMemLRUBackend',
+        'OPTIONS': {'max_entries': 10000, 'timeout': 300},
+    }
+
+`LocMemLRUBackend` est propre à chaque processus : une invalidation n'atteint
+pas les autres workers, dont les entrées restent servies au plus `timeout`
+secondes. `DjangoCacheBackend` permet de partager le cache (et les
+invalidations) entre workers via n'importe quel alias de `settings.CACHES`
+(Redis, Memcached...).
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# À incrémenter quand les champs de UserProfileSerializer changent
+SCHEMA_VERSION = 1
+
+DEFAULT_PROFILE_CACHE = {
+    'BACKEND': 'core.profile_cache.LocMemLRUBackend',
+    'OPTIONS': {'max_entries': 10000, 'timeout': 300},
+}
+
+
+class LocMemLRUBackend:
+    """Cache LRU en mémoire locale au processus ; `timeout` (secondes) borne la durée de vie des entrées"""
+
+    def __init__(self, max_entries=10000, timeout=300):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            expires_at, value = self._data[key]
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.timeout if self.timeout is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    """Cache partagé s'appuyant sur un alias de settings.CACHES"""
+
+    def __init__(self, alias='default', timeout=300):
+        from django.core.cache import caches
+        self._cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value, self.timeout)
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class ProfileCache:
+    """Profils sérialisés par utilisateur, étiquetés par version, avec compteurs hit/miss"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _version_key(self, user_id):
+        return f"profile:{SCHEMA_VERSION}:version:{user_id}"
+
+    def _entry_key(self, user_id):
+        return f"profile:{SCHEMA_VERSION}:{user_id}"
+
+    def _new_version(self, user_id):
+        version = uuid.uuid4().hex
+        self.backend.set(self._version_key(user_id), version)
+        return version
+
+    def _current_version(self, user_id):
+        """Version courante ; une clé évincée ou expirée est remplacée par un nouveau jeton"""
+        return self.backend.get(self._version_key(user_id)) or self._new_version(user_id)
+
+    def get_or_build(self, user, build):
+        """Retourne le profil en cache ou le construit avec `build(user)`"""
+        version = self._current_version(user.pk)
+        entry = self.backend.get(self._entry_key(user.pk))
+        if entry is not None and entry[0] == version:
+            with self._lock:
+                self.hits += 1
+            return entry[1]
+
+        with self._lock:
+            self.misses += 1
+        data = build(user)
+        # Une invalidation concurrente change la version : l'entrée écrite ici ne sera pas servie
+        self.backend.set(self._entry_key(user.pk), (version, data))
+        return data
+
+    def invalidate(self, user_id):
+        """Passe à une nouvelle version et supprime l'entrée courante"""
+        self._new_version(user_id)
+        self.backend.delete(self._entry_key(user_id))
+
+    def invalidate_many(self, user_ids):
+        for user_id in user_ids:
+            self.invalidate(user_id)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total * 100, 1) if total else 0,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def clear(self):
+        self.backend.clear()
+        self.reset_stats()
+
+
+def _build_profile_cache():
+    config = getattr(settings, 'PROFILE_CACHE', DEFAULT_PROFILE_CACHE)
+    backend_class = import_string(config['BACKEND'])
+    return ProfileCache(backend_class(**config.get('OPTIONS', {})))
+
+
+profile_cache = _build_profile_cache()
+
+
+def invalidate_profile(user_id):
+    """
+    Invalide le profil au commit de la transaction en cours (aussitôt hors
+    transaction) : invalidé avant, il pourrait être remis en cache par un
+    lecteur concurrent avec l'état d'avant le commit, sous la nouvelle version.
+    """
+    transaction.on_commit(lambda: profile_cache.invalidate(user_id))
+
+
+def invalidate_profiles(user_ids):
+    """`invalidate_profile` pour plusieurs utilisateurs, au commit"""
+    transaction.on_commit(lambda: profile_cache.invalidate_many(user_ids))
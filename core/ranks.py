@@ -0,0 +1,76 @@
+"""
+Rangs des joueurs, déterminés par leur nombre de victoires.
+
+`RANKS` est la seule table des seuils : `rank_for` y cherche le rang par
+bisection, `rank_expression` en fait un CASE WHEN pour recalculer tous les
+rangs en une requête (commande `recompute_ranks`).
+
+`update_rank` ne fait que poser le rang sur l'instance : avec le suivi des
+champs modifiés (`DirtyFieldsMixin`), `save()` n'écrit la colonne que si le
+rang a changé. `record_victory` incrémente les victoires en SQL (pas de
+lecture-modification-écriture concurrente) puis dérive le rang de la valeur
+relue.
+"""
+from bisect import bisect_right
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+
+from .models import User
+from .profile_cache import invalidate_profile, invalidate_profiles
+
+# (victoires minimales, rang), par seuil croissant
+RANKS = (
+    (0, 'Débutant'),
+    (5, 'Amateur'),
+    (15, 'Confirmé'),
+    (30, 'Expert'),
+    (50, 'Maître'),
+    (100, 'Légende'),
+)
+
+_THRESHOLDS = [threshold for threshold, _ in RANKS]
+
+
+def rank_for(victories):
+    return RANKS[max(bisect_right(_THRESHOLDS, victories) - 1, 0)][1]
+
+
+def update_rank(user):
+    """Pose sur `user` le rang correspondant à ses victoires ; retourne True s'il change"""
+    rank = rank_for(user.victories)
+    changed = rank != user.rank
+    user.rank = rank
+    return changed
+
+
+@transaction.atomic
+def record_victory(user):
+    """Ajoute une victoire à `user` ; la ligne reste verrouillée jusqu'à l'écriture du rang"""
+    User.objects.filter(pk=user.pk).update(victories=F('victories') + 1)
+    user.victories = User.objects.values_list('victories', flat=True).get(pk=user.pk)
+    user.mark_clean('victories')
+    update_rank(user)
+    user.save()
+    # UPDATE hors modèle : le post_save ne voit que le rang
+    invalidate_profile(user.pk)
+
+
+def rank_expression():
+    """Rang calculé en SQL depuis `victories`, du seuil le plus haut au plus bas"""
+    return Case(
+        *[When(victories__gte=threshold, then=Value(rank)) for threshold, rank in reversed(RANKS[1:])],
+        default=Value(RANKS[0][1]),
+    )
+
+
+@transaction.atomic
+def recompute_all():
+    """Réécrit en un UPDATE les rangs qui ne correspondent plus aux seuils ; retourne le nombre de joueurs"""
+    stale = User.objects.exclude(rank=rank_expression())
+    user_ids = list(stale.values_list('id', flat=True))
+    if user_ids:
+        stale.update(rank=rank_expression())
+        # UPDATE en masse : pas de post_save, les profils en cache sont invalidés ici
+        invalidate_profiles(user_ids)
+    return len(user_ids)
@@ -0,0 +1,176 @@
+"""
+Réconciliation des soldes de tickets.
+
+Chaque relevé (`BalanceSnapshot`) garde une base : le solde attendu
+(`baseline_tickets`) en comptant les `WalletTransaction` jusqu'à
+`last_transaction_id`. Le solde attendu suivant part de cette base, jamais du
+solde réel : un écart reste signalé tant qu'il n'est pas corrigé. Sans relevé,
+on part du solde d'ouverture du premier mouvement. Tout est calculé en une
+requête agrégée sur `User`, lue par blocs : aucune boucle de requêtes par
+utilisateur.
+
+Les identifiants de mouvements ne sont pas attribués dans l'ordre des commits :
+un mouvement d'id inférieur peut apparaître après un plus récent. La base
+n'avance donc que jusqu'aux mouvements plus anciens que
+`RECONCILIATION_SAFETY_WINDOW` secondes ; les plus récents sont recomptés au
+relevé suivant. La fenêtre doit dépasser la durée de la plus longue transaction.
+
+Seuls les utilisateurs ayant un mouvement après la base de leur dernier
+relevé sont réexaminés, sauf en mode complet (qui détecte aussi les soldes
+modifiés hors du wallet, par exemple depuis l'admin).
+"""
+from datetime import timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import BalanceSnapshot, Escrow, User, WalletTransaction, Withdrawal
+
+PENDING_WITHDRAWAL_STATUSES = ('pending', 'approved', 'processing')
+
+SNAPSHOT_FIELDS = ('tickets', 'expected_tickets', 'baseline_tickets', 'last_transaction_id',
+                   'staked_tickets', 'tournament_tickets', 'withdrawal_tickets')
+
+
+class Discrepancy(NamedTuple):
+    user_id: int
+    username: str
+    tickets: int
+    expected_tickets: int
+
+
+class ReconciliationReport(NamedTuple):
+    examined: int
+    tickets: int
+    expected_tickets: int
+    discrepancies: list
+    totals: dict
+
+
+def _user_sum(queryset, user_field, expression):
+    """Somme de `expression` pour l'utilisateur de la requête externe (0 si aucune ligne)"""
+    return Coalesce(Subquery(
+        queryset.filter(**{user_field: OuterRef('pk')}).order_by()
+        .values(user_field).annotate(total=Sum(expression)).values('total')
+    ), 0)
+
+
+def safety_cutoff():
+    """Les mouvements créés après cette date peuvent encore être précédés par un commit plus lent"""
+    return timezone.now() - timedelta(seconds=getattr(settings, 'RECONCILIATION_SAFETY_WINDOW', 10 * 60))
+
+
+def _latest_snapshots():
+    return BalanceSnapshot.objects.filter(user=OuterRef('pk')).order_by('-last_transaction_id', '-id')
+
+
+def _ledger_total(**filters):
+    return Coalesce(Subquery(
+        WalletTransaction.objects.filter(user=OuterRef('pk'), **filters)
+        .order_by().values('user').annotate(total=Sum('amount')).values('total')
+    ), 0)
+
+
+def annotated_users(queryset, cutoff=None):
+    """Ajoute aux utilisateurs leur solde attendu, leur nouvelle base et les tickets engagés"""
+    cutoff = cutoff or safety_cutoff()
+    snapshots = _latest_snapshots()
+    ledger = WalletTransaction.objects.filter(user=OuterRef('pk'))
+    held = Escrow.objects.filter(status='held')
+
+    queryset = queryset.annotate(
+        snapshot_baseline=Subquery(snapshots.values('baseline_tickets')[:1]),
+        snapshot_transaction_id=Coalesce(Subquery(snapshots.values('last_transaction_id')[:1]), 0),
+        opening_tickets=Subquery(
+            ledger.order_by('id').annotate(opening=F('balance_after') - F('amount')).values('opening')[:1]
+        ),
+    ).annotate(
+        previous_baseline=Coalesce(
+            'snapshot_baseline', 'opening_tickets', 'tickets', output_field=models.IntegerField()
+        ),
+        # La base avance jusqu'au dernier mouvement sorti de la fenêtre de sécurité
+        last_transaction_id=Coalesce(Subquery(
+            ledger.filter(id__gt=OuterRef('snapshot_transaction_id'), created_at__lt=cutoff)
+            .order_by('-id').values('id')[:1]
+        ), F('snapshot_transaction_id')),
+    )
+    return queryset.annotate(
+        expected_tickets=F('previous_baseline') + _ledger_total(id__gt=OuterRef('snapshot_transaction_id')),
+        baseline_tickets=F('previous_baseline') + _ledger_total(
+            id__gt=OuterRef('snapshot_transaction_id'), id__lte=OuterRef('last_transaction_id')
+        ),
+        staked_tickets=_user_sum(held.filter(duel__isnull=False), 'user', 'amount'),
+        tournament_tickets=_user_sum(held.filter(tournament__isnull=False), 'user', 'amount'),
+        withdrawal_tickets=_user_sum(
+            Withdrawal.objects.filter(status__in=PENDING_WITHDRAWAL_STATUSES), 'user', 'amount_tickets'
+        ),
+    )
+
+
+def changed_users(full=False):
+    """Utilisateurs à réexaminer : ceux qui ont un mouvement après la base de leur dernier relevé"""
+    if full:
+        return User.objects.all()
+    watermark = Coalesce(Subquery(_latest_snapshots().values('last_transaction_id')[:1]), 0)
+    return User.objects.alias(watermark=watermark).filter(
+        Exists(WalletTransaction.objects.filter(user=OuterRef('pk'), id__gt=OuterRef('watermark')))
+    )
+
+
+def global_totals():
+    """Tickets en circulation et tickets engagés, sur toute la plateforme"""
+    users = User.objects.aggregate(
+        circulating=Coalesce(Sum('tickets'), 0),
+        locked=Coalesce(Sum('locked_tickets'), 0),
+    )
+    escrows = Escrow.objects.filter(status='held').aggregate(
+        staked=Coalesce(Sum('amount', filter=Q(duel__isnull=False)), 0),
+        tournaments=Coalesce(Sum('amount', filter=Q(tournament__isnull=False)), 0),
+    )
+    return {
+        'circulating': users['circulating'],
+        'staked': escrows['staked'],
+        'tournaments': escrows['tournaments'],
+        'withdrawals': Withdrawal.objects.filter(
+            status__in=PENDING_WITHDRAWAL_STATUSES
+        ).aggregate(total=Coalesce(Sum('amount_tickets'), 0))['total'],
+        # Compteur User.locked_tickets, à comparer aux séquestres (staked + tournaments)
+        'locked': users['locked'],
+    }
+
+
+def reconcile(full=False, chunk_size=2000, write=True):
+    """Compare soldes réels et attendus ; enregistre un relevé par utilisateur examiné"""
+    rows = (
+        annotated_users(changed_users(full))
+        .order_by('id')
+        .values_list('id', 'username', *SNAPSHOT_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    examined = tickets_total = expected_total = 0
+    discrepancies = []
+    batch = []
+
+    def flush():
+        if write and batch:
+            with transaction.atomic():
+                BalanceSnapshot.objects.bulk_create(batch)
+        batch.clear()
+
+    for user_id, username, *values in rows:
+        snapshot = BalanceSnapshot(user_id=user_id, **dict(zip(SNAPSHOT_FIELDS, values)))
+        examined += 1
+        tickets_total += snapshot.tickets
+        expected_total += snapshot.expected_tickets
+        if snapshot.discrepancy:
+            discrepancies.append(Discrepancy(user_id, username, snapshot.tickets, snapshot.expected_tickets))
+        batch.append(snapshot)
+        if len(batch) >= chunk_size:
+            flush()
+    flush()
+
+    return ReconciliationReport(examined, tickets_total, expected_total, discrepancies, global_totals())
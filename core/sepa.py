@@ -0,0 +1,134 @@
+"""
+Export des retraits au format SEPA Credit Transfer (pain.001.001.03).
+
+Le fichier est produit en flux : les totaux de l'en-tête viennent d'une
+requête d'agrégat, puis les virements sont lus avec `.iterator(chunk_size=...)`
+et émis par blocs. La mémoire utilisée reste constante, quel que soit le
+nombre de retraits exportés.
+
+Le queryset doit désigner un ensemble stable (par exemple des retraits
+`completed` sur une période close), sans quoi l'en-tête et le détail
+pourraient diverger.
+
+Le compte débiteur (`settings.SEPA_DEBTOR`) est vérifié avant toute lecture :
+sans nom, IBAN ou BIC valides, `iter_pain001` lève ValueError plutôt que de
+produire un fichier que la banque rejetterait.
+"""
+import uuid
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from . import banking
+
+PAIN_001_NAMESPACE = 'urn:iso:std:iso:20022:tech:xsd:pain.001.001.03'
+MAX_NAME_LENGTH = 70
+CENTS = Decimal('0.01')
+
+EXPORT_FIELDS = ('id', 'amount_euros', 'bank_account_holder', 'bank_iban', 'bank_bic')
+
+
+def _text(value, max_length=None):
+    value = str(value or '')
+    if max_length:
+        value = value[:max_length]
+    return escape(value)
+
+
+def _amount(value):
+    return str(Decimal(value or 0).quantize(CENTS))
+
+
+def _header(message_id, count, total, debtor, execution_date):
+    now = timezone.now().replace(microsecond=0).isoformat()
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<Document xmlns="{PAIN_001_NAMESPACE}">'
+        '<CstmrCdtTrfInitn>'
+        '<GrpHdr>'
+        f'<MsgId>{_text(message_id, 35)}</MsgId>'
+        f'<CreDtTm>{now}</CreDtTm>'
+        f'<NbOfTxs>{count}</NbOfTxs>'
+        f'<CtrlSum>{_amount(total)}</CtrlSum>'
+        f'<InitgPty><Nm>{_text(debtor["name"], MAX_NAME_LENGTH)}</Nm></InitgPty>'
+        '</GrpHdr>'
+        '<PmtInf>'
+        f'<PmtInfId>{_text(message_id, 35)}</PmtInfId>'
+        '<PmtMtd>TRF</PmtMtd>'
+        '<BtchBookg>true</BtchBookg>'
+        f'<NbOfTxs>{count}</NbOfTxs>'
+        f'<CtrlSum>{_amount(total)}</CtrlSum>'
+        '<PmtTpInf><SvcLvl><Cd>SEPA</Cd></SvcLvl></PmtTpInf>'
+        f'<ReqdExctnDt>{execution_date.isoformat()}</ReqdExctnDt>'
+        f'<Dbtr><Nm>{_text(debtor["name"], MAX_NAME_LENGTH)}</Nm></Dbtr>'
+        f'<DbtrAcct><Id><IBAN>{_text(debtor["iban"])}</IBAN></Id></DbtrAcct>'
+        f'<DbtrAgt><FinInstnId><BIC>{_text(debtor["bic"])}</BIC></FinInstnId></DbtrAgt>'
+        '<ChrgBr>SLEV</ChrgBr>\n'
+    )
+
+
+def _transaction(withdrawal_id, amount_euros, holder, iban, bic):
+    return (
+        '<CdtTrfTxInf>'
+        f'<PmtId><EndToEndId>PIB-W{withdrawal_id}</EndToEndId></PmtId>'
+        f'<Amt><InstdAmt Ccy="EUR">{_amount(amount_euros)}</InstdAmt></Amt>'
+        f'<CdtrAgt><FinInstnId><BIC>{_text(bic)}</BIC></FinInstnId></CdtrAgt>'
+        f'<Cdtr><Nm>{_text(holder, MAX_NAME_LENGTH)}</Nm></Cdtr>'
+        f'<CdtrAcct><Id><IBAN>{_text(iban)}</IBAN></Id></CdtrAcct>'
+        f'<RmtInf><Ustrd>Retrait PlayInBet {withdrawal_id}</Ustrd></RmtInf>'
+        '</CdtTrfTxInf>\n'
+    )
+
+
+def validated_debtor(debtor=None):
+    """Compte débiteur (IBAN et BIC normalisés) ; lève ValueError s'il est incomplet ou invalide"""
+    debtor = debtor or settings.SEPA_DEBTOR
+    if not str(debtor.get('name') or '').strip():
+        raise ValueError("Compte débiteur SEPA invalide : le nom est obligatoire (SEPA_DEBTOR_NAME)")
+    try:
+        iban = banking.validate_iban(debtor.get('iban'))
+        bic = banking.validate_bic(debtor.get('bic'))
+        banking.validate_pair(iban, bic)
+    except ValueError as exc:
+        raise ValueError(f"Compte débiteur SEPA invalide : {exc} (SEPA_DEBTOR_IBAN / SEPA_DEBTOR_BIC)") from exc
+    return {**debtor, 'iban': iban, 'bic': bic}
+
+
+def iter_pain001(queryset, debtor=None, message_id=None, execution_date=None, chunk_size=2000):
+    """
+    Générateur du document pain.001 par morceaux de `chunk_size` virements.
+
+    Le compte débiteur est validé dès l'appel (ValueError), avant le premier morceau.
+    """
+    debtor = validated_debtor(debtor)
+    message_id = message_id or f"PIB-{uuid.uuid4().hex[:20].upper()}"
+    execution_date = execution_date or timezone.localdate()
+    return _document(queryset, debtor, message_id, execution_date, chunk_size)
+
+
+def _document(queryset, debtor, message_id, execution_date, chunk_size):
+    totals = queryset.aggregate(count=Count('id'), total=Sum('amount_euros'))
+    yield _header(message_id, totals['count'], totals['total'], debtor, execution_date)
+
+    rows = queryset.order_by('id').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    buffer = []
+    for row in rows:
+        buffer.append(_transaction(*row))
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+    yield '</PmtInf></CstmrCdtTrfInitn></Document>\n'
+
+
+def write_pain001(queryset, fileobj, **kwargs):
+    """Écrit le document dans un fichier texte ouvert ; retourne le nombre de caractères écrits"""
+    written = 0
+    for chunk in iter_pain001(queryset, **kwargs):
+        written += fileobj.write(chunk)
+    return written
@@ -1,5 +1,9 @@
 from rest_framework import serializers
-from .models import User, Duel, Tournament, TournamentParticipant, TournamentMatch, Withdrawal
+from rest_framework.settings import api_settings
+from .models import User, KYCProfile, Duel, Tournament, TournamentParticipant, TournamentMatch, Withdrawal, WalletTransaction, UserStats
+from .profile_cache import profile_cache
+from .games import category_display, game_display
+from . import banking
 from django.contrib.auth.password_validation import validate_password
 
 class UserSerializer(serializers.ModelSerializer):
@@ -55,10 +59,12 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return round((obj.victories / total) * 100, 1)
 
 class KYCVerificationSerializer(serializers.ModelSerializer):
-    """Serializer pour la vérification KYC"""
+    """Serializer pour la vérification KYC (profil KYC, nom et prénom sur l'utilisateur)"""
+    first_name = serializers.CharField(source='user.first_name', max_length=150, required=False, allow_blank=True)
+    last_name = serializers.CharField(source='user.last_name', max_length=150, required=False, allow_blank=True)
     
     class Meta:
-        model = User
+        model = KYCProfile
         fields = [
             'first_name', 'last_name', 'date_of_birth', 'nationality', 
             'phone_number', 'address', 'city', 'postal_code', 'country',
@@ -80,32 +86,18 @@ class KYCVerificationSerializer(serializers.ModelSerializer):
         return value
     
     def validate_iban(self, value):
-        """Validation basique de l'IBAN"""
-        if not value:
-            raise serializers.ValidationError("L'IBAN est obligatoire")
-        
-        # Supprime les espaces et convertit en majuscules
-        iban = value.replace(' ', '').upper()
-        
-        # Vérification de la longueur (entre 15 et 34 caractères)
-        if len(iban) < 15 or len(iban) > 34:
-            raise serializers.ValidationError("L'IBAN doit contenir entre 15 et 34 caractères")
-        
-        return iban
+        """IBAN complet : longueur du pays et clé mod 97"""
+        try:
+            return banking.validate_iban(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
     
     def validate_bic(self, value):
-        """Validation basique du BIC"""
-        if not value:
-            raise serializers.ValidationError("Le BIC est obligatoire")
-        
-        # Supprime les espaces et convertit en majuscules
-        bic = value.replace(' ', '').upper()
-        
-        # Vérification de la longueur (8 ou 11 caractères)
-        if len(bic) not in [8, 11]:
-            raise serializers.ValidationError("Le BIC doit contenir 8 ou 11 caractères")
-        
-        return bic
+        """Structure du BIC (ISO 9362)"""
+        try:
+            return banking.validate_bic(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
     
     def validate(self, attrs):
         """Validation globale"""
@@ -115,12 +107,26 @@ class KYCVerificationSerializer(serializers.ModelSerializer):
             'bank_name', 'iban', 'bic'
         ]
         
+        values = {**attrs.get('user', {}), **attrs}
         for field in required_fields:
-            if not attrs.get(field):
+            if not values.get(field):
                 field_verbose = self.fields[field].label or field
                 raise serializers.ValidationError(f"Le champ {field_verbose} est obligatoire")
         
+        try:
+            banking.validate_pair(attrs['iban'], attrs['bic'])
+        except ValueError as exc:
+            raise serializers.ValidationError({'bic': str(exc)})
+        
         return attrs
+    
+    def update(self, instance, validated_data):
+        user_data = validated_data.pop('user', {})
+        if user_data:
+            for attr, value in user_data.items():
+                setattr(instance.user, attr, value)
+            instance.user.save(update_fields=list(user_data))
+        return super().update(instance, validated_data)
 
 class UserEditSerializer(serializers.ModelSerializer):
     """Serializer for editing user profile"""
@@ -147,10 +153,23 @@ class UserProfileSerializer(serializers.ModelSerializer):
     can_play = serializers.SerializerMethodField()
     can_withdraw = serializers.SerializerMethodField()
     
+    # Données KYC lues sur KYCProfile (null si rien n'a été soumis) ; modifiables via /api/kyc/submit/
+    verification_notes = serializers.CharField(source='kyc.verification_notes', read_only=True)
+    date_of_birth = serializers.DateField(source='kyc.date_of_birth', read_only=True)
+    nationality = serializers.CharField(source='kyc.nationality', read_only=True)
+    phone_number = serializers.CharField(source='kyc.phone_number', read_only=True)
+    address = serializers.CharField(source='kyc.address', read_only=True)
+    city = serializers.CharField(source='kyc.city', read_only=True)
+    postal_code = serializers.CharField(source='kyc.postal_code', read_only=True)
+    country = serializers.CharField(source='kyc.country', read_only=True)
+    bank_name = serializers.CharField(source='kyc.bank_name', read_only=True)
+    iban = serializers.CharField(source='kyc.iban', read_only=True)
+    bic = serializers.CharField(source='kyc.bic', read_only=True)
+    
     class Meta:
         model = User
         fields = [
-            'id', 'username', 'email', 'first_name', 'last_name', 'tickets',
+            'id', 'username', 'email', 'first_name', 'last_name', 'tickets', 'locked_tickets',
             'is_verified', 'verification_status', 'verification_status_display',
             'verification_submitted_at', 'verification_completed_at', 
             'verification_notes', 'can_play', 'can_withdraw',
@@ -158,7 +177,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'city', 'postal_code', 'country', 'bank_name', 'iban', 'bic'
         ]
         read_only_fields = [
-            'id', 'tickets', 'is_verified', 'verification_status',
+            'id', 'tickets', 'locked_tickets', 'is_verified', 'verification_status',
             'verification_submitted_at', 'verification_completed_at', 
             'verification_notes', 'can_play', 'can_withdraw'
         ]
@@ -169,10 +188,16 @@ class UserProfileSerializer(serializers.ModelSerializer):
     def get_can_withdraw(self, obj):
         return obj.can_withdraw()
 
+class CachedUserProfileSerializer(UserProfileSerializer):
+    """Profil imbriqué (lecture seule) servi depuis le cache des profils"""
+    
+    def to_representation(self, instance):
+        return profile_cache.get_or_build(instance, super().to_representation)
+
 class DuelSerializer(serializers.ModelSerializer):
-    creator = UserProfileSerializer(read_only=True)
-    opponent = UserProfileSerializer(read_only=True)
-    winner = UserProfileSerializer(read_only=True)
+    creator = CachedUserProfileSerializer(read_only=True)
+    opponent = CachedUserProfileSerializer(read_only=True)
+    winner = CachedUserProfileSerializer(read_only=True)
     game_display = serializers.CharField(source='get_game_type_display', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     category_display = serializers.CharField(source='get_category_display', read_only=True)
@@ -185,14 +210,16 @@ class DuelSerializer(serializers.ModelSerializer):
     class Meta:
         model = Duel
         fields = [
-            'id', 'creator', 'opponent', 'game_type', 'game_display', 'category_display',
+            'id', 'creator', 'opponent', 'game_type', 'game_display', 'category', 'category_display',
             'amount', 'duration_minutes', 'winner', 'status', 'status_display', 
             'creator_action', 'opponent_action', 'creator_screenshot', 'opponent_screenshot',
             'creator_ready', 'opponent_ready', 'both_players_ready',
             'ai_validation_result', 'ai_confidence', 'created_at', 'started_at', 
             'expires_at', 'completed_at', 'is_expired', 'time_remaining', 'time_elapsed', 'can_join',
-            'admin_resolution', 'admin_reason', 'resolved_by', 'resolved_at'
+            'admin_resolution', 'admin_reason', 'resolved_by', 'resolved_at',
+            'rematch_requested_by', 'original_duel'
         ]
+        read_only_fields = ['rematch_requested_by', 'original_duel']
         
     def get_is_expired(self, obj):
         return obj.is_expired()
@@ -220,18 +247,95 @@ class DuelSerializer(serializers.ModelSerializer):
         validated_data['creator'] = self.context['request'].user
         return super().create(validated_data)
 
+class DuelLobbySerializer(serializers.Serializer):
+    """Représentation compacte d'un duel ouvert, construite depuis une ligne `.values()`"""
+    LOBBY_FIELDS = ('id', 'game_type', 'category', 'amount', 'created_at',
+                    'creator_id', 'creator__username', 'creator__rank')
+    
+    id = serializers.IntegerField()
+    game_type = serializers.CharField()
+    game_display = serializers.SerializerMethodField()
+    category = serializers.CharField()
+    category_display = serializers.SerializerMethodField()
+    amount = serializers.IntegerField()
+    creator_id = serializers.IntegerField()
+    creator_username = serializers.CharField(source='creator__username')
+    creator_rank = serializers.CharField(source='creator__rank')
+    created_at = serializers.DateTimeField()
+    can_join = serializers.SerializerMethodField()
+    
+    def get_game_display(self, row):
+        return game_display(row['game_type'])
+    
+    def get_category_display(self, row):
+        return category_display(row['category'])
+    
+    def get_can_join(self, row):
+        """Même règle que Duel.can_join, sur un duel déjà filtré comme ouvert (solde dans `viewer_tickets`)"""
+        request = self.context.get('request')
+        tickets = self.context.get('viewer_tickets')
+        if not request or tickets is None:
+            return False
+        return row['creator_id'] != request.user.id and tickets >= row['amount']
+
+class DuelHistorySerializer(serializers.Serializer):
+    """Duel de l'historique d'un joueur, construit depuis une ligne `.values()` (voir UserViewSet.duels)"""
+    HISTORY_FIELDS = ('id', 'game_type', 'category', 'amount', 'status', 'winner_id', 'created_at', 'completed_at')
+    
+    id = serializers.IntegerField()
+    game_type = serializers.CharField()
+    game_display = serializers.SerializerMethodField()
+    category = serializers.CharField()
+    amount = serializers.IntegerField()
+    status = serializers.CharField()
+    status_display = serializers.SerializerMethodField()
+    role = serializers.CharField()
+    opponent = serializers.SerializerMethodField()
+    result = serializers.SerializerMethodField()
+    created_at = serializers.DateTimeField()
+    completed_at = serializers.DateTimeField()
+    
+    def get_game_display(self, row):
+        return game_display(row['game_type'])
+    
+    def get_status_display(self, row):
+        return dict(Duel.STATUS_CHOICES).get(row['status'], row['status'])
+    
+    def get_opponent(self, row):
+        if row['rival_id'] is None:
+            return None
+        return {'id': row['rival_id'], 'username': row['rival_username'], 'rank': row['rival_rank']}
+    
+    def get_result(self, row):
+        """'victory' / 'defeat' du point de vue du joueur, None tant qu'il n'y a pas de vainqueur"""
+        if row['winner_id'] is None:
+            return None
+        return 'victory' if row['winner_id'] != row['rival_id'] else 'defeat'
+
+class UserStatsSerializer(serializers.ModelSerializer):
+    """Agrégats d'un joueur pour un jeu (ou tous jeux confondus si `game_type` est vide)"""
+    game_display = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UserStats
+        fields = ['game_type', 'game_display', 'played', 'wins', 'losses', 'win_rate',
+                  'tickets_won', 'tickets_lost', 'average_stake', 'current_streak', 'best_streak']
+    
+    def get_game_display(self, obj):
+        return game_display(obj.game_type) if obj.game_type else None
+
 class TournamentParticipantSerializer(serializers.ModelSerializer):
-    user = UserProfileSerializer(read_only=True)
+    user = CachedUserProfileSerializer(read_only=True)
     
     class Meta:
         model = TournamentParticipant
         fields = ['user', 'registered_at', 'eliminated_at', 'final_position']
 
 class TournamentMatchSerializer(serializers.ModelSerializer):
-    player1 = UserProfileSerializer(read_only=True)
-    player2 = UserProfileSerializer(read_only=True)
-    winner = UserProfileSerializer(read_only=True)
-    loser = UserProfileSerializer(read_only=True)
+    player1 = CachedUserProfileSerializer(read_only=True)
+    player2 = CachedUserProfileSerializer(read_only=True)
+    winner = CachedUserProfileSerializer(read_only=True)
+    loser = CachedUserProfileSerializer(read_only=True)
     
     class Meta:
         model = TournamentMatch
@@ -257,9 +361,29 @@ class TournamentSerializer(serializers.ModelSerializer):
                  'end_date', 'status', 'status_display', 'winner', 'is_full', 'can_register',
                  'participants', 'matches', 'created_at']
 
+class KYCQueueSerializer(serializers.ModelSerializer):
+    """Soumission KYC dans la file de revue admin"""
+    kyc_claimed_by = serializers.CharField(source='kyc_claimed_by.username', read_only=True, default=None)
+    first_name_kyc = serializers.CharField(source='kyc.first_name_kyc', read_only=True)
+    last_name_kyc = serializers.CharField(source='kyc.last_name_kyc', read_only=True)
+    date_of_birth = serializers.DateField(source='kyc.date_of_birth', read_only=True)
+    nationality = serializers.CharField(source='kyc.nationality', read_only=True)
+    country = serializers.CharField(source='kyc.country', read_only=True)
+    identity_document = serializers.CharField(source='kyc.identity_document', read_only=True)
+    proof_of_address = serializers.CharField(source='kyc.proof_of_address', read_only=True)
+    
+    class Meta:
+        model = User
+        fields = [
+            'id', 'username', 'email', 'first_name_kyc', 'last_name_kyc', 'first_name', 'last_name',
+            'date_of_birth', 'nationality', 'country', 'identity_document', 'proof_of_address',
+            'verification_submitted_at', 'kyc_claimed_by', 'kyc_claimed_at'
+        ]
+        read_only_fields = fields
+
 class WithdrawalSerializer(serializers.ModelSerializer):
     """Serializer pour les demandes de retrait"""
-    user = UserProfileSerializer(read_only=True)
+    user = CachedUserProfileSerializer(read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     
     class Meta:
@@ -287,16 +411,23 @@ class WithdrawalRequestSerializer(serializers.ModelSerializer):
         return value
     
     def validate_bank_iban(self, value):
-        if not value or len(value) < 15:
-            raise serializers.ValidationError("IBAN invalide")
-        return value.upper().replace(' ', '')
+        try:
+            return banking.validate_iban(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
     
     def validate_bank_bic(self, value):
-        if not value or len(value) < 8:
-            raise serializers.ValidationError("BIC invalide")
-        return value.upper()
+        try:
+            return banking.validate_bic(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
     
     def validate(self, attrs):
+        try:
+            banking.validate_pair(attrs['bank_iban'], attrs['bank_bic'])
+        except ValueError as exc:
+            raise serializers.ValidationError({'bank_bic': str(exc)})
+        
         user = self.context['request'].user
         amount_euros = attrs['amount_euros']
         tickets_needed = int(amount_euros * 10)
@@ -307,4 +438,53 @@ class WithdrawalRequestSerializer(serializers.ModelSerializer):
                 f"mais {tickets_needed} sont nécessaires pour {amount_euros}€"
             )
         
-        return attrs
\ No newline at end of file
+        return attrs
+
+class StrictKeysMixin:
+    """Refuse les clés inconnues plutôt que de les ignorer (une faute de frappe élargirait la sélection)"""
+    
+    def to_internal_value(self, data):
+        if isinstance(data, dict):
+            unknown = set(data) - set(self.fields)
+            if unknown:
+                raise serializers.ValidationError(
+                    {api_settings.NON_FIELD_ERRORS_KEY: [f"Clés inconnues : {', '.join(sorted(unknown))}"]}
+                )
+        return super().to_internal_value(data)
+
+class WithdrawalBulkFilterSerializer(StrictKeysMixin, serializers.Serializer):
+    """Filtre d'une action groupée sur les retraits"""
+    status = serializers.ChoiceField(choices=Withdrawal.STATUS_CHOICES, required=False)
+    user_id = serializers.IntegerField(required=False)
+    max_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError("Le filtre ne peut pas être vide")
+        return attrs
+
+class WithdrawalBulkSerializer(StrictKeysMixin, serializers.Serializer):
+    """Corps de bulk_approve / bulk_reject : une liste `ids` et/ou un `filter`"""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    filter = WithdrawalBulkFilterSerializer(required=False)
+    reason = serializers.CharField(required=False, default="Rejeté par l'administrateur")
+    
+    def validate(self, attrs):
+        if 'ids' not in attrs and 'filter' not in attrs:
+            raise serializers.ValidationError("Fournissez une liste 'ids' ou un 'filter'")
+        return attrs
+
+class KYCReleaseSerializer(StrictKeysMixin, serializers.Serializer):
+    """Corps de la libération de réservations KYC : sans `ids`, toutes celles de l'admin"""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+class WalletTransactionSerializer(serializers.ModelSerializer):
+    """Serializer pour l'historique du portefeuille"""
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+    
+    class Meta:
+        model = WalletTransaction
+        fields = ['id', 'kind', 'kind_display', 'amount', 'balance_after',
+                 'duel', 'tournament', 'withdrawal', 'created_at']
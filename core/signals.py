@@ -0,0 +1,42 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import INVALIDATING_FIELDS, invalidate_user_tokens, token_cache
+from .models import KYCProfile, User
+from .profile_cache import invalidate_profile
+from .serializers import UserProfileSerializer
+
+# Champs dont dépend le profil sérialisé (tickets, victoires, rang, KYC...)
+PROFILE_FIELDS = frozenset(UserProfileSerializer.Meta.fields) | {
+    'victories', 'rank', 'role',
+}
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_profile(sender, instance, update_fields=None, **kwargs):
+    """Invalide le profil en cache quand un champ affiché change"""
+    if update_fields is None or PROFILE_FIELDS.intersection(update_fields):
+        invalidate_profile(instance.pk)
+    if update_fields is None or INVALIDATING_FIELDS.intersection(update_fields):
+        # `_password` n'est renseigné qu'entre set_password() et la fin de save()
+        password_changed = instance._password is not None or 'password' in (update_fields or ())
+        invalidate_user_tokens(instance.pk, password_changed=password_changed)
+
+
+@receiver(post_delete, sender=User)
+def drop_cached_profile(sender, instance, **kwargs):
+    invalidate_profile(instance.pk)
+    invalidate_user_tokens(instance.pk, password_changed=True)
+
+
+@receiver(post_delete, sender=Token)
+def drop_cached_token(sender, instance, **kwargs):
+    """Déconnexion (djoser token/logout) : le token ne doit plus authentifier"""
+    token_cache.invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=KYCProfile)
+@receiver(post_delete, sender=KYCProfile)
+def invalidate_profile_kyc(sender, instance, **kwargs):
+    """Le profil sérialisé affiche aussi les données KYC"""
+    invalidate_profile(instance.user_id)
@@ -0,0 +1,35 @@
+"""
+Profil de performance SQLite pour les déploiements mono-serveur.
+
+Activé avec PLAYINBET_DB_PROFILE=sqlite-wal (voir settings.py) : chaque
+nouvelle connexion reçoit les PRAGMA ci-dessous via le signal
+`connection_created`, et les transactions démarrent en `BEGIN IMMEDIATE`
+pour que les écrivains concurrents attendent le verrou au lieu d'échouer
+avec "database is locked" au moment de l'écriture.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+BUSY_TIMEOUT_MS = 5000
+
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+    ('mmap_size', 256 * 1024 * 1024),  # 256 Mo
+    ('cache_size', -64 * 1024),  # en Kio : 64 Mo
+)
+
+
+def apply_pragmas(cursor):
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or not getattr(settings, 'SQLITE_TUNING', False):
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor)
@@ -1,3 +1,1463 @@
-from django.test import TestCase
+import csv
+import json
+import random
+import re
+import time
+import types
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection, connections, transaction
+from django.urls import include, path
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import duel_states, ranks, throttling, user_stats
+from .admin_views import AdminDuelViewSet
+from .db_routers import ReadReplicaRouter, use_primary, viewset_action
+from .ledger import InsufficientTickets, stake
+from .models import Duel, Escrow, Tournament, User, UserStats, Withdrawal
+from .wallet_views import AdminWithdrawalViewSet
+
+
+class ThrottleResetMixin:
+    """Compteurs de débit vides à chaque test (le store est global au processus)"""
+
+    def setUp(self):
+        super().setUp()
+        throttling.reset_throttle_store()
+
+
+@override_settings(DATABASE_REPLICA_ALIAS='replica')
+class ReadReplicaRouterTests(ThrottleResetMixin, TransactionTestCase):
+    """Décisions de routage avec 'default' et 'replica' comme alias SQLite"""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        super().setUp()
+        self.router = ReadReplicaRouter()
+
+    def test_read_only_actions_use_replica(self):
+        for action in ['list', 'retrieve', 'leaderboard', 'stats']:
+            with viewset_action(action):
+                self.assertEqual(self.router.db_for_read(Duel), 'replica')
+
+    def test_write_actions_use_primary(self):
+        for action in ['create', 'join', 'forfeit', 'register', None]:
+            with viewset_action(action):
+                self.assertEqual(self.router.db_for_read(Duel), 'default')
+
+    def test_reads_inside_transaction_use_primary(self):
+        with viewset_action('list'):
+            with transaction.atomic():
+                self.assertEqual(self.router.db_for_read(User), 'default')
+            with use_primary():
+                self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_writes_always_use_primary(self):
+        with viewset_action('list'):
+            self.assertEqual(self.router.db_for_write(User), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'core'))
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+
+    @override_settings(DATABASE_REPLICA_ALIAS=None)
+    def test_no_replica_configured(self):
+        with viewset_action('list'):
+            self.assertEqual(self.router.db_for_read(Duel), 'default')
+
+    def test_viewsets_declare_their_action(self):
+        creator = User.objects.create_user('router', password='x', tickets=100)
+        opponent = User.objects.create_user('router2', password='x', tickets=100)
+        client = APIClient()
+        client.force_authenticate(creator)
+
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = client.get('/api/users/leaderboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('router', [row['username'] for row in response.data])
+        self.assertTrue(replica.captured_queries)
+
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connections['default']) as default:
+            response = client.post('/api/duels/', {'game_type': 'match_foot', 'amount': 10})
+            self.assertEqual(response.status_code, 201)
+            client.force_authenticate(opponent)
+            response = client.post(f"/api/duels/{response.data['id']}/join/")
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica.captured_queries, [])
+        self.assertTrue(default.captured_queries)
+
+
+class DuelStateMachineTests(TestCase):
+    """Séquences d'actions aléatoires (graines fixes) : invariants vérifiés après chaque pas"""
+
+    SEEDS = range(100)
+    STEPS = 20
+    # Pondérations : les actions terminales sont rares pour atteindre les statuts profonds
+    ACTIONS = {'join': 3, 'withdraw': 1, 'ready': 4, 'claim_victory': 4, 'forfeit': 1, 'admit_defeat': 1,
+               'confirm_result': 2, 'expire': 1, 'cancel': 1, 'resolve_dispute': 2}
+    # Statuts atteignables en un appel (claim_victory peut enchaîner sur un litige)
+    REACHABLE = {
+        action: transition.targets | (duel_states.TRANSITIONS['dispute'].targets if action == 'claim_victory' else set())
+        for action, transition in duel_states.TRANSITIONS.items()
+    }
+
+    def setUp(self):
+        self.creator = User.objects.create_user('creator', password='x', tickets=100)
+        self.opponent = User.objects.create_user('opponent', password='x', tickets=100)
+        self.poor = User.objects.create_user('poor', password='x', tickets=5)
+        self.admin = User.objects.create_user('admin', password='x', tickets=0, is_staff=True)
+        self.users = [self.creator, self.opponent, self.poor, self.admin]
+        self.user_weights = [3, 3, 1, 1]
+
+    def _run(self, rng, action, duel, actor):
+        if action in ('forfeit', 'admit_defeat', 'confirm_result'):
+            duel_states.concede(duel, actor, action)
+        elif action in ('join', 'ready', 'claim_victory'):
+            getattr(duel_states, action)(duel, actor)
+        elif action == 'withdraw':
+            duel_states.withdraw(duel)
+        elif action == 'expire':
+            duel_states.expire(duel)
+        elif action == 'cancel':
+            duel_states.cancel(duel, self.admin, 'test')
+        else:
+            winner = rng.choice([duel.creator, duel.opponent or duel.creator])
+            duel_states.resolve_dispute(duel, self.admin, winner, 'test')
+
+    def _total_tickets(self):
+        totals = User.objects.aggregate(tickets=Sum('tickets'), locked=Sum('locked_tickets'))
+        return totals['tickets'] + totals['locked']
+
+    def _assert_invariants(self, duel_id, total):
+        self.assertEqual(self._total_tickets(), total)
+        for user in User.objects.all():
+            held = Escrow.objects.filter(user=user, status='held').aggregate(total=Sum('amount'))['total'] or 0
+            self.assertEqual(user.locked_tickets, held)
+
+        duel = Duel.objects.filter(pk=duel_id).first()
+        if duel is None:
+            self.assertFalse(Escrow.objects.filter(duel_id=duel_id, status='held').exists())
+            return None
+        self.assertIn(duel.status, dict(Duel.STATUS_CHOICES))
+        if duel.status in duel_states.TERMINAL_STATUSES:
+            self.assertFalse(Escrow.objects.filter(duel=duel, status='held').exists())
+        if duel.status == 'completed':
+            self.assertIn(duel.winner_id, [duel.creator_id, duel.opponent_id])
+        if duel.status == 'active':
+            self.assertTrue(duel.creator_ready and duel.opponent_ready and duel.expires_at)
+        return duel
+
+    def test_random_action_sequences(self):
+        for seed in self.SEEDS:
+            rng = random.Random(seed)
+            with self.subTest(seed=seed), transaction.atomic():
+                duel = Duel.objects.create(creator=self.creator, game_type='match_foot', amount=rng.randint(1, 60))
+                stake(self.creator, duel.amount, 'duel_stake', duel=duel)
+                total = self._total_tickets()
+
+                for _ in range(self.STEPS):
+                    action, = rng.choices(list(self.ACTIONS), weights=list(self.ACTIONS.values()))
+                    actor, = rng.choices(self.users, weights=self.user_weights)
+                    before = duel.status
+                    try:
+                        self._run(rng, action, duel, actor)
+                        applied = True
+                    except (duel_states.TransitionError, InsufficientTickets):
+                        applied = False
+
+                    after = self._assert_invariants(duel.pk, total)
+                    if not applied:
+                        self.assertEqual(after.status, before)
+                    else:
+                        self.assertIn(before, duel_states.TRANSITIONS[action].sources)
+                        if after is None:
+                            self.assertEqual(action, 'withdraw')
+                            break
+                        self.assertIn(after.status, self.REACHABLE[action])
+                    if before in duel_states.TERMINAL_STATUSES:
+                        self.assertEqual(after.status, before)
+                    duel = after
+
+                transaction.set_rollback(True)
+
+
+
+class RematchTests(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user('creator', password='x', tickets=100)
+        self.opponent = User.objects.create_user('opponent', password='x', tickets=100)
+        self.duel = Duel.objects.create(
+            creator=self.creator, opponent=self.opponent, game_type='match_foot', amount=30,
+            status='completed', winner=self.creator,
+        )
+
+    def test_accepted_rematch_starts_with_both_stakes(self):
+        duel_states.request_rematch(self.duel, self.opponent)
+        with self.assertRaises(duel_states.TransitionError):
+            duel_states.accept_rematch(self.duel, self.opponent)
+
+        rematch = duel_states.accept_rematch(self.duel, self.creator)
+        self.assertEqual((rematch.creator, rematch.opponent, rematch.original_duel), (self.opponent, self.creator, self.duel))
+        self.assertEqual(rematch.status, 'active')
+        self.assertTrue(rematch.creator_ready and rematch.opponent_ready and rematch.expires_at)
+        self.assertEqual(
+            sorted(Escrow.objects.filter(duel=rematch, status='held').values_list('user_id', 'amount')),
+            [(self.creator.pk, 30), (self.opponent.pk, 30)],
+        )
+        for user in (self.creator, self.opponent):
+            user.refresh_from_db()
+            self.assertEqual((user.tickets, user.locked_tickets), (70, 30))
+
+        # Une seule revanche par duel
+        with self.assertRaises(duel_states.TransitionError):
+            duel_states.request_rematch(self.duel, self.creator)
+
+    def test_insufficient_tickets_debits_nobody(self):
+        User.objects.filter(pk=self.creator.pk).update(tickets=10)
+        duel_states.request_rematch(self.duel, self.creator)
+        with self.assertRaises(InsufficientTickets):
+            duel_states.accept_rematch(self.duel, self.opponent)
+
+        self.assertFalse(Duel.objects.filter(original_duel=self.duel).exists())
+        self.assertEqual(Duel.objects.get(pk=self.duel.pk).rematch_requested_by, self.creator)
+        self.assertEqual(User.objects.get(pk=self.opponent.pk).tickets, 100)
+
+
+
+class UserDuelHistoryTests(ThrottleResetMixin, TestCase):
+    def test_pages_cover_both_roles_newest_first(self):
+        player = User.objects.create_user('player', password='x')
+        rival = User.objects.create_user('rival', password='x')
+        created = []
+        for index in range(5):
+            creator, opponent = (player, rival) if index % 2 else (rival, player)
+            created.append(Duel.objects.create(creator=creator, opponent=opponent, game_type='match_foot', amount=10))
+        Duel.objects.create(creator=rival, game_type='match_foot', amount=10)
+
+        client = APIClient()
+        client.force_authenticate(rival)
+        seen, cursor = [], None
+        while True:
+            response = client.get(f'/api/users/{player.pk}/duels/', {'limit': 2, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            seen += [(row['id'], row['role'], row['opponent']['username']) for row in response.data['results']]
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+
+        expected = [(duel.pk, 'creator' if duel.creator == player else 'opponent', 'rival') for duel in reversed(created)]
+        self.assertEqual(seen, expected)
+
+
+
+class UserStatsTests(TestCase):
+    STATS_FIELDS = ('user_id', 'game_type', 'played', 'wins', 'tickets_won', 'tickets_lost',
+                    'total_staked', 'current_streak', 'best_streak')
+
+    def _stats(self):
+        return sorted(UserStats.objects.values_list(*self.STATS_FIELDS))
+
+    def test_incremental_stats_match_rebuild(self):
+        alice = User.objects.create_user('alice', password='x', tickets=1000)
+        bob = User.objects.create_user('bob', password='x', tickets=1000)
+        # (jeu, mise, perdant) dans l'ordre de fin des duels
+        results = [('match_foot', 10, bob), ('match_foot', 20, bob), ('box_fight', 30, alice),
+                   ('match_foot', 5, alice), ('box_fight', 15, bob)]
+        for game_type, amount, loser in results:
+            duel = Duel.objects.create(creator=alice, opponent=bob, game_type=game_type, amount=amount, status='active')
+            duel_states.concede(duel, loser, 'forfeit')
+
+        alice_all = UserStats.objects.get(user=alice, game_type=user_stats.ALL_GAMES)
+        self.assertEqual((alice_all.played, alice_all.wins, alice_all.tickets_won, alice_all.tickets_lost),
+                         (5, 3, 45, 35))
+        self.assertEqual((alice_all.current_streak, alice_all.best_streak), (1, 2))
+        self.assertEqual(UserStats.objects.get(user=bob, game_type=user_stats.ALL_GAMES).current_streak, -1)
+
+        incremental = self._stats()
+        self.assertEqual(user_stats.rebuild(), 6)
+        self.assertEqual(self._stats(), incremental)
+
+    def test_rebuild_rewrites_rows_in_place(self):
+        alice = User.objects.create_user('alice', password='x')
+        bob = User.objects.create_user('bob', password='x')
+        duel = Duel.objects.create(creator=alice, opponent=bob, game_type='match_foot', amount=10,
+                                   status='completed', winner=alice)
+        user_stats.record_result(duel)
+        stale = UserStats.objects.create(user=bob, game_type='box_fight', played=4, wins=1)
+        pks = set(UserStats.objects.values_list('pk', flat=True))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(user_stats.rebuild(), 4)
+        self.assertFalse([query for query in queries if query['sql'].startswith('DELETE')])
+        # Les lignes qu'un record_result concurrent attend existent toujours après le recalcul
+        self.assertEqual(set(UserStats.objects.values_list('pk', flat=True)), pks)
+        stale.refresh_from_db()
+        self.assertEqual((stale.played, stale.wins), (0, 0))
+        user_stats.record_result(duel)
+        self.assertEqual(UserStats.objects.get(user=alice, game_type='match_foot').wins, 2)
+
+
+
+class RankTests(TestCase):
+    def test_thresholds(self):
+        for victories, rank in [(0, 'Débutant'), (4, 'Débutant'), (5, 'Amateur'), (29, 'Confirmé'),
+                                (30, 'Expert'), (99, 'Maître'), (100, 'Légende'), (1000, 'Légende')]:
+            self.assertEqual(ranks.rank_for(victories), rank)
+
+    def test_recompute_updates_only_stale_ranks(self):
+        stale = User.objects.create_user('stale', password='x', victories=12, rank='Intermédiaire')
+        User.objects.create_user('fine', password='x', victories=60, rank='Maître')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(ranks.recompute_all(), 1)
+        self.assertEqual([query['sql'].split()[0] for query in queries if 'core_user' in query['sql']], ['SELECT', 'UPDATE'])
+        self.assertEqual(User.objects.get(pk=stale.pk).rank, 'Amateur')
+        self.assertEqual(ranks.recompute_all(), 0)
+
+    def test_record_victory_does_not_lose_concurrent_wins(self):
+        user = User.objects.create_user('winner', password='x', victories=3)
+        first, second = User.objects.get(pk=user.pk), User.objects.get(pk=user.pk)
+        ranks.record_victory(first)
+        ranks.record_victory(second)  # instance chargée avant la première victoire
+        self.assertEqual((second.victories, second.rank), (5, 'Amateur'))
+        self.assertEqual(User.objects.values_list('victories', 'rank').get(pk=user.pk), (5, 'Amateur'))
+
+
+UPDATE_SQL = re.compile(r'^UPDATE "(?P<table>\w+)" SET (?P<assignments>.*?) WHERE ', re.S)
+ASSIGNED_COLUMN = re.compile(r'(?:^|, )"(\w+)" = ')
+
+
+class UpdatedColumnsMixin:
+    """Assertion sur les colonnes écrites par les requêtes UPDATE d'un bloc"""
+
+    @contextmanager
+    def assertUpdatedColumns(self, expected):
+        """`expected` : {Modèle: {colonnes}} ; toute autre table ou colonne mise à jour fait échouer le test"""
+        with CaptureQueriesContext(connection) as queries:
+            yield
+        written = defaultdict(set)
+        for query in queries:
+            match = UPDATE_SQL.match(query['sql'])
+            if match:
+                written[match['table']].update(ASSIGNED_COLUMN.findall(match['assignments']))
+            else:
+                self.assertFalse(query['sql'].startswith('UPDATE'), query['sql'])
+        self.assertEqual(
+            dict(written),
+            {model._meta.db_table: set(columns) for model, columns in expected.items()},
+        )
+
+
+class DirtyFieldsSaveTests(UpdatedColumnsMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('dirty', password='x', tickets=100)
+
+    def test_save_writes_only_modified_fields(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.victories = 3
+        with self.assertUpdatedColumns({User: {'victories'}}):
+            user.save()
+        with self.assertUpdatedColumns({}):
+            user.save()
+
+    def test_in_place_json_change_is_detected(self):
+        duel = Duel.objects.create(creator=self.user, game_type='match_foot', amount=10, ai_validation_result={})
+        duel = Duel.objects.get(pk=duel.pk)
+        duel.ai_validation_result['score'] = '2-1'
+        with self.assertUpdatedColumns({Duel: {'ai_validation_result'}}):
+            duel.save()
+
+    def test_auto_now_fields_follow_modified_fields(self):
+        now = timezone.now()
+        tournament = Tournament.objects.create(
+            name='Coupe', game='match_foot', entry_fee=10, prize_pool=100, max_participants=8,
+            registration_end=now, start_date=now, end_date=now + timedelta(days=1),
+        )
+        tournament = Tournament.objects.get(pk=tournament.pk)
+        tournament.status = 'ongoing'
+        with self.assertUpdatedColumns({Tournament: {'status', 'updated_at'}}):
+            tournament.save()
+
+    def test_withdrawal_save(self):
+        withdrawal = Withdrawal.objects.create(
+            user=self.user, amount_euros=5, amount_tickets=50, bank_iban='FR7630006000011234567890189', bank_bic='AGRIFRPP',
+        )
+        withdrawal = Withdrawal.objects.get(pk=withdrawal.pk)
+        withdrawal.admin_notes = 'Vérifié'
+        with self.assertUpdatedColumns({Withdrawal: {'admin_notes'}}):
+            withdrawal.save()
+
+
+class DuelActionWritesTests(ThrottleResetMixin, UpdatedColumnsMixin, TestCase):
+    """Colonnes écrites par chaque action de duel"""
+
+    def setUp(self):
+        super().setUp()
+        self.creator = User.objects.create_user('creator', password='x', tickets=100)
+        self.opponent = User.objects.create_user('opponent', password='x', tickets=100)
+        self.creator_client, self.opponent_client = APIClient(), APIClient()
+        self.creator_client.force_authenticate(self.creator)
+        self.opponent_client.force_authenticate(self.opponent)
+        response = self.creator_client.post('/api/duels/', {'game_type': 'match_foot', 'amount': 10})
+        self.url = f"/api/duels/{response.data['id']}"
+
+    def test_each_action_touches_only_its_columns(self):
+        stake_columns = {User: {'tickets', 'locked_tickets'}, Escrow: {'amount'}}
+        steps = [
+            (self.creator_client.patch, 'modify', {'amount': 20},
+             {**stake_columns, Duel: {'amount', 'game_type', 'category', 'status'}}),
+            (self.opponent_client.post, 'join', None,
+             {**stake_columns, Duel: {'opponent_id', 'status'}}),
+            (self.creator_client.post, 'ready', None,
+             {Duel: {'creator_ready', 'status', 'started_at', 'expires_at'}}),
+            (self.opponent_client.post, 'ready', None,
+             {Duel: {'opponent_ready', 'status', 'started_at', 'expires_at'}}),
+            (self.creator_client.patch, 'claim_victory', None,
+             {Duel: {'creator_action', 'status'}}),
+            (self.opponent_client.patch, 'confirm_result', None, {
+                Duel: {'opponent_action', 'winner_id', 'completed_at', 'status'},
+                User: {'tickets', 'locked_tickets', 'victories'},
+                Escrow: {'status', 'released_at'},
+                UserStats: {'played', 'wins', 'tickets_won', 'tickets_lost', 'total_staked',
+                            'current_streak', 'best_streak'},
+            }),
+        ]
+        for method, action, data, expected in steps:
+            with self.subTest(action=action), self.assertUpdatedColumns(expected):
+                response = method(f"{self.url}/{action}/", data)
+            self.assertEqual(response.status_code, 200, response.data)
+
+
+def _urlconf(mode):
+    """URLconf des routes d'authentification du mode donné (urls.py est figé au démarrage)"""
+    from playinbet_backend.urls import auth_urlpatterns
+
+    module = types.ModuleType(f'urls_{mode}')
+    module.urlpatterns = [
+        path('auth/', include('djoser.urls')),
+        *auth_urlpatterns(mode),
+        path('api/', include('core.urls')),
+    ]
+    return module
+
+
+@override_settings(ROOT_URLCONF=_urlconf('jwt'))
+class JWTAuthTests(ThrottleResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        from .jwt_auth import revocations
+
+        self.revocations = revocations
+        revocations.clear()
+        self.addCleanup(revocations.clear)
+        self.user = User.objects.create_user('jwt', password='secret-pass-1')
+        self.client = APIClient()
+
+    def _login(self, password='secret-pass-1'):
+        response = self.client.post('/auth/jwt/create/', {'username': 'jwt', 'password': password})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def _is_valid(self, raw_access):
+        from rest_framework_simplejwt.exceptions import InvalidToken
+        from .jwt_auth import StatelessJWTAuthentication
+
+        try:
+            StatelessJWTAuthentication().get_validated_token(raw_access.encode())
+        except InvalidToken:
+            return False
+        return True
+
+    def test_only_jwt_login_is_routed(self):
+        response = self.client.post('/auth/token/login/', {'username': 'jwt', 'password': 'secret-pass-1'})
+        self.assertEqual(response.status_code, 404)
+        tokens = self._login()
+        self.assertTrue(self._is_valid(tokens['access']))
+
+    def test_logout_revokes_access_and_refresh(self):
+        tokens = self._login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.post('/auth/jwt/logout/', {'refresh': tokens['refresh']}).status_code, 204)
+
+        self.assertEqual(self.client.post('/auth/jwt/logout/').status_code, 401)
+        self.client.credentials()
+        self.assertEqual(self.client.post('/auth/jwt/refresh/', {'refresh': tokens['refresh']}).status_code, 401)
+
+    def test_password_change_revokes_tokens_issued_the_same_second(self):
+        # Émission, révocation et nouvelle connexion dans la même seconde
+        base = int(time.time()) + 10
+        clock = mock.Mock(time=mock.Mock(side_effect=[base + 0.2, base + 0.5, base + 0.7]))
+        with mock.patch('core.jwt_auth.time', clock):
+            old = self._login()
+            self.user.set_password('secret-pass-2')
+            self.user.save()
+            new = self._login('secret-pass-2')
+
+        self.assertFalse(self._is_valid(old['access']))
+        self.assertEqual(self.client.post('/auth/jwt/refresh/', {'refresh': old['refresh']}).status_code, 401)
+        self.assertTrue(self._is_valid(new['access']))
+
+
+class WithdrawalProcessingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('payee', password='x', tickets=0)
+        self.withdrawals = [
+            Withdrawal.objects.create(
+                user=self.user, amount_euros=amount, amount_tickets=amount * 10, bank_account_holder='Payee',
+                bank_iban='FR7630006000011234567890189', bank_bic='AGRIFRPP',
+            )
+            for amount in (5, 7)
+        ]
+
+    def _statuses(self):
+        return list(Withdrawal.objects.order_by('created_at').values_list('status', flat=True))
+
+    def test_claim_of_dead_worker_is_reclaimed_after_ttl(self):
+        from .withdrawals import claim_batch, process_batch
+
+        self.assertEqual(len(claim_batch(10)), 2)  # le worker meurt avant l'envoi
+        self.assertEqual(claim_batch(10), [])
+        self.assertEqual(self._statuses(), ['processing', 'processing'])
+
+        Withdrawal.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(process_batch(10), 2)
+        self.assertEqual(self._statuses(), ['completed', 'completed'])
+
+    def test_backend_exception_puts_only_failing_rows_back_in_queue(self):
+        from .withdrawals import SimulatedBankBackend, process_batch
+
+        failing_id = self.withdrawals[0].id
+
+        class FlakyBackend(SimulatedBankBackend):
+            def send_batch(self, withdrawals):
+                if any(withdrawal.id == failing_id for withdrawal in withdrawals):
+                    raise ConnectionError("banque indisponible")
+                return super().send_batch(withdrawals)
+
+        with self.assertLogs('core.withdrawals', 'ERROR'):
+            self.assertEqual(process_batch(10, FlakyBackend()), 2)
+        self.assertEqual(self._statuses(), ['pending', 'completed'])
+        failed = Withdrawal.objects.get(pk=failing_id)
+        self.assertIsNone(failed.claimed_at)
+        self.assertIn("banque indisponible", failed.admin_notes)
+        # Toujours débité : aucun remboursement tant que le retrait est en file
+        self.assertEqual(User.objects.get(pk=self.user.pk).tickets, 0)
+
+        self.assertEqual(process_batch(10), 1)
+        self.assertEqual(self._statuses(), ['completed', 'completed'])
+
+    def test_reclaimed_batch_is_finalized_and_refunded_once(self):
+        from .withdrawals import TransferResult, claim_batch, finalize_batch
+
+        def failed(withdrawals):
+            return [TransferResult(withdrawal.id, False, '', 'Refusé par la banque') for withdrawal in withdrawals]
+
+        slow_worker = claim_batch(10)
+        Withdrawal.objects.update(claimed_at=timezone.now() - timedelta(hours=1))  # TTL dépassé
+        other_worker = claim_batch(10)
+        self.assertEqual(len(other_worker), 2)
+
+        finalize_batch(other_worker, failed(other_worker))
+        with self.assertLogs('core.withdrawals', 'WARNING'):
+            finalize_batch(slow_worker, failed(slow_worker))
+        self.assertEqual(self._statuses(), ['failed', 'failed'])
+        self.assertEqual(User.objects.get(pk=self.user.pk).tickets, 120)
+
+
+class BulkWithdrawalTests(ThrottleResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('payee', password='x', tickets=0)
+        self.admin = User.objects.create_user('boss', password='x', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.small, self.large = [
+            Withdrawal.objects.create(
+                user=self.user, amount_euros=amount, amount_tickets=amount * 10, bank_account_holder='Payee',
+                bank_iban='FR7630006000011234567890189', bank_bic='AGRIFRPP',
+            )
+            for amount in (5, 50)
+        ]
+
+    def _statuses(self):
+        return dict(Withdrawal.objects.values_list('id', 'status'))
+
+    def test_approve_by_filter(self):
+        response = self.client.post('/api/admin/withdrawals/bulk_approve/', {'filter': {'max_amount': '10'}}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['processed'], 1)
+        self.assertEqual(self._statuses(), {self.small.id: 'approved', self.large.id: 'pending'})
+
+    def test_reject_by_ids_refunds(self):
+        response = self.client.post(
+            '/api/admin/withdrawals/bulk_reject/', {'ids': [self.large.id, 999], 'reason': 'Doublon'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            {row['id']: row['outcome'] for row in response.data['results']},
+            {self.large.id: 'cancelled', 999: 'not_found'},
+        )
+        self.assertEqual(User.objects.get(pk=self.user.pk).tickets, 500)
+        self.assertIn('Doublon', Withdrawal.objects.get(pk=self.large.id).admin_notes)
+
+    def test_invalid_selections_are_rejected_without_side_effects(self):
+        for body in [
+            {},
+            {'filter': {}},
+            {'filter': {'stauts': 'pending'}},
+            {'filter': {'max_amount': 'beaucoup'}},
+            {'filter': {'created_after': 'hier'}},
+            {'ids': ['un']},
+            {'ids': []},
+            {'ids': [self.small.id], 'filtre': {'status': 'pending'}},
+        ]:
+            for endpoint in ('bulk_approve', 'bulk_reject'):
+                with self.subTest(body=body, endpoint=endpoint):
+                    response = self.client.post(f'/api/admin/withdrawals/{endpoint}/', body, format='json')
+                    self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(self._statuses().values()), {'pending'})
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x', tickets=0)
+        self.bob = User.objects.create_user('bob', password='x', tickets=0)
+
+    def _move(self, user, amount, transaction_id):
+        """Mouvement d'id imposé, pour simuler un commit hors de l'ordre des ids"""
+        from django.db.models import F
+        from .models import WalletTransaction
+
+        User.objects.filter(pk=user.pk).update(tickets=F('tickets') + amount)
+        balance = User.objects.get(pk=user.pk).tickets
+        WalletTransaction.objects.create(id=transaction_id, user=user, kind='duel_win', amount=amount, balance_after=balance)
+
+    def _age_ledger(self):
+        from .models import WalletTransaction
+
+        WalletTransaction.objects.update(created_at=timezone.now() - timedelta(hours=1))
+
+    def test_discrepancy_is_reported_until_fixed(self):
+        from .reconciliation import reconcile
+
+        self._move(self.alice, 10, 100)
+        self._age_ledger()
+        self.assertEqual(reconcile().discrepancies, [])
+
+        User.objects.filter(pk=self.alice.pk).update(tickets=60)  # modifié hors du wallet
+        for _ in range(2):
+            report = reconcile(full=True)
+            self.assertEqual([(d.user_id, d.tickets, d.expected_tickets) for d in report.discrepancies],
+                             [(self.alice.pk, 60, 10)])
+
+    def test_transactions_committed_out_of_id_order_are_counted(self):
+        from .models import BalanceSnapshot
+        from .reconciliation import reconcile
+
+        self._move(self.alice, 10, 1000)
+        self.assertEqual(reconcile().examined, 1)
+
+        # Commits plus lents, d'ids inférieurs au dernier relevé
+        self._move(self.alice, 5, 500)
+        self._move(self.bob, 7, 600)
+        report = reconcile()
+        self.assertEqual(report.examined, 2)
+        self.assertEqual(report.discrepancies, [])
+
+        self._age_ledger()
+        reconcile()
+        snapshot = BalanceSnapshot.objects.filter(user=self.alice).order_by('-id').first()
+        self.assertEqual((snapshot.last_transaction_id, snapshot.baseline_tickets), (1000, 15))
+        self.assertEqual(reconcile().examined, 0)
+
+
+class ProfileCacheTests(TestCase):
+    def _cache(self, **options):
+        from .profile_cache import LocMemLRUBackend, ProfileCache
+
+        return ProfileCache(LocMemLRUBackend(**options))
+
+    def test_invalidate_rebuilds_profile(self):
+        cache, user = self._cache(), types.SimpleNamespace(pk=1)
+        self.assertEqual(cache.get_or_build(user, lambda u: 'v1'), 'v1')
+        self.assertEqual(cache.get_or_build(user, lambda u: 'v2'), 'v1')
+        cache.invalidate(user.pk)
+        self.assertEqual(cache.get_or_build(user, lambda u: 'v2'), 'v2')
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_entries_expire(self):
+        cache, user = self._cache(timeout=10), types.SimpleNamespace(pk=1)
+        with mock.patch('core.profile_cache.time.monotonic', return_value=1000):
+            cache.get_or_build(user, lambda u: 'old')
+        with mock.patch('core.profile_cache.time.monotonic', return_value=1011):
+            self.assertEqual(cache.get_or_build(user, lambda u: 'new'), 'new')
+
+    def test_ledger_invalidates_profile_on_commit(self):
+        from .ledger import credit
+        from .profile_cache import profile_cache
+        from .serializers import CachedUserProfileSerializer
+
+        user = User.objects.create_user('rich', password='x', tickets=10)
+        profile_cache.clear()
+        self.assertEqual(CachedUserProfileSerializer(user).data['tickets'], 10)
+        with self.captureOnCommitCallbacks() as callbacks:
+            credit(user, 5, 'duel_win')
+            # Rien n'est invalidé avant le commit
+            self.assertEqual(CachedUserProfileSerializer(User.objects.get(pk=user.pk)).data['tickets'], 10)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(CachedUserProfileSerializer(User.objects.get(pk=user.pk)).data['tickets'], 15)
+
+    def test_evicted_version_does_not_resurrect_stale_entry(self):
+        cache, user = self._cache(max_entries=3), types.SimpleNamespace(pk=1)
+
+        def build_during_update(u):
+            cache.invalidate(u.pk)  # le profil change pendant la sérialisation
+            return 'stale'
+
+        cache.get_or_build(user, build_during_update)
+        for key in ('a', 'b'):
+            cache.backend.set(key, key)  # évince la clé de version
+        self.assertEqual(cache.get_or_build(user, lambda u: 'fresh'), 'fresh')
+
+
+class DuelListQueryTests(ThrottleResetMixin, TestCase):
+    def _duels(self, count):
+        from .models import KYCProfile
+
+        start = Duel.objects.count()
+        for index in range(start, start + count):
+            creator, opponent = (
+                User.objects.create_user(f'{role}{index}', password='x', is_verified=True) for role in ('c', 'o')
+            )
+            KYCProfile.objects.bulk_create([
+                KYCProfile(user=user, iban='FR7630006000011234567890189', bic='AGRIFRPP') for user in (creator, opponent)
+            ])
+            Duel.objects.create(creator=creator, opponent=opponent, game_type='match_foot', amount=10)
+
+    def test_list_query_count_does_not_grow_with_duels(self):
+        from .profile_cache import profile_cache
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('viewer', password='x'))
+        for count in (2, 6):
+            self._duels(count)
+            profile_cache.clear()
+            with self.assertNumQueries(1):
+                response = client.get('/api/duels/')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(all(duel['creator']['can_withdraw'] for duel in response.data))
+
+
+class IdempotencyTests(ThrottleResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('player', password='x', tickets=100)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create(self, key='duel-1', amount=10):
+        return self.client.post('/api/duels/', {'game_type': 'match_foot', 'amount': amount},
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_original_response(self):
+        first, second = self._create(), self._create()
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(Duel.objects.count(), 1)
+        self.assertEqual(self._create(amount=20).status_code, 422)
+
+    def test_raised_and_returned_client_errors_are_both_replayed(self):
+        response = self._create(amount=500)  # ValidationError levée par perform_create
+        self.assertEqual(response.status_code, 400)
+        User.objects.filter(pk=self.user.pk).update(tickets=1000)
+        replayed = self._create(amount=500)
+        self.assertEqual((replayed.status_code, replayed['Idempotent-Replayed']), (400, 'true'))
+        self.assertEqual(Duel.objects.count(), 0)
+
+    def test_concurrent_request_gets_conflict(self):
+        from .ledger import stake as real_stake
+
+        nested = []
+
+        def stake_during_retry(*args, **kwargs):
+            nested.append(self._create().status_code)
+            return real_stake(*args, **kwargs)
+
+        with mock.patch('core.views.stake', side_effect=stake_during_retry):
+            self.assertEqual(self._create().status_code, 201)
+        self.assertEqual(nested, [409])
+
+    def test_unexpected_error_releases_key(self):
+        with mock.patch('core.views.stake', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self._create()
+        self.assertEqual(self._create().status_code, 201)
+
+    def test_crashed_request_is_retried_after_lease(self):
+        from .models import IdempotencyKey
+
+        # Arrêt brutal du processus : ni réponse ni libération de la clé
+        with mock.patch('core.views.stake', side_effect=SystemExit):
+            with self.assertRaises(SystemExit):
+                self._create()
+        self.assertEqual(self._create().status_code, 409)
+
+        record = IdempotencyKey.objects.get()
+        self.assertLessEqual(record.expires_at, timezone.now() + timedelta(minutes=5))
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.assertEqual(self._create().status_code, 201)
+        self.assertGreater(IdempotencyKey.objects.get().expires_at, timezone.now() + timedelta(hours=1))
+
+
+class ThrottlingTests(ThrottleResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('spammer', password='x', tickets=1000))
+
+    def _create(self):
+        return self.client.post('/api/duels/', {'game_type': 'match_foot', 'amount': 1}).status_code
+
+    def test_limit_and_window_expiry(self):
+        # duel_create : 10/min
+        with mock.patch('core.throttling.time.time', return_value=6000.0):
+            self.assertEqual([self._create() for _ in range(11)], [201] * 10 + [429])
+        # Fenêtre suivante : la précédente ne compte plus qu'à moitié
+        with mock.patch('core.throttling.time.time', return_value=6090.0):
+            self.assertEqual([self._create() for _ in range(6)], [201] * 5 + [429])
+        with mock.patch('core.throttling.time.time', return_value=6240.0):
+            self.assertEqual(self._create(), 201)
+
+    def test_reset_clears_counters(self):
+        with mock.patch('core.throttling.time.time', return_value=6000.0):
+            for _ in range(10):
+                self._create()
+            self.assertEqual(self._create(), 429)
+            throttling.reset_throttle_store()
+            self.assertEqual(self._create(), 201)
+
+    @override_settings(THROTTLE_STORE={
+        'BACKEND': 'core.throttling.DjangoCacheSlidingWindowStore',
+        'OPTIONS': {'alias': 'default'},
+    })
+    def test_cache_store_clear_keeps_other_keys(self):
+        from django.core.cache import cache
+
+        cache.set('unrelated', 'kept')
+        with mock.patch('core.throttling.time.time', return_value=6000.0):
+            self.assertEqual([self._create() for _ in range(11)], [201] * 10 + [429])
+            throttling.throttle_store.clear()
+            self.assertEqual(self._create(), 201)
+        self.assertEqual(cache.get('unrelated'), 'kept')
+
+
+class KYCQueueTests(ThrottleResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.pending = [
+            User.objects.create_user(f'applicant{index}', password='x', verification_status='pending',
+                                     verification_submitted_at=now - timedelta(minutes=10 - index))
+            for index in range(3)
+        ]
+        self.admins = [User.objects.create_user(name, password='x', is_staff=True) for name in ('ada', 'bob')]
+        self.clients = []
+        for admin in self.admins:
+            client = APIClient()
+            client.force_authenticate(admin)
+            self.clients.append(client)
+
+    def _claim(self, client, count):
+        response = client.post('/api/admin/kyc/claim/', {'count': count}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['id'] for row in response.data['results']]
+
+    def test_claims_are_exclusive_and_expire(self):
+        ada, bob = self.clients
+        self.assertEqual(self._claim(ada, 2), [user.pk for user in self.pending[:2]])
+        self.assertEqual(self._claim(bob, 5), [self.pending[2].pk])
+        self.assertEqual(self._claim(ada, 5), [])
+
+        User.objects.filter(kyc_claimed_by=self.admins[0]).update(kyc_claimed_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(self._claim(bob, 5), [user.pk for user in self.pending[:2]])
+
+    def test_release_validates_ids(self):
+        ada, bob = self.clients
+        self._claim(ada, 2)
+        self._claim(bob, 1)
+        for body in ({'ids': ['abc']}, {'ids': 'abc'}, {'id': [1]}):
+            with self.subTest(body=body):
+                self.assertEqual(ada.post('/api/admin/kyc/release/', body, format='json').status_code, 400)
+
+        ids = [self.pending[0].pk, self.pending[2].pk]  # la seconde est réservée par bob
+        response = ada.post('/api/admin/kyc/release/', {'ids': ids}, format='json')
+        self.assertEqual(response.data, {'released': 1})
+        self.assertEqual(ada.post('/api/admin/kyc/release/', {}, format='json').data, {'released': 1})
+        self.assertEqual(User.objects.filter(kyc_claimed_by__isnull=False).count(), 1)
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class KYCQueueSkipLockedTests(TransactionTestCase):
+    """Réservation pendant qu'une autre transaction verrouille la tête de file (PostgreSQL)"""
+
+    def test_locked_submissions_are_skipped(self):
+        import threading
+
+        from .kyc_queue import claim_next, pending_queue
+
+        now = timezone.now()
+        applicants = [
+            User.objects.create_user(f'applicant{index}', password='x', verification_status='pending',
+                                     verification_submitted_at=now - timedelta(minutes=10 - index))
+            for index in range(3)
+        ]
+        admin = User.objects.create_user('ada', password='x', is_staff=True)
+        locked, done = threading.Event(), threading.Event()
+
+        def hold_first_row():
+            with transaction.atomic():
+                list(pending_queue().select_for_update()[:1])
+                locked.set()
+                done.wait(10)
+            connection.close()
+
+        thread = threading.Thread(target=hold_first_row)
+        thread.start()
+        try:
+            locked.wait(10)
+            claimed = claim_next(admin, 3)
+        finally:
+            done.set()
+            thread.join()
+        self.assertEqual([user.pk for user in claimed], [user.pk for user in applicants[1:]])
+
+
+SEPA_TEST_DEBTOR = {'name': 'PlayInBet', 'iban': 'fr76 3000 6000 0112 3456 7890 189', 'bic': 'agrifrpp'}
+
+
+class SepaExportTests(ThrottleResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user('payee', password='x')
+        for amount in (5, '12.50'):
+            Withdrawal.objects.create(
+                user=user, amount_euros=amount, amount_tickets=50, status='completed',
+                bank_account_holder='Jean & Fils', bank_iban='DE89370400440532013000', bank_bic='COBADEFFXXX',
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('boss', password='x', is_staff=True))
+
+    @override_settings(SEPA_DEBTOR=SEPA_TEST_DEBTOR)
+    def test_export_is_well_formed_pain001(self):
+        from xml.etree import ElementTree
+
+        from .sepa import PAIN_001_NAMESPACE
+
+        response = self.client.get('/api/admin/withdrawals/sepa_export/')
+        self.assertEqual(response.status_code, 200)
+        root = ElementTree.fromstring(b''.join(response.streaming_content))
+        ns = {'p': PAIN_001_NAMESPACE}
+        self.assertEqual(root.findtext('p:CstmrCdtTrfInitn/p:GrpHdr/p:NbOfTxs', namespaces=ns), '2')
+        self.assertEqual(root.findtext('p:CstmrCdtTrfInitn/p:GrpHdr/p:CtrlSum', namespaces=ns), '17.50')
+        payment = root.find('p:CstmrCdtTrfInitn/p:PmtInf', ns)
+        self.assertEqual(payment.findtext('p:DbtrAcct/p:Id/p:IBAN', namespaces=ns), 'FR7630006000011234567890189')
+        self.assertEqual(payment.findtext('p:DbtrAgt/p:FinInstnId/p:BIC', namespaces=ns), 'AGRIFRPP')
+        transfers = payment.findall('p:CdtTrfTxInf', ns)
+        self.assertEqual([t.findtext('p:Amt/p:InstdAmt', namespaces=ns) for t in transfers], ['5.00', '12.50'])
+        self.assertEqual(transfers[0].findtext('p:Cdtr/p:Nm', namespaces=ns), 'Jean & Fils')
+
+    @override_settings(SEPA_DEBTOR={'name': 'PlayInBet', 'iban': '', 'bic': ''})
+    def test_export_refused_without_debtor_account(self):
+        import tempfile
+
+        from django.core.management import CommandError, call_command
+
+        response = self.client.get('/api/admin/withdrawals/sepa_export/')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('IBAN', response.data['error'])
+        with tempfile.NamedTemporaryFile(suffix='.xml') as output, self.assertRaises(CommandError):
+            call_command('export_sepa', output.name)
+
+    @override_settings(SEPA_DEBTOR=SEPA_TEST_DEBTOR)
+    def test_command_filters_on_processed_at(self):
+        import tempfile
+        from io import StringIO
+        from xml.etree import ElementTree
+
+        from django.core.management import CommandError, call_command
+
+        from .sepa import PAIN_001_NAMESPACE
+
+        first, second = Withdrawal.objects.order_by('id')
+        Withdrawal.objects.filter(pk=first.pk).update(processed_at=timezone.make_aware(datetime(2026, 3, 1, 12)))
+        Withdrawal.objects.filter(pk=second.pk).update(processed_at=timezone.make_aware(datetime(2026, 3, 2, 12)))
+        with tempfile.NamedTemporaryFile(suffix='.xml') as output:
+            call_command('export_sepa', output.name, since='2026-03-02', stdout=StringIO())
+            root = ElementTree.parse(output.name).getroot()
+        ns = {'p': PAIN_001_NAMESPACE}
+        self.assertEqual(root.findtext('p:CstmrCdtTrfInitn/p:GrpHdr/p:CtrlSum', namespaces=ns), '12.50')
+
+        for option in ('since', 'until'):
+            with tempfile.NamedTemporaryFile(suffix='.xml') as output, \
+                    self.assertRaisesMessage(CommandError, f"Date invalide pour '{option}'"):
+                call_command('export_sepa', output.name, **{option: '2026-02-30'})
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        from rest_framework.authtoken.models import Token
+
+        from .authentication import CachedTokenAuthentication
+
+        self.auth = CachedTokenAuthentication()
+        self.user = User.objects.create_user('cached', password='secret-pass-1', tickets=42)
+        self.token = Token.objects.create(user=self.user)
+
+    def _authenticate(self):
+        return self.auth.authenticate_credentials(self.token.key)[0]
+
+    def test_cache_hit_reads_nothing(self):
+        with self.assertNumQueries(1):
+            self._authenticate()
+        with self.assertNumQueries(0):
+            user = self._authenticate()
+        self.assertEqual((user.pk, user.username), (self.user.pk, 'cached'))
+
+    def test_deferred_fields_load_together(self):
+        user = self._authenticate()
+        self.assertIn('tickets', user.get_deferred_fields())
+        with self.assertNumQueries(1):
+            self.assertEqual((user.tickets, user.email, user.victories), (42, '', 0))
+
+    def test_token_delete_invalidates_entry(self):
+        from rest_framework import exceptions
+
+        self._authenticate()
+        self.token.delete()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self._authenticate()
+
+    def test_password_change_invalidates_entry(self):
+        self._authenticate()
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('secret-pass-2')
+        user.save()
+        with self.assertNumQueries(1):
+            self._authenticate()
+
+    def test_role_change_invalidates_entry(self):
+        self._authenticate()
+        user = User.objects.get(pk=self.user.pk)
+        user.role = 'admin'
+        user.save()
+        self.assertEqual(self._authenticate().role, 'admin')
+
+
+class BankingValidationTests(ThrottleResetMixin, TestCase):
+    VALID_IBAN = 'FR7630006000011234567890189'
+
+    def test_iban(self):
+        from .banking import iban_error, make_iban, normalize, validate_iban
+
+        self.assertIsNone(iban_error(self.VALID_IBAN))
+        self.assertEqual(validate_iban('fr76 3000 6000 0112 3456 7890 189'), self.VALID_IBAN)
+        self.assertIsNone(iban_error(make_iban('DE', '370400440532013000')))
+        self.assertEqual(iban_error('FR7730006000011234567890189'), "Clé de contrôle de l'IBAN invalide")
+        self.assertEqual(iban_error(self.VALID_IBAN[:-1]), "Un IBAN FR doit contenir 27 caractères")
+        self.assertEqual(iban_error('US7630006000011234567890189'), "Pays de l'IBAN non pris en charge")
+        with self.assertRaisesMessage(ValueError, "L'IBAN est obligatoire"):
+            validate_iban(normalize(' '))
+
+    def test_bic(self):
+        from .banking import bic_error
+
+        self.assertIsNone(bic_error('AGRIFRPP'))
+        self.assertIsNone(bic_error('AGRIFRPP882'))
+        self.assertEqual(bic_error('AGRIFRPP8'), "Le BIC doit contenir 8 ou 11 caractères")
+        self.assertEqual(bic_error('AGR1FRPP'), "Format de BIC invalide")
+
+    def test_bic_country_must_match_iban(self):
+        from .banking import pair_error
+
+        self.assertIsNone(pair_error(self.VALID_IBAN, 'AGRIFRPP'))
+        self.assertEqual(pair_error(self.VALID_IBAN, 'COBADEFF'), "Le BIC (DE) ne correspond pas au pays de l'IBAN (FR)")
+        # Territoires rattachés : BIC guadeloupéen, IBAN français
+        self.assertIsNone(pair_error(self.VALID_IBAN, 'BDAFGPGP'))
+        self.assertIsNotNone(pair_error('DE89370400440532013000', 'BDAFGPGP'))
+
+    def test_withdrawal_request_rejects_invalid_accounts(self):
+        user = User.objects.create_user('payee', password='x', tickets=1000, is_verified=True)
+        client = APIClient()
+        client.force_authenticate(user)
+        cases = [
+            ({'bank_iban': 'FR7730006000011234567890189', 'bank_bic': 'AGRIFRPP'}, 'bank_iban'),
+            ({'bank_iban': self.VALID_IBAN, 'bank_bic': 'AGRIFRPP8'}, 'bank_bic'),
+            ({'bank_iban': self.VALID_IBAN, 'bank_bic': 'COBADEFF'}, 'bank_bic'),
+        ]
+        for account, field in cases:
+            with self.subTest(account=account):
+                response = client.post('/api/withdrawals/', {
+                    'amount_euros': '5.00', 'bank_account_holder': 'Payee', **account,
+                }, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.data)
+        self.assertEqual(Withdrawal.objects.count(), 0)
+
+
+class NestedProfileQueryTests(ThrottleResetMixin, TestCase):
+    """Listes servant des profils imbriqués : le nombre de requêtes ne dépend pas du nombre de lignes"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('boss', password='x', is_staff=True))
+        self.players = 0
+
+    def _player(self):
+        from .models import KYCProfile
+
+        self.players += 1
+        user = User.objects.create_user(f'player{self.players}', password='x', is_verified=True)
+        KYCProfile.objects.create(user=user, iban='FR7630006000011234567890189', bic='AGRIFRPP')
+        return user
+
+    def _add_rows(self):
+        from .models import TournamentMatch, TournamentParticipant
+
+        now = timezone.now()
+        player, rival = self._player(), self._player()
+        Duel.objects.create(creator=player, opponent=rival, winner=player, game_type='match_foot', amount=10)
+        Withdrawal.objects.create(user=player, amount_euros=5, amount_tickets=50, bank_account_holder='Payee',
+                                  bank_iban='FR7630006000011234567890189', bank_bic='AGRIFRPP')
+        tournament = Tournament.objects.create(
+            name='Coupe', game='match_foot', entry_fee=10, prize_pool=100, max_participants=8, winner=player,
+            registration_end=now, start_date=now, end_date=now + timedelta(days=1),
+        )
+        for user in (player, rival):
+            TournamentParticipant.objects.create(tournament=tournament, user=user)
+        TournamentMatch.objects.create(tournament=tournament, round_number=1, match_number=1, player1=player,
+                                       player2=rival, winner=player, loser=rival, scheduled_time=now)
+
+    def _queries(self, url):
+        from .profile_cache import profile_cache
+
+        profile_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        urls = ['/api/admin/duels/', '/api/admin/withdrawals/', '/api/tournaments/']
+        self._add_rows()
+        counts = [self._queries(url) for url in urls]
+        for _ in range(3):
+            self._add_rows()
+        self.assertEqual([self._queries(url) for url in urls], counts)
+        self.assertEqual(counts, [1, 1, 3])
+
+    def test_own_withdrawal_history(self):
+        from .models import KYCProfile
+
+        user = User.objects.get(username='boss')
+        KYCProfile.objects.create(user=user, iban='FR7630006000011234567890189', bic='AGRIFRPP')
+        for _ in range(3):
+            Withdrawal.objects.create(user=user, amount_euros=5, amount_tickets=50, bank_account_holder='Boss',
+                                      bank_iban='FR7630006000011234567890189', bank_bic='AGRIFRPP')
+        self.assertEqual(self._queries('/api/withdrawals/'), 1)
+
+
+class KYCProfileMigrationTests(TransactionTestCase):
+    """0019 copie les données KYC de User vers KYCProfile"""
+
+    def _migrate(self, target=None):
+        """Migre `core` jusqu'à `target` (la dernière migration par défaut) ; retourne les modèles historiques"""
+        from django.db.migrations.executor import MigrationExecutor
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        targets = [('core', target)] if target else executor.loader.graph.leaf_nodes('core')
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def test_kyc_fields_are_copied_to_profiles(self):
+        old_apps = self._migrate('0018_kyc_review_queue')
+        OldUser = old_apps.get_model('core', 'User')
+        filled = OldUser.objects.create(username='filled', city='Lyon', iban='FR7630006000011234567890189',
+                                        bic='AGRIFRPP', verification_notes='OK')
+        empty = OldUser.objects.create(username='empty')
+
+        try:
+            new_apps = self._migrate('0019_kycprofile')
+            KYCProfile = new_apps.get_model('core', 'KYCProfile')
+            self.assertEqual(
+                list(KYCProfile.objects.values_list('user_id', 'city', 'iban', 'bic', 'verification_notes')),
+                [(filled.pk, 'Lyon', 'FR7630006000011234567890189', 'AGRIFRPP', 'OK')],
+            )
+            self.assertFalse(KYCProfile.objects.filter(user_id=empty.pk).exists())
+        finally:
+            self._migrate()
+        self.assertEqual(User.objects.get(pk=filled.pk).kyc.city, 'Lyon')
+
+
+class StreamingExportTests(ThrottleResetMixin, TestCase):
+    """Exports admin CSV/NDJSON : contenu, filtres de période et cellules-formules"""
+
+    def setUp(self):
+        super().setUp()
+        payee = User.objects.create_user('=HYPERLINK("http://x")', password='x', tickets=100)
+        self.old, self.recent = (
+            Withdrawal.objects.create(
+                user=payee, amount_euros=5, amount_tickets=50, status=status,
+                bank_account_holder=holder, bank_iban='DE89370400440532013000', bank_bic='COBADEFFXXX',
+            )
+            for status, holder in (('completed', '@SUM(A1)'), ('pending', 'Jean Dupont'))
+        )
+        Withdrawal.objects.filter(pk=self.old.pk).update(created_at=timezone.make_aware(datetime(2026, 1, 10)))
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('boss', password='x', is_staff=True))
+
+    def _export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export_escapes_formulas(self):
+        response, body = self._export('/api/admin/withdrawals/export/')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="retraits_', response['Content-Disposition'])
+        header, *rows = csv.reader(body.splitlines())
+        self.assertEqual(tuple(header), AdminWithdrawalViewSet.EXPORT_FIELDS)
+        self.assertEqual([int(row[0]) for row in rows], [self.old.pk, self.recent.pk])
+        holder = header.index('bank_account_holder')
+        username = header.index('user__username')
+        self.assertEqual([row[holder] for row in rows], ["'@SUM(A1)", 'Jean Dupont'])
+        self.assertEqual(rows[0][username], '\'=HYPERLINK("http://x")')
+
+    def test_ndjson_export_keeps_raw_values(self):
+        response, body = self._export('/api/admin/withdrawals/export/', fmt='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.old.pk, self.recent.pk])
+        self.assertEqual(rows[0]['bank_account_holder'], '@SUM(A1)')
+        self.assertEqual(rows[0]['amount_euros'], '5.00')
+
+    def test_period_and_status_filters(self):
+        def exported_ids(**params):
+            _, body = self._export('/api/admin/withdrawals/export/', fmt='ndjson', **params)
+            return [json.loads(line)['id'] for line in body.splitlines()]
+
+        self.assertEqual(exported_ids(since='2026-01-11'), [self.recent.pk])
+        self.assertEqual(exported_ids(until='2026-01-11'), [self.old.pk])
+        self.assertEqual(exported_ids(since='2026-01-10T00:00:00', until='2026-01-10T00:00:01'), [self.old.pk])
+        self.assertEqual(exported_ids(status='pending'), [self.recent.pk])
+
+    def test_duel_export(self):
+        creator = User.objects.get(username='boss')
+        duels = [Duel.objects.create(creator=creator, game_type='match_foot', amount=10) for _ in range(2)]
+        Duel.objects.filter(pk=duels[0].pk).update(status='cancelled')
+
+        response, body = self._export('/api/admin/duels/export/', status='open')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        header, *rows = csv.reader(body.splitlines())
+        self.assertEqual(tuple(header), AdminDuelViewSet.EXPORT_FIELDS)
+        self.assertEqual([int(row[0]) for row in rows], [duels[1].pk])
+
+    def test_invalid_format_or_date_is_rejected(self):
+        for url in ('/api/admin/withdrawals/export/', '/api/admin/duels/export/'):
+            for params in ({'fmt': 'xlsx'}, {'since': 'hier'}, {'until': '2026-13-01'}):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400, (url, params))
+                self.assertIn('error', response.data)
+
+    def test_export_requires_staff(self):
+        self.client.force_authenticate(User.objects.get(username__startswith='='))
+        self.assertEqual(self.client.get('/api/admin/withdrawals/export/').status_code, 403)
+
+
+class DuelLobbyTests(ThrottleResetMixin, TestCase):
+    """Lobby compact : filtres, can_join et nombre de requêtes constant"""
+
+    def setUp(self):
+        from rest_framework.authtoken.models import Token
+
+        super().setUp()
+        self.creator = User.objects.create_user('host', password='x', tickets=500)
+        self.viewer = User.objects.create_user('guest', password='x', tickets=30)
+        self.cheap = Duel.objects.create(creator=self.creator, game_type='match_foot', amount=10)
+        self.pricey = Duel.objects.create(creator=self.creator, game_type='box_fight', amount=50)
+        self.own = Duel.objects.create(creator=self.viewer, game_type='defi_aim', amount=20)
+        Duel.objects.create(creator=self.creator, game_type='match_foot', amount=10, status='cancelled')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.viewer).key}')
+
+    def _lobby(self, **params):
+        response = self.client.get('/api/duels/lobby/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_can_join(self):
+        rows = {row['id']: row for row in self._lobby()}
+        self.assertEqual(set(rows), {self.cheap.pk, self.pricey.pk, self.own.pk})
+        self.assertTrue(rows[self.cheap.pk]['can_join'])
+        self.assertFalse(rows[self.pricey.pk]['can_join'])
+        self.assertFalse(rows[self.own.pk]['can_join'])
+        self.assertEqual(rows[self.cheap.pk]['creator_username'], 'host')
+
+        # Le solde est relu à chaque appel, pas pris dans l'utilisateur en cache
+        User.objects.filter(pk=self.viewer.pk).update(tickets=100)
+        rows = {row['id']: row for row in self._lobby()}
+        self.assertTrue(rows[self.pricey.pk]['can_join'])
+
+    def test_filters(self):
+        def ids(**params):
+            return [row['id'] for row in self._lobby(**params)]
+
+        self.assertEqual(ids(game_type='match_foot'), [self.cheap.pk])
+        self.assertEqual(ids(category='competition'), [self.pricey.pk])
+        self.assertEqual(ids(min_amount=15, max_amount=30), [self.own.pk])
+        self.assertEqual(ids(limit=2), [self.own.pk, self.pricey.pk])
+        response = self.client.get('/api/duels/lobby/', {'min_amount': 'dix'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_is_constant(self):
+        self._lobby()  # remplit le cache d'authentification
+        with self.assertNumQueries(2):
+            self._lobby()
+        for _ in range(5):
+            Duel.objects.create(creator=self.creator, game_type='zone_wars', amount=5)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self._lobby()), 8)
+
+
+class GameCategoryTests(ThrottleResetMixin, TestCase):
+    """Catalogue des jeux et filtre ?category= des duels et tournois"""
+
+    def setUp(self):
+        super().setUp()
+        self.player = User.objects.create_user('catalog', password='x', tickets=500)
+        self.client = APIClient()
+        self.client.force_authenticate(self.player)
+
+    def test_catalog(self):
+        from .games import CATEGORIES, GAMES, GAMES_BY_CATEGORY, category_display, category_for, game_display
+
+        self.assertEqual(category_for('box_fight'), 'competition')
+        self.assertEqual(category_for('inconnu'), 'other')
+        self.assertEqual(category_display('racing'), '🚗 Course')
+        self.assertEqual(category_display('inconnue'), category_display('other'))
+        self.assertEqual(game_display('match_foot'), 'Match de Foot')
+        self.assertEqual(game_display('inconnu'), 'inconnu')
+        # Chaque jeu apparaît une fois, dans la catégorie déclarée
+        indexed = [game for games in GAMES_BY_CATEGORY.values() for game in games]
+        self.assertCountEqual(indexed, GAMES)
+        self.assertEqual(set(GAMES_BY_CATEGORY), set(CATEGORIES))
+
+        duel = Duel.objects.create(creator=self.player, game_type='speedrun', amount=5)
+        self.assertEqual(duel.category, 'challenge')
+        self.assertEqual(duel.get_category_display(), '🎯 Défis')
+
+    def test_duel_category_filter(self):
+        sport = Duel.objects.create(creator=self.player, game_type='penalty_shootout', amount=5)
+        Duel.objects.create(creator=self.player, game_type='zone_wars', amount=5)
+
+        response = self.client.get('/api/duels/', {'category': 'sport'})
+        self.assertEqual([duel['id'] for duel in response.data], [sport.pk])
+        self.assertEqual(response.data[0]['category'], 'sport')
+        self.assertEqual(self.client.get('/api/duels/', {'category': 'inconnue'}).data, [])
+
+    def test_tournament_category_filter(self):
+        now = timezone.now()
+        tournaments = {
+            game: Tournament.objects.create(
+                name=game, game=game, entry_fee=10, prize_pool=100, max_participants=8,
+                registration_end=now, start_date=now, end_date=now + timedelta(days=1),
+            )
+            for game in ('course_aerienne', 'dribble_challenge', 'gunfight')
+        }
+
+        response = self.client.get('/api/tournaments/', {'category': 'racing'})
+        self.assertCountEqual(
+            [tournament['id'] for tournament in response.data],
+            [tournaments['course_aerienne'].pk, tournaments['dribble_challenge'].pk],
+        )
+        response = self.client.get('/api/tournaments/', {'category': 'racing', 'game_type': 'gunfight'})
+        self.assertEqual(response.data, [])
+        self.assertEqual(self.client.get('/api/tournaments/', {'category': 'inconnue'}).data, [])
+
+
+class WalletTransactionsPaginationTests(ThrottleResetMixin, TestCase):
+    """Historique du portefeuille paginé par curseur (created_at, id)"""
+
+    URL = '/api/withdrawals/transactions/'
+
+    def setUp(self):
+        from .models import WalletTransaction
+
+        super().setUp()
+        self.owner = User.objects.create_user('wallet', password='x', tickets=100)
+        other = User.objects.create_user('other', password='x', tickets=100)
+        base = timezone.now() - timedelta(hours=1)
+        # Deux mouvements partagent le même horodatage : départage par id
+        for user, offsets in ((self.owner, (0, 1, 1, 2, 3)), (other, (1, 4))):
+            for offset in offsets:
+                row = WalletTransaction.objects.create(user=user, kind='duel_win', amount=10, balance_after=100)
+                WalletTransaction.objects.filter(pk=row.pk).update(created_at=base + timedelta(minutes=offset))
+        self.expected = list(
+            WalletTransaction.objects.filter(user=self.owner).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def _page(self, cursor=None, limit=2):
+        params = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+        response = self.client.get(self.URL, params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']], response.data['next_cursor']
+
+    def test_pages_follow_next_cursor(self):
+        first, cursor = self._page(limit=3)
+        self.assertEqual(first, self.expected[:3])
+        second, cursor = self._page(cursor, limit=3)
+        self.assertEqual(second, self.expected[3:])
+        self.assertIsNone(cursor)
+        self.assertEqual(self._page(limit=5), (self.expected, None))
+
+    def test_rows_inserted_between_pages(self):
+        from .models import WalletTransaction
+
+        seen, cursor = self._page()
+        # Un nouveau mouvement arrive entre deux pages : il ne décale pas les suivantes
+        WalletTransaction.objects.create(user=self.owner, kind='duel_stake', amount=-10, balance_after=90)
+        while cursor:
+            page, cursor = self._page(cursor)
+            seen += page
+        self.assertEqual(seen, self.expected)
+
+    def test_scoped_to_request_user(self):
+        from .models import WalletTransaction
+
+        ids, _ = self._page(limit=50)
+        self.assertEqual(set(ids), set(WalletTransaction.objects.filter(user=self.owner).values_list('id', flat=True)))
+
+    def test_invalid_cursor_or_limit(self):
+        import base64
+
+        for cursor in ('pas-un-curseur', base64.urlsafe_b64encode(b'hier|1').decode(),
+                       base64.urlsafe_b64encode(b'2026-01-01T00:00:00+00:00|x').decode()):
+            response = self.client.get(self.URL, {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertIn('error', response.data)
+        for limit in (0, -1, 201, 'dix'):
+            response = self.client.get(self.URL, {'limit': limit})
+            self.assertEqual(response.status_code, 400, limit)
+            self.assertIn('error', response.data)
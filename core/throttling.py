@@ -0,0 +1,204 @@
+"""
+Limitation de débit par fenêtre glissante.
+
+`SimpleRateThrottle` de DRF garde dans le cache la liste des horodatages de
+chaque client : la mémoire croît avec le débit autorisé. Ici chaque clé ne
+garde que deux compteurs (fenêtre courante et précédente) ; le nombre de
+requêtes sur la dernière période est estimé en pondérant la fenêtre
+précédente par la part encore couverte :
+
+    estimation = précédente * (1 - écoulé / durée) + courante
+
+Le store est configurable via `settings.THROTTLE_STORE` :
+
+    THROTTLE_STORE = {
+        'BACKEND': 'core.throttling.LocMemSlidingWindowStore',
+        'OPTIONS': {'max_entries': 100000},
+    }
+
+`LocMemSlidingWindowStore` est propre au processus (LRU borné : une clé
+évincée repart de zéro). `DjangoCacheSlidingWindowStore` partage les
+compteurs entre workers via un alias de `settings.CACHES` ; ses clés sont
+préfixées par une génération, et `clear()` n'efface que ses propres compteurs
+(en changeant de génération) sans toucher au reste de l'alias.
+
+`reset_throttle_store()` repart de compteurs vides (à appeler dans le
+`setUp` des tests qui passent par l'API) ; le store est aussi reconstruit
+quand `THROTTLE_STORE` change (`override_settings`).
+
+Les limites par action se déclarent sur le viewset :
+
+    throttle_scopes = {'create': 'duel_create', 'join': 'duel_join'}
+
+chaque scope ayant son débit dans `REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']`.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.throttling import (
+    AnonRateThrottle, ScopedRateThrottle, SimpleRateThrottle, UserRateThrottle,
+)
+
+DEFAULT_THROTTLE_STORE = {
+    'BACKEND': 'core.throttling.LocMemSlidingWindowStore',
+    'OPTIONS': {'max_entries': 100000},
+}
+
+
+def _estimate(current, previous, duration, elapsed):
+    return previous * (1 - elapsed / duration) + current
+
+
+def _wait(current, previous, limit, duration, elapsed):
+    """Secondes avant que l'estimation repasse sous la limite"""
+    if current < limit:
+        # Seule la fenêtre précédente bloque : attendre qu'elle soit assez amortie
+        return max(duration * (1 - (limit - current) / previous) - elapsed, 0)
+    # La fenêtre courante est pleine : elle deviendra la précédente
+    return duration - elapsed + duration * (1 - limit / current)
+
+
+class LocMemSlidingWindowStore:
+    """Compteurs [fenêtre, courante, précédente] par clé, en mémoire locale au processus"""
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, duration):
+        """Compte une requête ; retourne None si elle est autorisée, sinon l'attente en secondes"""
+        now = time.time()
+        window = int(now // duration)
+        elapsed = now - window * duration
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < window - 1:
+                current, previous = 0, 0
+            elif entry[0] == window - 1:
+                current, previous = 0, entry[1]
+            else:
+                current, previous = entry[1], entry[2]
+
+            if _estimate(current, previous, duration, elapsed) >= limit:
+                self._data[key] = (window, current, previous)
+                return _wait(current, previous, limit, duration, elapsed)
+
+            self._data[key] = (window, current + 1, previous)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheSlidingWindowStore:
+    """Compteurs partagés entre workers, un par fenêtre, dans un alias de settings.CACHES"""
+
+    def __init__(self, alias='default', key_prefix='throttle'):
+        from django.core.cache import caches
+        self._cache = caches[alias]
+        self._generation_key = f"{key_prefix}:generation"
+        self._prefix = key_prefix
+
+    def _generation(self):
+        # Génération évincée ou absente : une nouvelle repart de compteurs vides
+        generation = self._cache.get(self._generation_key)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            if not self._cache.add(self._generation_key, generation, timeout=None):
+                generation = self._cache.get(self._generation_key, generation)
+        return generation
+
+    def hit(self, key, limit, duration):
+        now = time.time()
+        window = int(now // duration)
+        elapsed = now - window * duration
+        key = f"{self._prefix}:{self._generation()}:{key}"
+        current_key, previous_key = f"{key}:{window}", f"{key}:{window - 1}"
+
+        counts = self._cache.get_many([current_key, previous_key])
+        current, previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+        if _estimate(current, previous, duration, elapsed) >= limit:
+            return _wait(current, previous, limit, duration, elapsed)
+
+        # Conservé deux périodes : il sert encore de fenêtre précédente
+        if not self._cache.add(current_key, 1, timeout=int(2 * duration) + 1):
+            try:
+                self._cache.incr(current_key)
+            except ValueError:
+                self._cache.set(current_key, 1, timeout=int(2 * duration) + 1)
+        return None
+
+    def clear(self):
+        """Abandonne les compteurs de ce store ; ils expirent ensuite d'eux-mêmes"""
+        self._cache.set(self._generation_key, uuid.uuid4().hex, timeout=None)
+
+
+def _build_throttle_store():
+    config = getattr(settings, 'THROTTLE_STORE', DEFAULT_THROTTLE_STORE)
+    backend_class = import_string(config['BACKEND'])
+    return backend_class(**config.get('OPTIONS', {}))
+
+
+throttle_store = _build_throttle_store()
+
+
+def reset_throttle_store():
+    """Remplace le store par un store vide construit depuis les settings courants"""
+    global throttle_store
+    throttle_store = _build_throttle_store()
+    # Un store partagé retrouverait les compteurs des autres instances
+    throttle_store.clear()
+
+
+@receiver(setting_changed)
+def _rebuild_throttle_store(setting, **kwargs):
+    if setting == 'THROTTLE_STORE':
+        reset_throttle_store()
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """`SimpleRateThrottle` dont l'historique est remplacé par `throttle_store`"""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        self._wait = throttle_store.hit(key, self.num_requests, self.duration)
+        return self._wait is None
+
+    def wait(self):
+        return self._wait
+
+
+class UserSlidingWindowThrottle(SlidingWindowThrottle, UserRateThrottle):
+    """Débit global par utilisateur (scope 'user')"""
+
+
+class AnonSlidingWindowThrottle(SlidingWindowThrottle, AnonRateThrottle):
+    """Débit global par adresse IP pour les requêtes anonymes (scope 'anon')"""
+
+
+class ActionSlidingWindowThrottle(SlidingWindowThrottle, ScopedRateThrottle):
+    """Débit par action, d'après `view.throttle_scopes` ; les autres actions ne sont pas limitées"""
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, 'throttle_scopes', {}).get(getattr(view, 'action', None))
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
@@ -0,0 +1,132 @@
+"""
+Statistiques de duels par joueur.
+
+`UserStats` garde, pour chaque joueur, une ligne par jeu et une ligne tous
+jeux confondus (`game_type=''`). `record_result` y ajoute chaque duel
+terminé au moment où ses gains sont distribués (`Duel._distribute_rewards`,
+commun à forfeit, admit_defeat, confirm_result et au règlement admin des
+litiges), par des UPDATE relatifs (`F('played') + 1`...) : le profil lit les
+agrégats sans parcourir l'historique.
+
+`rebuild` les recalcule depuis les duels (commande `rebuild_user_stats`). Il
+verrouille d'abord les lignes existantes et les réécrit sur place : un
+`record_result` concurrent attend la fin du recalcul puis s'ajoute aux
+valeurs recalculées, au lieu d'être écrasé (ou perdu avec une ligne
+supprimée).
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Duel, UserStats
+
+ALL_GAMES = ''
+COUNTER_FIELDS = ('played', 'wins', 'tickets_won', 'tickets_lost', 'total_staked', 'current_streak', 'best_streak')
+
+
+def _win_streak():
+    return Case(When(current_streak__gt=0, then=F('current_streak') + 1), default=Value(1))
+
+
+def _loss_streak():
+    return Case(When(current_streak__lt=0, then=F('current_streak') - 1), default=Value(-1))
+
+
+@transaction.atomic
+def record_result(duel):
+    """Ajoute un duel terminé avec vainqueur aux statistiques de ses deux joueurs"""
+    loser_id = duel.opponent_id if duel.winner_id == duel.creator_id else duel.creator_id
+    games = [duel.game_type, ALL_GAMES]
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id, game_type=game) for user_id in (duel.winner_id, loser_id) for game in games],
+        ignore_conflicts=True,
+    )
+
+    UserStats.objects.filter(user_id=duel.winner_id, game_type__in=games).update(
+        played=F('played') + 1,
+        wins=F('wins') + 1,
+        tickets_won=F('tickets_won') + duel.amount,
+        total_staked=F('total_staked') + duel.amount,
+        current_streak=_win_streak(),
+        best_streak=Greatest(F('best_streak'), _win_streak()),
+    )
+    UserStats.objects.filter(user_id=loser_id, game_type__in=games).update(
+        played=F('played') + 1,
+        tickets_lost=F('tickets_lost') + duel.amount,
+        total_staked=F('total_staked') + duel.amount,
+        current_streak=_loss_streak(),
+    )
+
+
+def _completed_duels():
+    return Duel.objects.filter(status='completed', winner__isnull=False, opponent__isnull=False)
+
+
+def _aggregates():
+    """{(user_id, game_type): compteurs}, par une requête groupée par rôle"""
+    totals = {}
+    for role in ('creator', 'opponent'):
+        won = Q(winner_id=F(f'{role}_id'))
+        rows = _completed_duels().values(player_id=F(f'{role}_id'), game=F('game_type')).annotate(
+            played=Count('id'),
+            wins=Count('id', filter=won),
+            tickets_won=Sum('amount', filter=won, default=0),
+            tickets_lost=Sum('amount', filter=~won, default=0),
+            total_staked=Sum('amount'),
+        ).order_by()
+        for row in rows:
+            player_id, game = row.pop('player_id'), row.pop('game')
+            for key in ((player_id, game), (player_id, ALL_GAMES)):
+                entry = totals.setdefault(key, dict.fromkeys(row, 0))
+                for field, value in row.items():
+                    entry[field] += value
+    return totals
+
+
+def _streaks():
+    """{(user_id, game_type): (série en cours, meilleure série)}, dans l'ordre de fin des duels"""
+    streaks = {}
+    duels = _completed_duels().order_by('completed_at', 'id').values_list(
+        'creator_id', 'opponent_id', 'winner_id', 'game_type'
+    )
+    for creator_id, opponent_id, winner_id, game in duels.iterator(chunk_size=5000):
+        for player_id in (creator_id, opponent_id):
+            won = player_id == winner_id
+            for key in ((player_id, game), (player_id, ALL_GAMES)):
+                current, best = streaks.get(key, (0, 0))
+                if won:
+                    current = current + 1 if current > 0 else 1
+                    best = max(best, current)
+                else:
+                    current = current - 1 if current < 0 else -1
+                streaks[key] = (current, best)
+    return streaks
+
+
+@transaction.atomic
+def rebuild(batch_size=1000):
+    """Recalcule toutes les statistiques depuis les duels terminés ; retourne le nombre de lignes"""
+    # Verrou pris avant de lire les duels : les résultats en cours d'écriture sont vus ou attendent
+    existing = {(stats.user_id, stats.game_type): stats for stats in UserStats.objects.select_for_update()}
+    totals = _aggregates()
+    streaks = _streaks()
+
+    created = []
+    for (user_id, game), counters in totals.items():
+        current_streak, best_streak = streaks[user_id, game]
+        values = {**counters, 'current_streak': current_streak, 'best_streak': best_streak}
+        stats = existing.get((user_id, game))
+        if stats is None:
+            created.append(UserStats(user_id=user_id, game_type=game, **values))
+        else:
+            for field, value in values.items():
+                setattr(stats, field, value)
+    # Lignes sans duel terminé : remises à zéro plutôt que supprimées
+    for key, stats in existing.items():
+        if key not in totals:
+            for field in COUNTER_FIELDS:
+                setattr(stats, field, 0)
+
+    UserStats.objects.bulk_update(existing.values(), COUNTER_FIELDS, batch_size=batch_size)
+    UserStats.objects.bulk_create(created, batch_size=batch_size)
+    return len(totals)
@@ -2,11 +2,20 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import serializers
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import F, Prefetch, Q, Value
 from django.utils import timezone
-from .models import Duel, User, Tournament, TournamentParticipant, TournamentMatch
-from .serializers import (DuelSerializer, UserSerializer, UserProfileSerializer, 
-                         TournamentSerializer, TournamentParticipantSerializer)
+from .models import Duel, User, UserStats, Tournament, TournamentParticipant, TournamentMatch
+from . import duel_states
+from .db_routers import ReplicaRoutingMixin
+from .games import GAMES_BY_CATEGORY
+from .idempotency import idempotent
+from .pagination import keyset_union_page, parse_limit
+from .ranks import record_victory
+from .user_stats import ALL_GAMES
+from .ledger import InsufficientTickets, credit, settle_escrow, stake, unstake
+from .serializers import (DuelSerializer, DuelLobbySerializer, DuelHistorySerializer, UserSerializer, UserProfileSerializer, 
+                         UserStatsSerializer, TournamentSerializer, TournamentParticipantSerializer)
 from django.http import JsonResponse
 import random
 import math
@@ -23,24 +32,38 @@ def home(request):
         }
     })
 
-class TournamentViewSet(viewsets.ModelViewSet):
-    queryset = Tournament.objects.all().order_by('-created_at')
+class TournamentViewSet(ReplicaRoutingMixin, viewsets.ModelViewSet):
+    queryset = Tournament.objects.select_related('winner__kyc').order_by('-created_at')
     serializer_class = TournamentSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            # Participants, matchs et profils imbriqués (KYC compris) en un nombre fixe de requêtes ;
+            # pas pour les actions qui inscrivent ou créent des matchs (cache préchargé périmé)
+            queryset = queryset.prefetch_related(
+                Prefetch('participants', queryset=TournamentParticipant.objects.select_related('user__kyc')),
+                Prefetch('matches', queryset=TournamentMatch.objects.select_related(
+                    'player1__kyc', 'player2__kyc', 'winner__kyc', 'loser__kyc'
+                )),
+            )
         status_filter = self.request.query_params.get('status', None)
         game_type = self.request.query_params.get('game_type', None)
+        category = self.request.query_params.get('category', None)
         
         if status_filter:
             queryset = queryset.filter(status=status_filter)
         if game_type:
             queryset = queryset.filter(game=game_type)
+        if category:
+            queryset = queryset.filter(game__in=GAMES_BY_CATEGORY.get(category, ()))
             
         return queryset
     
     @action(detail=True, methods=['post'])
+    @idempotent
+    @transaction.atomic
     def register(self, request, pk=None):
         tournament = self.get_object()
         user = request.user
@@ -64,13 +87,18 @@ class TournamentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # Déduire les tickets
+        try:
+            stake(user, tournament.entry_fee, 'tournament_fee', tournament=tournament)
+        except InsufficientTickets:
+            return Response(
+                {"error": "Tickets insuffisants"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         # Inscription
         TournamentParticipant.objects.create(tournament=tournament, user=user)
         
-        # Déduire les tickets
-        user.tickets -= tournament.entry_fee
-        user.save()
-        
         # Si le tournoi est plein, changer le statut
         if tournament.is_full:
             tournament.status = 'ongoing'
@@ -163,8 +191,7 @@ class TournamentViewSet(viewsets.ModelViewSet):
         match.save()
         
         # Mettre à jour les statistiques du vainqueur
-        winner.victories += 1
-        winner.save()
+        record_victory(winner)
         
         # Vérifier si le tour est terminé et générer le suivant
         self.check_and_generate_next_round(tournament, match.round_number)
@@ -185,9 +212,9 @@ class TournamentViewSet(viewsets.ModelViewSet):
                 tournament.status = 'completed'
                 tournament.save()
                 
-                # Récompenser le vainqueur
-                winners[0].tickets += tournament.prize_pool
-                winners[0].save()
+                # Les inscriptions sont acquises, le vainqueur reçoit la dotation
+                settle_escrow(None, 'tournament_fee', tournament=tournament)
+                credit(winners[0], tournament.prize_pool, 'tournament_prize', tournament=tournament)
             else:
                 # Générer le tour suivant
                 self.generate_next_round(tournament, current_round + 1, winners)
@@ -208,19 +235,43 @@ class TournamentViewSet(viewsets.ModelViewSet):
                 )
                 match_number += 1
 
-class DuelViewSet(viewsets.ModelViewSet):
-    queryset = Duel.objects.all().order_by('-created_at')
+class DuelViewSet(ReplicaRoutingMixin, viewsets.ModelViewSet):
+    # Profils imbriqués : les données KYC des joueurs sont lues dans la même requête
+    queryset = Duel.objects.select_related('creator__kyc', 'opponent__kyc', 'winner__kyc').order_by('-created_at')
     serializer_class = DuelSerializer
     permission_classes = [permissions.IsAuthenticated]
+    LOBBY_DEFAULT_LIMIT = 50
+    LOBBY_MAX_LIMIT = 200
+    # Débits dans REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] (voir core/throttling.py)
+    throttle_scopes = {
+        'list': 'duel_list',
+        'lobby': 'duel_list',
+        'create': 'duel_create',
+        'join': 'duel_join',
+        'upload_proof': 'duel_proof',
+        'ready': 'duel_action',
+        'cancel': 'duel_action',
+        'modify': 'duel_action',
+        'claim_victory': 'duel_action',
+        'forfeit': 'duel_action',
+        'admit_defeat': 'duel_action',
+        'confirm_result': 'duel_action',
+        'rematch': 'duel_action',
+        'accept_rematch': 'duel_join',
+    }
     
     def get_queryset(self):
         queryset = super().get_queryset()
         game_type = self.request.query_params.get('game_type', None)
+        category = self.request.query_params.get('category', None)
         status_filter = self.request.query_params.get('status', None)
         
         if game_type:
             queryset = queryset.filter(game_type=game_type)
         
+        if category:
+            queryset = queryset.filter(category=category)
+        
         if status_filter == 'open':
             queryset = queryset.filter(opponent__isnull=True, winner__isnull=True)
         elif status_filter == 'ongoing':
@@ -230,6 +281,49 @@ class DuelViewSet(viewsets.ModelViewSet):
             
         return queryset
     
+    @action(detail=False, methods=['get'])
+    def lobby(self, request):
+        """Duels ouverts au format compact (sans instancier de modèles)"""
+        queryset = Duel.objects.filter(status='open', opponent__isnull=True)
+        params = request.query_params
+        
+        game_type = params.get('game_type')
+        if game_type:
+            queryset = queryset.filter(game_type=game_type)
+        
+        category = params.get('category')
+        if category:
+            queryset = queryset.filter(category=category)
+        
+        try:
+            min_amount = int(params['min_amount']) if params.get('min_amount') else None
+            max_amount = int(params['max_amount']) if params.get('max_amount') else None
+            limit = max(1, min(int(params.get('limit', self.LOBBY_DEFAULT_LIMIT)), self.LOBBY_MAX_LIMIT))
+        except ValueError:
+            return Response(
+                {"error": "Paramètres de filtre invalides"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if min_amount is not None:
+            queryset = queryset.filter(amount__gte=min_amount)
+        if max_amount is not None:
+            queryset = queryset.filter(amount__lte=max_amount)
+        
+        rows = queryset.order_by('-created_at').values(*DuelLobbySerializer.LOBBY_FIELDS)[:limit]
+        # Solde lu seul : l'utilisateur authentifié par cache ne charge pas ses champs différés
+        viewer_tickets = None
+        if request.user.is_authenticated:
+            viewer_tickets = User.objects.filter(pk=request.user.pk).values_list('tickets', flat=True).first()
+        serializer = DuelLobbySerializer(
+            rows, many=True, context={'request': request, 'viewer_tickets': viewer_tickets}
+        )
+        return Response(serializer.data)
+    
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         # Vérifier que l'utilisateur a assez de tickets
         user = self.request.user
@@ -238,45 +332,31 @@ class DuelViewSet(viewsets.ModelViewSet):
         if user.tickets < amount_required:
             raise serializers.ValidationError("Tickets insuffisants")
         
-        # Créer le duel
-        duel = serializer.save(creator=user)
-        
-        # Déduire les tickets de l'utilisateur
-        user.tickets -= amount_required
-        user.save()
+        with transaction.atomic():
+            # Créer le duel
+            duel = serializer.save(creator=user)
+            
+            # Déduire les tickets de l'utilisateur
+            try:
+                stake(user, amount_required, 'duel_stake', duel=duel)
+            except InsufficientTickets:
+                raise serializers.ValidationError("Tickets insuffisants")
     
     @action(detail=True, methods=['post'])
+    @idempotent
     def join(self, request, pk=None):
         duel = self.get_object()
-        user = request.user
         
-        # Vérifications
-        if duel.opponent:
-            return Response(
-                {"error": "Ce duel a déjà un adversaire"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if duel.creator == user:
-            return Response(
-                {"error": "Vous ne pouvez pas rejoindre votre propre duel"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if user.tickets < duel.amount:
+        # open -> waiting et mise de l'adversaire, en une transaction
+        try:
+            duel_states.join(duel, request.user)
+        except InsufficientTickets:
             return Response(
                 {"error": "Tickets insuffisants"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Rejoindre le duel
-        duel.opponent = user
-        duel.status = 'in_progress'  # Le duel commence quand quelqu'un le rejoint
-        duel.save()
-        
-        # Déduire les tickets
-        user.tickets -= duel.amount
-        user.save()
+        except duel_states.TransitionError as exc:
+            return duel_states.error_response(exc)
         
         serializer = self.get_serializer(duel)
         return Response(serializer.data)
@@ -285,23 +365,12 @@ class DuelViewSet(viewsets.ModelViewSet):
     def ready(self, request, pk=None):
         """Marquer le joueur comme prêt"""
         duel = self.get_object()
-        user = request.user
         
-        # Vérifications
-        if duel.status != 'waiting':
-            return Response(
-                {"error": "Le duel doit être en attente pour marquer comme prêt"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if user != duel.creator and user != duel.opponent:
-            return Response(
-                {"error": "Vous ne participez pas à ce duel"}, 
-                status=status.HTTP_403_FORBIDDEN
-            )
-        
-        # Marquer comme prêt et vérifier si le duel peut commencer
-        duel_started = duel.set_player_ready(user)
+        # Marquer comme prêt ; le duel démarre si l'adversaire l'était déjà
+        try:
+            duel_started = duel_states.ready(duel, request.user)
+        except duel_states.TransitionError as exc:
+            return duel_states.error_response(exc)
         
         message = "Vous êtes prêt !"
         if duel_started:
@@ -332,56 +401,33 @@ class DuelViewSet(viewsets.ModelViewSet):
             )
         
         # Restrictions pour les créateurs (pas pour les admins)
-        if is_creator and not is_admin:
-            if duel.opponent:
-                return Response(
-                    {"error": "Impossible d'annuler un duel qui a déjà un adversaire. Contactez un administrateur."}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            if duel.status != 'waiting':
-                return Response(
-                    {"error": "Impossible d'annuler un duel qui n'est pas en attente"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        
-        # Vérification pour tous : ne pas annuler si déjà terminé
-        if duel.status in ['completed', 'expired']:
+        if is_creator and not is_admin and duel.opponent:
             return Response(
-                {"error": "Ce duel ne peut pas être annulé car il est déjà terminé"}, 
+                {"error": "Impossible d'annuler un duel qui a déjà un adversaire. Contactez un administrateur."}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Rembourser les participants
-        duel.creator.tickets += duel.amount
-        duel.creator.save()
-        
-        if duel.opponent:
-            duel.opponent.tickets += duel.amount
-            duel.opponent.save()
+        # Les participants sont remboursés dans la même transaction
+        try:
+            if is_admin:
+                duel_states.cancel(duel, user, reason)
+            else:
+                # Supprimer le duel si c'est le créateur (ancien comportement)
+                duel_states.withdraw(duel)
+        except duel_states.TransitionError as exc:
+            return duel_states.error_response(exc)
         
-        # Si c'est un admin qui annule, marquer avec les détails admin
         if is_admin:
-            duel.status = 'cancelled'
-            duel.admin_resolution = True
-            duel.admin_reason = reason
-            duel.resolved_by = user
-            duel.resolved_at = timezone.now()
-            duel.save()
-            
             return Response({
                 "message": "Duel annulé par l'administrateur. Tous les participants ont été remboursés.",
                 "data": DuelSerializer(duel).data
             })
-        else:
-            # Supprimer le duel si c'est le créateur (ancien comportement)
-            duel.delete()
-            
-            return Response({
-                "message": "Duel annulé avec succès. Vos tickets ont été remboursés."
-            })
+        return Response({
+            "message": "Duel annulé avec succès. Vos tickets ont été remboursés."
+        })
     
     @action(detail=True, methods=['patch'])
+    @transaction.atomic
     def modify(self, request, pk=None):
         """Modifier un duel (seulement par le créateur et seulement si personne ne l'a rejoint)"""
         duel = self.get_object()
@@ -400,9 +446,11 @@ class DuelViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if duel.status != 'waiting':
+        try:
+            duel_states.check(duel, 'modify')
+        except duel_states.TransitionError:
             return Response(
-                {"error": "Impossible de modifier un duel qui n'est pas en attente"}, 
+                {"error": "Impossible de modifier un duel qui n'est pas ouvert"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
@@ -413,7 +461,7 @@ class DuelViewSet(viewsets.ModelViewSet):
         
         if new_amount is not None:
             try:
-                new_amount = float(new_amount)
+                new_amount = int(new_amount)
                 if new_amount <= 0:
                     return Response(
                         {"error": "Le montant doit être positif"}, 
@@ -424,17 +472,17 @@ class DuelViewSet(viewsets.ModelViewSet):
                 amount_diff = new_amount - duel.amount
                 
                 if amount_diff > 0:  # Augmentation du montant
-                    if user.tickets < amount_diff:
+                    try:
+                        stake(user, amount_diff, 'duel_stake', duel=duel)
+                    except InsufficientTickets:
                         return Response(
                             {"error": f"Tickets insuffisants. Vous avez besoin de {amount_diff} tickets supplémentaires"}, 
                             status=status.HTTP_400_BAD_REQUEST
                         )
-                    user.tickets -= amount_diff
-                else:  # Diminution du montant
-                    user.tickets += abs(amount_diff)
+                elif amount_diff < 0:  # Diminution du montant
+                    unstake(user, -amount_diff, 'duel_refund', duel=duel)
                 
                 duel.amount = new_amount
-                user.save()
                 
             except (ValueError, TypeError):
                 return Response(
@@ -448,7 +496,12 @@ class DuelViewSet(viewsets.ModelViewSet):
         if new_description is not None:
             duel.description = new_description
         
-        duel.save()
+        try:
+            duel_states.modify(duel, duel.amount, duel.game_type)
+        except duel_states.TransitionError as exc:
+            # Annule aussi l'ajustement de la mise
+            transaction.set_rollback(True)
+            return duel_states.error_response(exc)
         
         serializer = self.get_serializer(duel)
         return Response({
@@ -469,64 +522,37 @@ class DuelViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if not duel.opponent:
-            return Response(
-                {"error": "Le duel n'a pas encore d'adversaire"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         if duel.winner or duel.status == 'completed':
             return Response(
                 {"error": "Le duel est déjà terminé"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Vérifier que le duel est en cours
-        if duel.status not in ['in_progress', 'waiting']:
-            return Response(
-                {"error": f"Le duel doit être en cours ou en attente. Statut actuel: {duel.status}"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Vérifier expiration
-        if duel.is_expired():
-            duel.status = 'expired'
-            duel.save()
-            return Response(
-                {"error": "Le temps pour jouer ce duel est écoulé"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Enregistrer la déclaration de victoire
-        if user == duel.creator:
-            duel.creator_action = 'victory'
-        else:  # user == duel.opponent
-            duel.opponent_action = 'victory'
+        try:
+            # Vérifier expiration
+            if duel.status == 'active' and duel.is_expired():
+                duel_states.expire(duel)
+                return Response(
+                    {"error": "Le temps pour jouer ce duel est écoulé"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Enregistrer la déclaration ; deux victoires déclarées ouvrent un litige
+            duel_states.claim_victory(duel, user)
+        except duel_states.TransitionError as exc:
+            return duel_states.error_response(exc)
         
-        # Essayer de résoudre automatiquement le duel
-        if duel.resolve_duel():
-            # Duel résolu automatiquement
+        if duel.status in ['disputed', 'ai_validation']:
             return Response({
-                "message": f"Félicitations {duel.winner.username} ! Vous avez remporté le duel !",
-                "status": "completed",
+                "message": "Conflit détecté ! Les deux joueurs revendiquent la victoire. Un admin va examiner les preuves.",
+                "status": duel.status,
                 "data": self.get_serializer(duel).data
             })
-        else:
-            # Duel en attente ou en conflit
-            duel.save()
-            
-            if duel.status == 'disputed':
-                return Response({
-                    "message": "Conflit détecté ! Les deux joueurs revendiquent la victoire. Un admin va examiner les preuves.",
-                    "status": "disputed",
-                    "data": self.get_serializer(duel).data
-                })
-            else:
-                return Response({
-                    "message": "Votre victoire a été enregistrée. En attente de la réaction de votre adversaire.",
-                    "status": duel.status,
-                    "data": self.get_serializer(duel).data
-                })
+        return Response({
+            "message": "Votre victoire a été enregistrée. En attente de la réaction de votre adversaire.",
+            "status": duel.status,
+            "data": self.get_serializer(duel).data
+        })
     
     @action(detail=True, methods=['post'])
     def upload_proof(self, request, pk=None):
@@ -570,48 +596,17 @@ class DuelViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if not duel.opponent:
-            return Response(
-                {"error": "Le duel n'a pas encore d'adversaire"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         if duel.winner or duel.status == 'completed':
             return Response(
                 {"error": "Le duel est déjà terminé"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Vérifier que le duel est en cours
-        if duel.status not in ['in_progress', 'waiting']:
-            return Response(
-                {"error": f"Le duel doit être en cours ou en attente. Statut actuel: {duel.status}"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Forfait = l'adversaire gagne automatiquement
-        if user == duel.creator:
-            duel.winner = duel.opponent
-            loser = duel.creator
-        else:
-            duel.winner = duel.creator
-            loser = user
-        
-        duel.status = 'completed'
-        duel.completed_at = timezone.now()
-        duel.save()
-        
-        # Récompenser le vainqueur et pénaliser le perdant
-        winner = duel.winner
-        winner.tickets += duel.amount * 2  # Gagne le double de la mise
-        winner.victories += 1
-        self.update_user_rank(winner)
-        winner.save()
-        
-        # Le perdant ne récupère pas sa mise
-        loser.defeats += 1
-        self.update_user_rank(loser)
-        loser.save()
+        # L'adversaire gagne : statut, mises et victoires en une transaction
+        try:
+            winner = duel_states.concede(duel, user, 'forfeit')
+        except duel_states.TransitionError as exc:
+            return duel_states.error_response(exc)
         
         return Response({
             "message": f"{user.username} a déclaré forfait. {winner.username} remporte le duel !",
@@ -633,46 +628,17 @@ class DuelViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if not duel.opponent:
-            return Response(
-                {"error": "Le duel n'a pas encore d'adversaire"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         if duel.winner or duel.status == 'completed':
             return Response(
                 {"error": "Le duel est déjà terminé"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Vérifier que le duel est en cours
-        if duel.status not in ['in_progress', 'waiting']:
-            return Response(
-                {"error": f"Le duel doit être en cours ou en attente. Statut actuel: {duel.status}"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Défaite admise = l'adversaire gagne automatiquement
-        if user == duel.creator:
-            duel.winner = duel.opponent
-        else:
-            duel.winner = duel.creator
-        
-        duel.status = 'completed'
-        duel.completed_at = timezone.now()
-        duel.save()
-        
-        # Récompenser le vainqueur
-        winner = duel.winner
-        winner.tickets += duel.amount * 2  # Gagne le double de la mise
-        winner.victories += 1
-        self.update_user_rank(winner)
-        winner.save()
-        
-        # Mettre à jour les stats du perdant
-        user.defeats += 1
-        self.update_user_rank(user)
-        user.save()
+        # L'adversaire gagne : statut, mises et victoires en une transaction
+        try:
+            winner = duel_states.concede(duel, user, 'admit_defeat')
+        except duel_states.TransitionError as exc:
+            return duel_states.error_response(exc)
         
         return Response({
             "message": f"{user.username} a admis sa défaite. {winner.username} remporte le duel !",
@@ -683,7 +649,7 @@ class DuelViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['patch'])
     def confirm_result(self, request, pk=None):
-        """Confirmer le résultat déclaré par l'adversaire"""
+        """Confirmer la victoire déclarée par l'adversaire"""
         duel = self.get_object()
         user = request.user
         
@@ -693,56 +659,53 @@ class DuelViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if duel.status != 'waiting_proof':
-            return Response(
-                {"error": "Rien à confirmer"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Déterminer qui a fait la déclaration initiale
-        if duel.creator_claim and not duel.opponent_claim:
-            # Creator a déclaré, opponent confirme
-            if user == duel.opponent:
-                duel.opponent_claim = duel.creator_claim
-                duel.winner = duel.creator_claim
-            else:
-                return Response({"error": "Vous avez déjà fait votre déclaration"})
-        elif duel.opponent_claim and not duel.creator_claim:
-            # Opponent a déclaré, creator confirme
-            if user == duel.creator:
-                duel.creator_claim = duel.opponent_claim
-                duel.winner = duel.opponent_claim
-            else:
-                return Response({"error": "Vous avez déjà fait votre déclaration"})
+        # Confirmer = admettre la défaite face à la victoire déclarée
+        try:
+            winner = duel_states.concede(duel, user, 'confirm_result')
+        except duel_states.TransitionError as exc:
+            return duel_states.error_response(exc)
         
-        duel.status = 'completed'
-        duel.resolved_at = timezone.now()
-        duel.save()
+        return Response({
+            "message": f"Résultat confirmé ! {winner.username} remporte le duel !",
+            "data": self.get_serializer(duel).data
+        })
+    
+    @action(detail=True, methods=['post'])
+    def rematch(self, request, pk=None):
+        """Proposer une revanche à l'adversaire d'un duel terminé"""
+        duel = self.get_object()
         
-        # Récompenser le vainqueur
-        winner = duel.winner
-        winner.tickets += duel.tickets * 2
-        winner.victories += 1
-        self.update_user_rank(winner)
-        winner.save()
+        try:
+            duel_states.request_rematch(duel, request.user)
+        except duel_states.TransitionError as exc:
+            return duel_states.error_response(exc)
         
         return Response({
-            "message": f"Résultat confirmé ! {winner.username} remporte le duel !",
+            "message": "Revanche proposée à votre adversaire",
             "data": self.get_serializer(duel).data
         })
     
-    def update_user_rank(self, user):
-        """Met à jour le rang d'un utilisateur selon ses victoires"""
-        if user.victories >= 50:
-            user.rank = "Légende"
-        elif user.victories >= 20:
-            user.rank = "Expert"
-        elif user.victories >= 10:
-            user.rank = "Confirmé"
-        elif user.victories >= 5:
-            user.rank = "Intermédiaire"
-        else:
-            user.rank = "Débutant"
+    @action(detail=True, methods=['post'])
+    @idempotent
+    def accept_rematch(self, request, pk=None):
+        """Accepter la revanche : le nouveau duel démarre immédiatement"""
+        duel = self.get_object()
+        
+        # Création du duel et mises des deux joueurs, en une transaction
+        try:
+            rematch = duel_states.accept_rematch(duel, request.user)
+        except InsufficientTickets:
+            return Response(
+                {"error": "Tickets insuffisants pour l'un des joueurs"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except duel_states.TransitionError as exc:
+            return duel_states.error_response(exc)
+        
+        return Response({
+            "message": "Revanche acceptée ! Le duel commence.",
+            "data": self.get_serializer(rematch).data
+        }, status=status.HTTP_201_CREATED)
     
     @action(detail=True, methods=['patch'])
     def declare_winner(self, request, pk=None):
@@ -750,8 +713,8 @@ class DuelViewSet(viewsets.ModelViewSet):
         # Rediriger vers claim_victory pour l'instant
         return self.claim_victory(request, pk)
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = User.objects.all().order_by('-victories', '-tickets')
+class UserViewSet(ReplicaRoutingMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = User.objects.select_related('kyc').order_by('-victories', '-tickets')
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -769,5 +732,44 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
         else:
             queryset = User.objects.all().order_by('-victories', '-tickets')
         
-        serializer = UserProfileSerializer(queryset[:100], many=True)  # Top 100
-        return Response(serializer.data)
\ No newline at end of file
+        serializer = UserProfileSerializer(queryset.select_related('kyc')[:100], many=True)  # Top 100
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def duels(self, request, pk=None):
+        """Duels du joueur, du plus récent au plus ancien, paginés par curseur (?cursor=, ?limit=)"""
+        user = self.get_object()
+        # Une requête par rôle, chacune sur son index (creator|opponent, created_at, id)
+        branches = [
+            Duel.objects.filter(**{role: user}).values(
+                *DuelHistorySerializer.HISTORY_FIELDS,
+                role=Value(role),
+                rival_id=F(f'{rival}_id'),
+                rival_username=F(f'{rival}__username'),
+                rival_rank=F(f'{rival}__rank'),
+            )
+            for role, rival in (('creator', 'opponent'), ('opponent', 'creator'))
+        ]
+        try:
+            limit = parse_limit(request.query_params.get('limit'))
+            rows, next_cursor = keyset_union_page(branches, request.query_params.get('cursor'), limit)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            "results": DuelHistorySerializer(rows, many=True).data,
+            "next_cursor": next_cursor
+        })
+    
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Statistiques de duels du joueur (agrégats de UserStats), tous jeux confondus et par jeu"""
+        user = self.get_object()
+        by_game = {row.game_type: row for row in UserStats.objects.filter(user=user).order_by('-played', 'game_type')}
+        overall = by_game.pop(ALL_GAMES, None) or UserStats(user=user)
+        
+        return Response({
+            "user_id": user.pk,
+            "overall": UserStatsSerializer(overall).data,
+            "by_game": UserStatsSerializer(by_game.values(), many=True).data
+        })
\ No newline at end of file
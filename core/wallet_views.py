@@ -3,24 +3,33 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
 from django.db import transaction
-import uuid
-import time
-from .models import Withdrawal
-from .serializers import WithdrawalSerializer, WithdrawalRequestSerializer
+from django.http import StreamingHttpResponse
+from .models import Withdrawal, WalletTransaction
+from .db_routers import ReplicaRoutingMixin
+from .withdrawals import approve_many, reject_many
+from .ledger import InsufficientTickets, credit, debit
+from .idempotency import idempotent
+from .pagination import keyset_page, parse_limit
+from .sepa import iter_pain001
+from .exports import parse_period, streaming_export
+from .serializers import (WithdrawalSerializer, WithdrawalRequestSerializer, WithdrawalBulkSerializer,
+                          WalletTransactionSerializer)
 
-class WithdrawalViewSet(viewsets.ModelViewSet):
+class WithdrawalViewSet(ReplicaRoutingMixin, viewsets.ModelViewSet):
     """ViewSet pour gérer les retraits d'argent"""
     serializer_class = WithdrawalSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scopes = {'create': 'withdrawal_create'}
     
     def get_queryset(self):
-        return Withdrawal.objects.filter(user=self.request.user)
+        return Withdrawal.objects.filter(user=self.request.user).select_related('user__kyc')
     
     def get_serializer_class(self):
         if self.action == 'create':
             return WithdrawalRequestSerializer
         return WithdrawalSerializer
     
+    @idempotent
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         """Créer une demande de retrait"""
@@ -31,45 +40,27 @@ class WithdrawalViewSet(viewsets.ModelViewSet):
         amount_euros = serializer.validated_data['amount_euros']
         tickets_needed = int(amount_euros * 10)
         
-        # Vérification finale des tickets
-        if user.tickets < tickets_needed:
-            return Response(
-                {"error": "Tickets insuffisants"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Déduire les tickets immédiatement
-        user.tickets -= tickets_needed
-        user.save()
-        
-        # Créer la demande de retrait
+        # Créer la demande de retrait ; le virement est traité par process_withdrawals
         withdrawal = serializer.save(
             user=user,
             amount_tickets=tickets_needed
         )
         
-        # Lancer la simulation de traitement
-        self._simulate_processing(withdrawal)
+        # Déduire les tickets immédiatement (vérification finale du solde)
+        try:
+            debit(user, tickets_needed, 'withdrawal', withdrawal=withdrawal)
+        except InsufficientTickets:
+            transaction.set_rollback(True)
+            return Response(
+                {"error": "Tickets insuffisants"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         return Response(
             WithdrawalSerializer(withdrawal).data,
             status=status.HTTP_201_CREATED
         )
     
-    def _simulate_processing(self, withdrawal):
-        """Simule le traitement du retrait"""
-        # Générer un ID de transaction simulé
-        withdrawal.transaction_id = f"TXN_{uuid.uuid4().hex[:8].upper()}"
-        withdrawal.status = 'processing'
-        withdrawal.save()
-        
-        # En réalité, ici on déclencherait un traitement en arrière-plan
-        # Pour la simulation, on va marquer comme terminé immédiatement
-        withdrawal.status = 'completed'
-        withdrawal.processed_at = timezone.now()
-        withdrawal.admin_notes = f"Virement simulé vers IBAN {withdrawal.bank_iban[-4:]} - ID: {withdrawal.transaction_id}"
-        withdrawal.save()
-    
     @action(detail=False, methods=['get'])
     def balance(self, request):
         """Récupérer le solde et les informations de conversion"""
@@ -87,6 +78,24 @@ class WithdrawalViewSet(viewsets.ModelViewSet):
             "max_withdrawal": 1000
         })
     
+    @action(detail=False, methods=['get'])
+    def transactions(self, request):
+        """Historique complet du portefeuille, paginé par curseur (?cursor=, ?limit=)"""
+        try:
+            limit = parse_limit(request.query_params.get('limit'))
+            rows, next_cursor = keyset_page(
+                WalletTransaction.objects.filter(user=request.user),
+                request.query_params.get('cursor'),
+                limit
+            )
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            "results": WalletTransactionSerializer(rows, many=True).data,
+            "next_cursor": next_cursor
+        })
+    
     @action(detail=False, methods=['get'])
     def history(self, request):
         """Historique des retraits"""
@@ -94,65 +103,133 @@ class WithdrawalViewSet(viewsets.ModelViewSet):
         serializer = WithdrawalSerializer(withdrawals, many=True)
         return Response(serializer.data)
 
-class AdminWithdrawalViewSet(viewsets.ModelViewSet):
+class AdminWithdrawalViewSet(ReplicaRoutingMixin, viewsets.ModelViewSet):
     """ViewSet admin pour gérer tous les retraits"""
-    queryset = Withdrawal.objects.all().order_by('-created_at')
+    queryset = Withdrawal.objects.select_related('user__kyc').order_by('-created_at')
     serializer_class = WithdrawalSerializer
     permission_classes = [permissions.IsAdminUser]
+    EXPORT_FIELDS = ('id', 'created_at', 'processed_at', 'user_id', 'user__username',
+                     'amount_euros', 'amount_tickets', 'status', 'bank_account_holder',
+                     'bank_iban', 'bank_bic', 'transaction_id')
     
     @action(detail=True, methods=['patch'])
     def approve(self, request, pk=None):
-        """Approuver un retrait"""
+        """Approuver un retrait (le virement part au prochain lot de process_withdrawals)"""
         withdrawal = self.get_object()
+        notes = f"Approuvé par {request.user.username} le {timezone.now()}"
         
-        if withdrawal.status != 'pending':
+        approved = Withdrawal.objects.filter(pk=withdrawal.pk, status='pending').update(
+            status='approved', admin_notes=notes
+        )
+        if not approved:
             return Response(
                 {"error": "Ce retrait ne peut pas être approuvé"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        withdrawal.status = 'processing'
-        withdrawal.admin_notes = f"Approuvé par {request.user.username} le {timezone.now()}"
-        withdrawal.save()
-        
-        # Simuler le traitement
-        self._simulate_bank_transfer(withdrawal)
-        
+        withdrawal.refresh_from_db()
         return Response(WithdrawalSerializer(withdrawal).data)
     
     @action(detail=True, methods=['patch'])
+    @transaction.atomic
     def reject(self, request, pk=None):
         """Rejeter un retrait et rembourser les tickets"""
         withdrawal = self.get_object()
         reason = request.data.get('reason', 'Rejeté par l\'administrateur')
         
-        if withdrawal.status not in ['pending', 'processing']:
+        # Un retrait en `processing` est déjà entre les mains d'un worker
+        rejected = Withdrawal.objects.filter(pk=withdrawal.pk, status__in=['pending', 'approved']).update(
+            status='cancelled', admin_notes=f"Rejeté par {request.user.username}: {reason}"
+        )
+        if not rejected:
             return Response(
                 {"error": "Ce retrait ne peut pas être rejeté"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         # Rembourser les tickets
-        withdrawal.user.tickets += withdrawal.amount_tickets
-        withdrawal.user.save()
-        
-        # Marquer comme annulé
-        withdrawal.status = 'cancelled'
-        withdrawal.admin_notes = f"Rejeté par {request.user.username}: {reason}"
-        withdrawal.save()
+        credit(withdrawal.user, withdrawal.amount_tickets, 'withdrawal_refund', withdrawal=withdrawal)
         
+        withdrawal.refresh_from_db()
         return Response(WithdrawalSerializer(withdrawal).data)
     
-    def _simulate_bank_transfer(self, withdrawal):
-        """Simule le virement bancaire"""
-        # Générer un ID de transaction
-        withdrawal.transaction_id = f"BANK_{uuid.uuid4().hex[:10].upper()}"
+    # Filtres de WithdrawalBulkFilterSerializer -> lookups
+    BULK_FILTER_LOOKUPS = {
+        'status': 'status',
+        'user_id': 'user_id',
+        'max_amount': 'amount_euros__lte',
+        'created_after': 'created_at__gte',
+        'created_before': 'created_at__lt',
+    }
+    
+    def _bulk_queryset(self, data):
+        """Retraits ciblés par la liste `ids` et/ou le `filter` validés"""
+        ids = data.get('ids')
+        queryset = Withdrawal.objects.all()
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        for key, value in data.get('filter', {}).items():
+            queryset = queryset.filter(**{self.BULK_FILTER_LOOKUPS[key]: value})
+        return queryset, ids
+    
+    def _bulk_response(self, outcomes):
+        return Response({
+            "processed": sum(1 for outcome in outcomes.values() if outcome not in ['not_found', 'invalid_status']),
+            "results": [{"id": withdrawal_id, "outcome": outcome} for withdrawal_id, outcome in outcomes.items()]
+        })
+    
+    @action(detail=False, methods=['post'])
+    def bulk_approve(self, request):
+        """Approuver un lot de retraits en une transaction"""
+        serializer = WithdrawalBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset, ids = self._bulk_queryset(serializer.validated_data)
+        return self._bulk_response(approve_many(queryset, request.user, ids))
+    
+    @action(detail=False, methods=['post'])
+    def bulk_reject(self, request):
+        """Rejeter un lot de retraits et rembourser les tickets en une transaction"""
+        serializer = WithdrawalBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset, ids = self._bulk_queryset(serializer.validated_data)
+        reason = serializer.validated_data['reason']
+        return self._bulk_response(reject_many(queryset, request.user, reason, ids))
+    
+    @action(detail=False, methods=['get'])
+    def sepa_export(self, request):
+        """Fichier SEPA pain.001 des retraits, généré en flux"""
+        queryset = Withdrawal.objects.filter(status=request.query_params.get('status', 'completed'))
+        try:
+            queryset = queryset.filter(**parse_period(request.query_params, 'processed_at'))
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            document = iter_pain001(queryset)
+        except ValueError as exc:
+            # Configuration SEPA_DEBTOR manquante ou invalide : pas de fichier rejeté par la banque
+            return Response({"error": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        response = StreamingHttpResponse(document, content_type='application/xml')
+        response['Content-Disposition'] = f'attachment; filename="sepa_{timezone.localdate():%Y%m%d}.xml"'
+        return response
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Export CSV/NDJSON en flux (filtres status, since, until sur created_at)"""
+        queryset = Withdrawal.objects.order_by('id')
+        if request.query_params.get('status'):
+            queryset = queryset.filter(status=request.query_params['status'])
         
-        # Marquer comme terminé
-        withdrawal.status = 'completed'
-        withdrawal.processed_at = timezone.now()
-        withdrawal.admin_notes += f" - Virement effectué vers {withdrawal.bank_iban[-4:]} - ID: {withdrawal.transaction_id}"
-        withdrawal.save()
+        try:
+            queryset = queryset.filter(**parse_period(request.query_params, 'created_at'))
+            return streaming_export(queryset, self.EXPORT_FIELDS, request.query_params.get('fmt', 'csv'), 'retraits')
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
@@ -0,0 +1,223 @@
+"""
+Traitement asynchrone des retraits.
+
+Les demandes sont enregistrées en `pending` et la requête HTTP rend la main
+immédiatement. La commande `process_withdrawals` réclame des lots avec
+`select_for_update(skip_locked=True)` (plusieurs workers peuvent vider la file
+en parallèle), les transmet au backend de virement configuré, puis finalise
+le lot en quelques requêtes groupées.
+
+Un retrait réservé (`processing`, tickets déjà débités) ne reste pas bloqué :
+
+- si le backend lève une exception, le lot est renvoyé retrait par retrait et
+  ceux qui échouent encore retournent dans la file ;
+- si le worker meurt, la réservation expire après `WITHDRAWAL_CLAIM_TTL`
+  secondes et le retrait est réclamé par le lot suivant.
+
+Un retrait peut donc être transmis deux fois : le backend doit dédoublonner
+les virements sur l'identifiant du retrait (EndToEndId SEPA). En revanche il
+n'est finalisé (et remboursé) qu'une fois : un worker n'écrit que les lignes
+encore `processing` avec la date de réservation de son lot, les autres ayant
+été réclamées par un lot plus récent.
+
+    WITHDRAWAL_TRANSFER_BACKEND = 'core.withdrawals.SimulatedBankBackend'
+    WITHDRAWAL_REQUIRE_APPROVAL = False  # True : seuls les retraits approuvés partent
+    WITHDRAWAL_CLAIM_TTL = 15 * 60
+"""
+import logging
+import uuid
+from datetime import timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .ledger import credit_many
+from .models import Withdrawal
+
+logger = logging.getLogger(__name__)
+
+
+class TransferResult(NamedTuple):
+    withdrawal_id: int
+    success: bool
+    transaction_id: str
+    message: str
+
+
+class SimulatedBankBackend:
+    """Banque simulée : tous les virements sont acceptés"""
+
+    def send_batch(self, withdrawals):
+        results = []
+        for withdrawal in withdrawals:
+            transaction_id = f"BANK_{uuid.uuid4().hex[:10].upper()}"
+            results.append(TransferResult(
+                withdrawal.id, True, transaction_id,
+                f"Virement simulé vers IBAN {withdrawal.bank_iban[-4:]} - ID: {transaction_id}",
+            ))
+        return results
+
+
+def get_transfer_backend():
+    backend = getattr(settings, 'WITHDRAWAL_TRANSFER_BACKEND', 'core.withdrawals.SimulatedBankBackend')
+    return import_string(backend)()
+
+
+def claimable_statuses():
+    if getattr(settings, 'WITHDRAWAL_REQUIRE_APPROVAL', False):
+        return ['approved']
+    return ['pending', 'approved']
+
+
+def claim_expiry():
+    """Les réservations antérieures à cette date sont expirées (worker mort en cours de lot)"""
+    return timezone.now() - timedelta(seconds=getattr(settings, 'WITHDRAWAL_CLAIM_TTL', 15 * 60))
+
+
+def claim_batch(batch_size):
+    """Réserve jusqu'à `batch_size` retraits (en file ou à réservation expirée) en les passant en `processing`"""
+    stale = Q(status='processing') & (Q(claimed_at__lt=claim_expiry()) | Q(claimed_at__isnull=True))
+    with transaction.atomic():
+        ids = list(
+            Withdrawal.objects.select_for_update(skip_locked=True)
+            .filter(Q(status__in=claimable_statuses()) | stale)
+            .order_by('created_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if ids:
+            Withdrawal.objects.filter(id__in=ids).update(status='processing', claimed_at=timezone.now())
+    return list(Withdrawal.objects.filter(id__in=ids).order_by('created_at'))
+
+
+def _still_claimed(withdrawals):
+    """
+    Verrouille et retourne les retraits du lot encore réservés par ce worker.
+
+    Un worker qui a dépassé `WITHDRAWAL_CLAIM_TTL` a pu se faire réclamer ses
+    lignes : elles ne sont plus `processing` ou portent une autre date de
+    réservation, et ne doivent être ni finalisées ni remboursées ici.
+    """
+    claims = {withdrawal.id: withdrawal.claimed_at for withdrawal in withdrawals}
+    rows = Withdrawal.objects.select_for_update().filter(id__in=claims, status='processing').values_list(
+        'id', 'claimed_at'
+    )
+    owned = {withdrawal_id for withdrawal_id, claimed_at in rows if claimed_at == claims[withdrawal_id]}
+    if len(owned) < len(claims):
+        logger.warning("Retraits réclamés par un autre worker, ignorés : %s", sorted(set(claims) - owned))
+    return [withdrawal for withdrawal in withdrawals if withdrawal.id in owned]
+
+
+@transaction.atomic
+def release(withdrawals, message):
+    """Remet des retraits réservés dans la file (tickets toujours débités) avec une note"""
+    status = 'approved' if getattr(settings, 'WITHDRAWAL_REQUIRE_APPROVAL', False) else 'pending'
+    withdrawals = _still_claimed(withdrawals)
+    for withdrawal in withdrawals:
+        withdrawal.status = status
+        withdrawal.claimed_at = None
+        withdrawal.admin_notes = f"{withdrawal.admin_notes} - {message}" if withdrawal.admin_notes else message
+    Withdrawal.objects.bulk_update(withdrawals, ['status', 'claimed_at', 'admin_notes'])
+
+
+def send(backend, withdrawals):
+    """
+    Transmet le lot au backend. S'il lève, chaque retrait est renvoyé seul.
+    Retourne (résultats, [(retrait, exception)] des envois impossibles).
+    """
+    try:
+        return backend.send_batch(withdrawals), []
+    except Exception:
+        logger.exception("Échec de l'envoi d'un lot de %d retraits, renvoi un par un", len(withdrawals))
+
+    results, errors = [], []
+    for withdrawal in withdrawals:
+        try:
+            results.extend(backend.send_batch([withdrawal]))
+        except Exception as exc:
+            logger.exception("Échec de l'envoi du retrait %s", withdrawal.id)
+            errors.append((withdrawal, exc))
+    return results, errors
+
+
+@transaction.atomic
+def finalize_batch(withdrawals, results):
+    """Enregistre les résultats du backend et rembourse les virements échoués (lignes encore réservées seulement)"""
+    now = timezone.now()
+    by_id = {withdrawal.id: withdrawal for withdrawal in _still_claimed(withdrawals)}
+    results = [result for result in results if result.withdrawal_id in by_id]
+    refunds = []
+
+    for result in results:
+        withdrawal = by_id[result.withdrawal_id]
+        withdrawal.status = 'completed' if result.success else 'failed'
+        withdrawal.claimed_at = None
+        withdrawal.processed_at = now
+        withdrawal.transaction_id = result.transaction_id
+        withdrawal.admin_notes = (
+            f"{withdrawal.admin_notes} - {result.message}" if withdrawal.admin_notes else result.message
+        )
+        if not result.success:
+            refunds.append((withdrawal.user_id, withdrawal.amount_tickets, {'withdrawal_id': withdrawal.id}))
+
+    Withdrawal.objects.bulk_update(
+        [by_id[result.withdrawal_id] for result in results],
+        ['status', 'claimed_at', 'processed_at', 'transaction_id', 'admin_notes'],
+    )
+    credit_many(refunds, 'withdrawal_refund')
+
+
+def process_batch(batch_size=100, backend=None):
+    """Traite un lot ; retourne le nombre de retraits réservés"""
+    withdrawals = claim_batch(batch_size)
+    if not withdrawals:
+        return 0
+    backend = backend or get_transfer_backend()
+    results, errors = send(backend, withdrawals)
+    finalize_batch(withdrawals, results)
+    for withdrawal, exc in errors:
+        release([withdrawal], f"Envoi impossible, remis en file : {exc}")
+    return len(withdrawals)
+
+
+def _bulk_transition(queryset, allowed_statuses, new_status, notes, ids=None):
+    """
+    Change le statut de tous les retraits éligibles du queryset en une requête.
+
+    Retourne (résultats par id, remboursements à créditer). Doit être
+    appelé dans une transaction : les lignes sont verrouillées pendant le calcul.
+    """
+    rows = list(queryset.select_for_update().values_list('id', 'status', 'user_id', 'amount_tickets'))
+    outcomes = {withdrawal_id: 'not_found' for withdrawal_id in ids or []}
+    eligible = []
+    refunds = []
+
+    for withdrawal_id, current_status, user_id, amount_tickets in rows:
+        if current_status in allowed_statuses:
+            eligible.append(withdrawal_id)
+            outcomes[withdrawal_id] = new_status
+            refunds.append((user_id, amount_tickets, {'withdrawal_id': withdrawal_id}))
+        else:
+            outcomes[withdrawal_id] = 'invalid_status'
+
+    if eligible:
+        Withdrawal.objects.filter(id__in=eligible).update(status=new_status, admin_notes=notes)
+    return outcomes, refunds
+
+
+@transaction.atomic
+def approve_many(queryset, admin, ids=None):
+    notes = f"Approuvé par {admin.username} le {timezone.now()}"
+    outcomes, _ = _bulk_transition(queryset, ['pending'], 'approved', notes, ids)
+    return outcomes
+
+
+@transaction.atomic
+def reject_many(queryset, admin, reason, ids=None):
+    notes = f"Rejeté par {admin.username}: {reason}"
+    outcomes, refunds = _bulk_transition(queryset, ['pending', 'approved'], 'cancelled', notes, ids)
+    credit_many(refunds, 'withdrawal_refund')
+    return outcomes
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -79,12 +81,65 @@ WSGI_APPLICATION = 'playinbet_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Profil sélectionné par la variable d'environnement PLAYINBET_DB_PROFILE :
+#   sqlite   (défaut)  base locale db.sqlite3 pour le développement
+#   sqlite-wal         db.sqlite3 avec WAL, PRAGMA ajustés et BEGIN IMMEDIATE
+#                      pour les petites instances (voir core/sqlite.py)
+#   postgres           PostgreSQL avec connexions persistantes ou pool,
+#                      et réplica en lecture si POSTGRES_REPLICA_HOST est défini
+DB_PROFILE = os.environ.get('PLAYINBET_DB_PROFILE', 'sqlite')
+
+if DB_PROFILE == 'postgres':
+    _postgres = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'playinbet'),
+        'USER': os.environ.get('POSTGRES_USER', 'playinbet'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        'CONN_HEALTH_CHECKS': True,
     }
-}
+    if os.environ.get('POSTGRES_POOL_MAX_SIZE'):
+        # Pool psycopg côté Django (incompatible avec CONN_MAX_AGE)
+        _postgres['CONN_MAX_AGE'] = 0
+        _postgres['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', '2')),
+                'max_size': int(os.environ['POSTGRES_POOL_MAX_SIZE']),
+                'timeout': 10,
+            },
+        }
+    else:
+        _postgres['CONN_MAX_AGE'] = int(os.environ.get('POSTGRES_CONN_MAX_AGE', '60'))
+
+    DATABASES = {'default': _postgres}
+
+    if os.environ.get('POSTGRES_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **_postgres,
+            'HOST': os.environ['POSTGRES_REPLICA_HOST'],
+            'PORT': os.environ.get('POSTGRES_REPLICA_PORT', _postgres['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+        DATABASE_REPLICA_ALIAS = 'replica'
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+    if DB_PROFILE == 'sqlite-wal':
+        DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+    # Second alias sur le même fichier (miroir en test) pour exercer le routeur ;
+    # DATABASE_REPLICA_ALIAS reste vide, les lectures restent donc sur 'default'
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+# PRAGMA WAL/synchronous/mmap/cache appliqués à chaque connexion SQLite
+SQLITE_TUNING = DB_PROFILE == 'sqlite-wal'
+
+# Lectures des actions list/retrieve/leaderboard/stats sur le réplica, si configuré
+DATABASE_ROUTERS = ['core.db_routers.ReadReplicaRouter']
 
 
 # Password validation
@@ -130,13 +185,38 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Mode d'authentification : 'token' (tokens DRF en base) ou 'jwt' (tokens signés
+# sans état, voir core/jwt_auth.py ; les tokens DRF déjà émis restent acceptés,
+# mais auth/token/login/ n'est plus exposé)
+AUTH_TOKEN_MODE = os.environ.get('PLAYINBET_AUTH_TOKEN_MODE', 'token')
+
+AUTHENTICATION_CLASSES = ['core.authentication.CachedTokenAuthentication']
+if AUTH_TOKEN_MODE == 'jwt':
+    AUTHENTICATION_CLASSES.insert(0, 'core.jwt_auth.StatelessJWTAuthentication')
+
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-    ],
+    'DEFAULT_AUTHENTICATION_CLASSES': AUTHENTICATION_CLASSES,
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Fenêtres glissantes en mémoire (voir core/throttling.py et THROTTLE_STORE)
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.AnonSlidingWindowThrottle',
+        'core.throttling.UserSlidingWindowThrottle',
+        'core.throttling.ActionSlidingWindowThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': '60/min',
+        'user': '600/min',
+        # Scopes par action (attribut throttle_scopes des viewsets)
+        'duel_list': '60/min',
+        'duel_create': '10/min',
+        'duel_join': '20/min',
+        'duel_proof': '10/min',
+        'duel_action': '60/min',
+        'withdrawal_create': '5/hour',
+        'kyc_submit': '5/hour',
+    },
 }
 
 DJOSER = {
@@ -148,7 +228,75 @@ DJOSER = {
     'PERMISSIONS': {
         'user_create': ['rest_framework.permissions.AllowAny'],
         'user_list': ['rest_framework.permissions.IsAuthenticated'],
-    }
+    },
+    # En mode JWT, djoser ne crée plus de token DRF à l'activation du compte
+    'TOKEN_MODEL': None if AUTH_TOKEN_MODE == 'jwt' else 'rest_framework.authtoken.models.Token',
+}
+
+# Tokens JWT (mode AUTH_TOKEN_MODE = 'jwt') : accès court, refresh renouvelé à chaque usage
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'ROTATE_REFRESH_TOKENS': True,
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_OBTAIN_SERIALIZER': 'core.jwt_auth.PlayinbetTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'core.jwt_auth.PlayinbetTokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER': 'core.jwt_auth.PlayinbetTokenVerifySerializer',
 }
 
-AUTH_USER_MODEL = 'core.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'core.User'
+
+# Cache des profils utilisateurs sérialisés (voir core/profile_cache.py)
+# Pour un cache partagé entre workers :
+#   'BACKEND': 'core.profile_cache.DjangoCacheBackend',
+#   'OPTIONS': {'alias': 'default', 'timeout': 300},
+# En mémoire locale, les autres workers gardent un profil invalidé jusqu'à `timeout` secondes
+PROFILE_CACHE = {
+    'BACKEND': 'core.profile_cache.LocMemLRUBackend',
+    'OPTIONS': {'max_entries': 10000, 'timeout': 300},
+}
+
+# Cache de l'authentification par token (voir core/authentication.py) ; TTL en secondes
+# Les déconnexions et changements de rôle n'atteignent tous les workers que si
+# l'alias est partagé (Redis, Memcached) ; sinon un token supprimé reste accepté
+# par les autres workers jusqu'à TTL secondes
+TOKEN_AUTH_CACHE = {
+    'BACKEND': 'core.profile_cache.DjangoCacheBackend',
+    'OPTIONS': {'alias': 'default', 'timeout': 300},
+    'TTL': 300,
+}
+
+# Compteurs de limitation de débit (voir core/throttling.py)
+# Pour des limites communes à tous les workers :
+#   'BACKEND': 'core.throttling.DjangoCacheSlidingWindowStore',
+#   'OPTIONS': {'alias': 'default'},
+THROTTLE_STORE = {
+    'BACKEND': 'core.throttling.LocMemSlidingWindowStore',
+    'OPTIONS': {'max_entries': 100000},
+}
+
+# Traitement des retraits (voir core/withdrawals.py et la commande process_withdrawals)
+WITHDRAWAL_TRANSFER_BACKEND = 'core.withdrawals.SimulatedBankBackend'
+WITHDRAWAL_REQUIRE_APPROVAL = False
+WITHDRAWAL_CLAIM_TTL = 15 * 60  # Secondes avant qu'un lot réservé par un worker mort soit repris
+
+# Compte débiteur des exports SEPA pain.001 (voir core/sepa.py)
+SEPA_DEBTOR = {
+    'name': os.environ.get('SEPA_DEBTOR_NAME', 'PlayInBet'),
+    'iban': os.environ.get('SEPA_DEBTOR_IBAN', ''),
+    'bic': os.environ.get('SEPA_DEBTOR_BIC', ''),
+}
+
+# Durée de conservation des réponses rejouables (en-tête Idempotency-Key, voir core/idempotency.py)
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+# Réservation d'une clé en cours de traitement ; doit dépasser la durée maximale d'une requête
+IDEMPOTENCY_LEASE = 60
+
+# Revue KYC (voir core/kyc_queue.py)
+# False : les soumissions attendent la revue d'un admin dans /api/admin/kyc/queue/
+KYC_AUTO_APPROVE = True
+KYC_CLAIM_TTL = 30 * 60  # Secondes avant qu'une soumission réservée retourne dans la file
+
+# Réconciliation des soldes (voir core/reconciliation.py) : secondes pendant lesquelles
+# un mouvement récent est recompté, le temps qu'un commit plus lent le précède
+RECONCILIATION_SAFETY_WINDOW = 10 * 60
@@ -1,11 +1,27 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from core.views import home
 
+
+def auth_urlpatterns(mode):
+    """Routes djoser du mode d'authentification (`settings.AUTH_TOKEN_MODE`)"""
+    if mode != 'jwt':
+        return [path('auth/', include('djoser.urls.authtoken'))]
+
+    # Sans TOKEN_MODEL, les routes auth/token/ de djoser ne peuvent pas fonctionner
+    from core.auth_views import JWTLogoutView
+
+    return [
+        path('auth/jwt/logout/', JWTLogoutView.as_view(), name='jwt-logout'),
+        path('auth/', include('djoser.urls.jwt')),
+    ]
+
+
 urlpatterns = [
     path('', home),
     path('auth/', include('djoser.urls')),
-    path('auth/', include('djoser.urls.authtoken')),
+    *auth_urlpatterns(settings.AUTH_TOKEN_MODE),
     path('api/', include('core.urls')),  # Ajout du préfixe api/
     path('admin/', admin.site.urls),
-]
\ No newline at end of file
+]